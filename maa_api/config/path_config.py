@@ -16,11 +16,14 @@ LIB_PATH = Path() / "resource" / "lib"
 LOG_PATH = Path() / "resource" / "log"
 # 临时文件路径
 TEMP_PATH = Path() / "resource" / "temp"
+# HTTP 缓存路径
+CACHE_PATH = Path() / "resource" / "cache"
 
 IMAGE_PATH.mkdir(parents=True, exist_ok=True)
 LIB_PATH.mkdir(parents=True, exist_ok=True)
 LOG_PATH.mkdir(parents=True, exist_ok=True)
 TEMP_PATH.mkdir(parents=True, exist_ok=True)
+CACHE_PATH.mkdir(parents=True, exist_ok=True)
 
 daily_task_template_path = Path() / "daily_task_template.json"
 if not DAILY_TASK_FILE_PATH.exists():
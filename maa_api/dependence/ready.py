@@ -0,0 +1,7 @@
+from maa_api.model.task import pipeline_pool
+from maa_api.model.response import ResponseCode
+from maa_api.exception.response_exception import ResponseException
+
+def core_ready():
+    if not pipeline_pool.ready:
+        raise ResponseException(code=ResponseCode.SERVICE_UNAVAILABLE.value, message=f"MAA 核心尚未就绪 phase={pipeline_pool.phase.value}")
\ No newline at end of file
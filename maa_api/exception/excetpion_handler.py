@@ -1,7 +1,8 @@
 from fastapi import Request
 from maa_api.log import logger
 from fastapi.responses import JSONResponse
-from maa_api.model.response import Response
+from maa_api.model.response import Response, ResponseCode
+from maa_api.model.worker import CoreWorkerError
 from maa_api.exception.response_exception import ResponseException
 
 """处理全局异常"""
@@ -12,4 +13,9 @@ async def exception_handler(request: Request, exc: Exception):
 """处理响应异常"""
 async def response_exception_handler(request: Request, exc: ResponseException):
     logger.error(f"{request.url}", exc_info=exc)
-    return JSONResponse(Response.build(code=exc.code, message=exc.message).dict())
\ No newline at end of file
+    return JSONResponse(Response.build(code=exc.code, message=exc.message).dict())
+
+"""处理 MaaCore 工作进程异常，工作进程重启期间返回服务不可用"""
+async def core_worker_exception_handler(request: Request, exc: CoreWorkerError):
+    logger.error(f"{request.url}", exc_info=exc)
+    return JSONResponse(Response.build(code=ResponseCode.SERVICE_UNAVAILABLE.value, message=str(exc)).dict())
\ No newline at end of file
@@ -2,10 +2,12 @@ from fastapi import FastAPI
 from fastapi.staticfiles import StaticFiles
 from fastapi.middleware.cors import CORSMiddleware
 
-from maa_api.router import adb, maa, template
+from maa_api.router import adb, maa, template, health
 from maa_api.exception import response_exception, excetpion_handler
 from maa_api.config.path_config import STATIC_PATH
-from maa_api.scheduler import check_ark_running_scheduler, daily_art_task_scheduler
+from maa_api.model.task import init_asst_async
+from maa_api.model.worker import CoreWorkerError
+from maa_api.scheduler import check_ark_running_scheduler, daily_art_task_scheduler, resource_sync_scheduler
 
 app = FastAPI()
 
@@ -13,10 +15,12 @@ app = FastAPI()
 app.include_router(adb.router)
 app.include_router(maa.router)
 app.include_router(template.router)
+app.include_router(health.router)
 
 # 异常处理
 app.add_exception_handler(Exception, excetpion_handler.exception_handler)
 app.add_exception_handler(response_exception.ResponseException, excetpion_handler.response_exception_handler)
+app.add_exception_handler(CoreWorkerError, excetpion_handler.core_worker_exception_handler)
 
 # 挂载静态文件
 app.mount("/static", StaticFiles(directory=STATIC_PATH), name="static")
@@ -30,6 +34,12 @@ app.add_middleware(
     allow_headers=["*"],  # 允许所有请求头
 )
 
+@app.on_event("startup")
+async def init_asst():
+    # 后台初始化 MAA 核心，不阻塞服务启动
+    init_asst_async()
+
 @app.on_event("startup")
 async def scheduler():
-    daily_art_task_scheduler.start()
\ No newline at end of file
+    daily_art_task_scheduler.start()
+    resource_sync_scheduler.start()
\ No newline at end of file
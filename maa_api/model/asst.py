@@ -4,6 +4,7 @@ import json
 import os
 import pathlib
 import platform
+import threading
 from typing import Union, Optional
 
 from .utils import InstanceOptionType, StaticOptionType, JSON
@@ -80,6 +81,16 @@ class Asst:
 
         return ret
 
+    @staticmethod
+    def load_resource(path: Union[pathlib.Path, str]) -> bool:
+        """
+        在已加载的 dll 上追加加载资源，用于热更新增量资源，需在没有任务运行时调用
+
+        :params:
+            ``path``:    资源所在文件夹路径
+        """
+        return Asst.__lib.AsstLoadResource(str(path).encode('utf-8'))
+
     def __init__(self, callback: 'Asst.CallBackType' = None, arg=None):
         """
         :params:
@@ -87,6 +98,9 @@ class Asst:
             ``arg``:        自定义参数
         """
         self.__callback = callback
+        # 截图缓冲区，按需扩容并在实例内复用
+        self.__image_buffer = None
+        self.__image_lock = threading.Lock()
         if callback:
             self.__ptr = Asst.__lib.AsstCreateEx(callback, arg)
         else:
@@ -145,12 +159,33 @@ class Asst:
 
         : return: 成功时图像的字节; 失败时 None
         """
-        buffer_type = ctypes.c_byte * size
-        buffer = buffer_type()
-        buffer.value = b'\000' * size
-        if (got := Asst.__lib.AsstGetImage(self.__ptr, buffer, size)) \
-                and got > 0:
-            return bytes(buffer)
+        with self.__image_lock:
+            view = self.get_image_view(size)
+            return bytes(view) if view is not None else None
+
+    @property
+    def image_lock(self) -> threading.Lock:
+        """
+        截图缓冲区锁，多线程使用 get_image_view 时需持有
+        """
+        return self.__image_lock
+
+    def get_image_view(self, size: int) -> memoryview | None:
+        """
+        获取上次截图，不复制数据
+        返回的视图指向实例内复用的缓冲区，仅在下一次获取截图前有效
+
+        :params:
+            ``size``:  缓冲区字节数, 如 1280*720*3
+
+        : return: 成功时图像字节的 memoryview; 失败时 None
+        """
+        if self.__image_buffer is None or len(self.__image_buffer) < size:
+            self.__image_buffer = (ctypes.c_ubyte * size)()
+        buffer = self.__image_buffer
+        if (got := Asst.__lib.AsstGetImage(self.__ptr, buffer, len(buffer))) \
+                and 0 < got <= len(buffer):
+            return memoryview(buffer).cast('B')[:got]
         else:
             return None
 
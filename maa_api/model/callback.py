@@ -0,0 +1,69 @@
+import queue
+import threading
+
+from typing import Callable, Optional
+
+from maa_api.model.utils import Message
+from maa_api.log import logger
+
+# (消息类型, 原始 json 字节, 自定义参数)
+CallbackMessage = tuple[int, bytes, Optional[int]]
+
+class CallbackQueue:
+    """
+    MaaCore 回调消息队列
+
+    回调在 MaaCore 工作线程中执行，只负责将原始消息入队；
+    由独立的消费线程批量取出后解析、更新状态并写日志，避免 Python 侧的解析和磁盘 I/O 阻塞 MaaCore
+    """
+
+    def __init__(self,
+                 handler: Callable[[list[CallbackMessage]], None],
+                 maxsize: int = 10000,
+                 batch_size: int = 256,
+                 name: str = "maa-callback"):
+        """
+        :params:
+            ``handler``:    批量消息处理函数，在消费线程中执行
+            ``maxsize``:    队列容量
+            ``batch_size``: 单批次最多处理的消息数
+            ``name``:       消费线程名称
+        """
+        self._queue: queue.Queue[CallbackMessage] = queue.Queue(maxsize=maxsize)
+        self._handler = handler
+        self._batch_size = batch_size
+        self._dropped = 0
+        self._thread = threading.Thread(target=self._consume, name=name, daemon=True)
+        self._thread.start()
+
+    def put(self, msg: int, details: bytes, arg: Optional[int]) -> None:
+        try:
+            self._queue.put_nowait((msg, details, arg))
+        except queue.Full:
+            # 队列已满时丢弃原子任务消息，任务链及全局消息会影响流水线状态，必须等待入队
+            if msg >= Message.SubTaskError.value:
+                self._dropped += 1
+            else:
+                self._queue.put((msg, details, arg))
+
+    def _next_batch(self) -> list[CallbackMessage]:
+        batch = [self._queue.get()]
+        while len(batch) < self._batch_size:
+            try:
+                batch.append(self._queue.get_nowait())
+            except queue.Empty:
+                break
+        return batch
+
+    def _consume(self) -> None:
+        while True:
+            batch = self._next_batch()
+
+            if self._dropped:
+                dropped, self._dropped = self._dropped, 0
+                logger.warning(f"回调消息队列已满，丢弃原子任务消息 {dropped} 条")
+
+            try:
+                self._handler(batch)
+            except Exception as e:
+                logger.error("回调消息处理失败", exc_info=e)
@@ -1,133 +1,507 @@
+import io
 import os
-import shutil
+import json
+import hashlib
 import requests
 import time
 
+from collections import deque
 from concurrent.futures import ThreadPoolExecutor
-from threading import Lock
+from threading import Condition, Lock, Thread
 from tqdm import tqdm
 
-from maa_api.config.path_config import TEMP_PATH
 from maa_api.log import logger
 from .utils import HttpUtils
 
-# 获取文件大小
-def length(url_list):
-    def getlenhead(single_url):
-        response = HttpUtils.head(single_url, allow_redirects=True)
+def _head_length(single_url):
+    try:
+        response = HttpUtils.head(single_url, allow_redirects=True, timeout=10)
         file_size = response.headers.get('Content-Length')
-        if file_size is not None:
+        if response.ok and file_size is not None:
             return int(file_size)
-        else:
-            return False
+    except (requests.RequestException, ValueError) as e:
+        logger.warning(f"镜像探测失败 {single_url}: {e}")
+    return None
+
+# 并发探测所有镜像的文件大小，不可用的镜像为 None
+def probe(url_list):
+    with ThreadPoolExecutor(max_workers=len(url_list)) as executor:
+        return dict(zip(url_list, executor.map(_head_length, url_list)))
 
+# 获取文件大小
+def length(url_list):
+    sizes = probe(url_list)
     for url in url_list:
-        single_file_length = getlenhead(url)
-        if single_file_length:
-            return single_file_length, url
-    
+        if sizes[url]:
+            return sizes[url], url
+
     raise RuntimeError("文件大小获取失败，地址: " + str(url_list))
 
+class RangeNotSupportedError(Exception):
+    """
+    服务器不支持 Range 请求，无法分片下载
+    """
+
+class ChunkBitmap:
+    """
+    分片完成状态位图，保存在下载文件旁的 .chunks 文件中，用于中断后续传
+    """
+
+    def __init__(self, path, total_size, chunksize, source):
+        self.path = path
+        self.total_size = total_size
+        self.chunksize = chunksize
+        self.source = source
+        self.num_chunks = (total_size + chunksize - 1) // chunksize
+        self.bits = bytearray((self.num_chunks + 7) // 8)
+        self.lock = Lock()
+
+    def load(self) -> bool:
+        """
+        读取已有位图，文件大小、分片大小或来源不一致时视为无效
+        """
+        try:
+            with open(self.path, 'r', encoding='utf-8') as file:
+                data = json.load(file)
+            if (data['total_size'], data['chunksize'], data['source']) != (self.total_size, self.chunksize, self.source):
+                return False
+            bits = bytearray.fromhex(data['bitmap'])
+            if len(bits) != len(self.bits):
+                return False
+            self.bits = bits
+            return True
+        except (OSError, ValueError, KeyError):
+            return False
+
+    def save(self) -> None:
+        data = {
+            'total_size': self.total_size,
+            'chunksize': self.chunksize,
+            'source': self.source,
+            'bitmap': self.bits.hex()
+        }
+        tmp_path = f"{self.path}.tmp"
+        with open(tmp_path, 'w', encoding='utf-8') as file:
+            json.dump(data, file)
+        os.replace(tmp_path, self.path)
+
+    def done(self, chunk_id) -> bool:
+        return bool(self.bits[chunk_id >> 3] & (1 << (chunk_id & 7)))
+
+    def mark(self, chunk_id) -> None:
+        with self.lock:
+            self.bits[chunk_id >> 3] |= 1 << (chunk_id & 7)
+            self.save()
+
+    def pending(self) -> list[int]:
+        return [chunk_id for chunk_id in range(self.num_chunks) if not self.done(chunk_id)]
+
+    def remove(self) -> None:
+        try:
+            os.remove(self.path)
+        except FileNotFoundError:
+            pass
+
+class _MirrorStats:
+    def __init__(self):
+        self.throughput = None  # 吞吐量 EWMA（字节/秒），未完成过分片时为空
+        self.consecutive_failures = 0
+        self.demoted = False
+
+class ChunkScheduler:
+    """
+    多镜像分片调度，每个分片同一时间只交给一个连接下载；
+    按各镜像实测吞吐量分配，剩余分片不多时慢镜像让给快镜像，连续失败的镜像降级停用
+    """
+
+    MAX_CHUNK_ATTEMPTS = 10  # 单个分片最大尝试次数
+    MAX_CONSECUTIVE_FAILURES = 3  # 镜像连续失败多少次后降级
+    EWMA_ALPHA = 0.3
+
+    def __init__(self, urlist, chunk_ids, chunksize, max_conn, failed_requests):
+        self.chunksize = chunksize
+        self.max_conn = max_conn
+        self.failed_requests = failed_requests
+        self.pending = deque(chunk_ids)
+        self.in_flight = 0
+        self.attempts = {}
+        self.mirrors = {url: _MirrorStats() for url in urlist}
+        self.cond = Condition()
+        self.error = None
+
+    def _chunk_time(self, url):
+        throughput = self.mirrors[url].throughput
+        return self.chunksize / throughput if throughput else None
+
+    def _should_yield(self, url):
+        """
+        比本镜像快的镜像在本镜像下载一个分片的时间内即可取完剩余分片时，本镜像不再领取
+        """
+        own_time = self._chunk_time(url)
+        if own_time is None:
+            return False
+        faster_capacity = 0.0
+        for other_url, other in self.mirrors.items():
+            other_time = self._chunk_time(other_url)
+            if other_url != url and not other.demoted and other_time is not None and other_time < own_time:
+                faster_capacity += self.max_conn * own_time / other_time
+        return len(self.pending) <= faster_capacity
+
+    def acquire(self, url):
+        """
+        领取下一个分片，没有可领取的分片时返回 None
+        """
+        with self.cond:
+            while True:
+                if self.error is not None or self.mirrors[url].demoted:
+                    return None
+                if not self.pending:
+                    if self.in_flight == 0:
+                        return None
+                    # 进行中的分片失败时会重新入队
+                    self.cond.wait()
+                    continue
+                if self._should_yield(url):
+                    self.cond.wait(timeout=1)
+                    continue
+                self.in_flight += 1
+                return self.pending.popleft()
+
+    def complete(self, url, chunk_id, nbytes, seconds):
+        with self.cond:
+            self.in_flight -= 1
+            self.failed_requests[url]['success'] += 1
+            mirror = self.mirrors[url]
+            mirror.consecutive_failures = 0
+            throughput = nbytes / max(seconds, 1e-3)
+            if mirror.throughput is None:
+                mirror.throughput = throughput
+            else:
+                mirror.throughput += self.EWMA_ALPHA * (throughput - mirror.throughput)
+            self.cond.notify_all()
+
+    def fail(self, url, chunk_id, error):
+        with self.cond:
+            self.in_flight -= 1
+            self.failed_requests[url]['fail'] += 1
+            mirror = self.mirrors[url]
+            mirror.consecutive_failures += 1
+
+            self.attempts[chunk_id] = self.attempts.get(chunk_id, 0) + 1
+            if self.attempts[chunk_id] >= self.MAX_CHUNK_ATTEMPTS:
+                self.error = RuntimeError(f"分片 {chunk_id} 下载失败，已达到最大重试次数: {error}")
+            else:
+                # 失败的分片优先重新分配
+                self.pending.appendleft(chunk_id)
+
+            # 至少保留一个可用镜像
+            alive = [other for other in self.mirrors.values() if not other.demoted]
+            if mirror.consecutive_failures >= self.MAX_CONSECUTIVE_FAILURES and len(alive) > 1 and not mirror.demoted:
+                mirror.demoted = True
+                logger.warning(f"镜像连续失败，已降级停用 {url} {self.failed_requests[url]}")
+            self.cond.notify_all()
+
+    def unsupported(self, url, chunk_id, error):
+        """
+        镜像不支持 Range 请求，直接降级停用并退回分片；所有镜像都不支持时中止分片下载
+        """
+        with self.cond:
+            self.in_flight -= 1
+            self.failed_requests[url]['fail'] += 1
+            self.pending.appendleft(chunk_id)
+            mirror = self.mirrors[url]
+            if not mirror.demoted:
+                mirror.demoted = True
+                logger.warning(f"镜像不支持分片下载，已降级停用 {url}")
+            if all(other.demoted for other in self.mirrors.values()) and self.error is None:
+                self.error = error
+            self.cond.notify_all()
+
+    def wait_chunk(self, chunk_id, bitmap):
+        """
+        等待指定分片下载完成，未开始的分片提前到队首优先下载
+        """
+        with self.cond:
+            while not bitmap.done(chunk_id):
+                if self.error is not None:
+                    raise self.error
+                if chunk_id in self.pending and self.pending[0] != chunk_id:
+                    self.pending.remove(chunk_id)
+                    self.pending.appendleft(chunk_id)
+                    self.cond.notify_all()
+                self.cond.wait()
+
+    def abort(self, error):
+        with self.cond:
+            if self.error is None:
+                self.error = error
+            self.cond.notify_all()
+
+    def summary(self):
+        with self.cond:
+            return {
+                url: {
+                    **self.failed_requests[url],
+                    'throughput': round(mirror.throughput or 0),
+                    'demoted': mirror.demoted
+                }
+                for url, mirror in self.mirrors.items()
+            }
+
+class ChunkReader(io.RawIOBase):
+    """
+    边下载边读取 .part 文件，读取到未完成的分片时阻塞等待，并让调度器优先下载该分片
+    """
+
+    def __init__(self, part_path, total_size, chunksize, bitmap, scheduler):
+        self.file = open(part_path, 'rb')
+        self.total_size = total_size
+        self.chunksize = chunksize
+        self.bitmap = bitmap
+        self.scheduler = scheduler
+        self.pos = 0
+
+    def readable(self):
+        return True
+
+    def seekable(self):
+        return True
+
+    def tell(self):
+        return self.pos
+
+    def seek(self, offset, whence=io.SEEK_SET):
+        if whence == io.SEEK_SET:
+            self.pos = offset
+        elif whence == io.SEEK_CUR:
+            self.pos += offset
+        else:
+            self.pos = self.total_size + offset
+        return self.pos
+
+    def readinto(self, buffer):
+        if self.pos >= self.total_size:
+            return 0
+        # 每次最多读到当前分片末尾，只等待一个分片
+        chunk_id = self.pos // self.chunksize
+        size = min(len(buffer), (chunk_id + 1) * self.chunksize - self.pos, self.total_size - self.pos)
+        self.scheduler.wait_chunk(chunk_id, self.bitmap)
+        self.file.seek(self.pos)
+        read = self.file.readinto(memoryview(buffer)[:size])
+        self.pos += read
+        return read
+
+    def close(self):
+        self.file.close()
+        super().close()
+
 # 定义Download类在初始化时保存几个参数
 class Downloader:
     # 初始化类
-    def __init__(self, urlist, chunksize, max_conn):
+    def __init__(self, urlist, chunksize, max_conn, source=None):
         self.urlist = urlist  # 镜像url列表
         self.chunksize = chunksize  # 分片大小
         self.max_conn = max_conn  # 单个url最大连接数
         self.lock = Lock()
-        self.chunk_status = []  # 状态列表
         self.failed_requests = {url: {'success': 0, 'fail': 0} for url in urlist}  # 记录每个 URL 的失败次数和成功次数
-        self.listhash = hex(hash(tuple(urlist)))  # 计算urlist的hash
-        self.temp_path = TEMP_PATH / self.listhash  # 使用 Path 处理路径
+        # 续传校验标识，默认为urlist的hash，跨进程稳定
+        self.listhash = source or hashlib.sha1('\n'.join(urlist).encode('utf-8')).hexdigest()
 
-    def download_chunk(self, url, chunk_id, total_size):
+    def download_chunk(self, url, file_path, chunk_id, total_size, progress_bar):
+        """
+        从指定镜像下载单个分片并直接写入文件对应偏移，返回写入的字节数
+        """
         start = chunk_id * self.chunksize
         end = min(start + self.chunksize - 1, total_size - 1)
         headers = {'Range': f'bytes={start}-{end}'}
-        filename = self.temp_path / str(chunk_id)
-        retries = 10  # 设置重试次数
-        while retries > 0 and self.chunk_status[chunk_id] != 2:
-            try:
-                response = HttpUtils.get(url, headers=headers)
-                if response.status_code in (301, 302, 303, 307, 308):
-                    redirect_url = response.headers['Location']
-                    response = HttpUtils.get(redirect_url, headers=headers)
-
-                if response.status_code == 206:
-                    self.failed_requests[url]['success'] += 1
-                    with open(filename, 'wb') as file:
-                        file.write(response.content)
-                    self.chunk_status[chunk_id] = 2
-                    logger.info(f"分片 {chunk_id} 下载成功")
-                    break
-                elif response.status_code >= 400:
-                    self.failed_requests[url]['fail'] += 1
+        written = 0
+        try:
+            with HttpUtils.get(url, headers=headers, stream=True) as response:
+                if response.status_code == 200:
+                    raise RangeNotSupportedError(url)
+                if response.status_code != 206:
+                    raise requests.RequestException(f"分片 {chunk_id} 状态码 {response.status_code}")
+
+                with open(file_path, 'r+b') as file:
+                    file.seek(start)
+                    for data in response.iter_content(chunk_size=64 * 1024):
+                        file.write(data)
+                        written += len(data)
+                        progress_bar.update(len(data))
+
+            if written != end - start + 1:
+                raise requests.RequestException(f"分片 {chunk_id} 长度不一致 {written}/{end - start + 1}")
+            return written
+        except requests.RequestException:
+            progress_bar.update(-written)
+            raise
+
+    def _worker(self, url, scheduler, file_path, total_size, bitmap, progress_bar):
+        """
+        单个连接的下载循环，持续从调度器领取分片直到没有可领取的分片
+        """
+        while True:
+            chunk_id = scheduler.acquire(url)
+            if chunk_id is None:
+                return
 
+            start_time = time.monotonic()
+            try:
+                written = self.download_chunk(url, file_path, chunk_id, total_size, progress_bar)
+            except RangeNotSupportedError as e:
+                scheduler.unsupported(url, chunk_id, e)
+                return
             except requests.RequestException as e:
-                if self.chunk_status[chunk_id] == 1:
-                    self.chunk_status[chunk_id] = 0
-            retries -= 1
-            time.sleep(1)  # 等待一段时间后重试
+                logger.warning(f"分片 {chunk_id} 下载失败，准备重试 {url}: {e}")
+                scheduler.fail(url, chunk_id, e)
+                time.sleep(1)  # 等待一段时间后重试
+                continue
 
-        if retries == 0 and self.chunk_status[chunk_id] != 2:
-            raise Exception(f"分片 {chunk_id} 下载失败，已达到最大重试次数")
+            bitmap.mark(chunk_id)
+            scheduler.complete(url, chunk_id, written, time.monotonic() - start_time)
+            logger.debug(f"分片 {chunk_id} 下载成功 {url}")
 
-    def download_file(self, total_size, file_path):
-        num_chunks = (total_size + self.chunksize - 1) // self.chunksize
-        self.chunk_status = [0] * num_chunks
-        try:
-            shutil.rmtree(self.temp_path)
-        except FileNotFoundError:
-            pass
-        self.temp_path.mkdir(parents=True, exist_ok=True)
-        with ThreadPoolExecutor(max_workers=self.max_conn * len(self.urlist)) as executor:
-            for url in self.urlist:
-                for chunk_id in range(num_chunks):
-                    executor.submit(self.download_chunk, url, chunk_id, total_size)
-
-        # 检查所有分片是否已成功下载
-        if all(status == 2 for status in self.chunk_status):
-            # 合并所有临时文件到一个文件
-            with open(file_path, 'wb') as outfile:
-                for chunk_id in range(num_chunks):
-                    filename = self.temp_path / str(chunk_id)
-                    with open(filename, 'rb') as infile:
-                        shutil.copyfileobj(infile, outfile)
-
-            # 删除临时目录
-            shutil.rmtree(self.temp_path)
+    def download_file(self, total_size, file_path, sha256=None, consumer=None):
+        """
+        分片并行下载，各分片直接写入预分配的 .part 文件，完成状态记录在 .chunks 位图中，
+        中断后再次调用时只下载未完成的分片；全部完成并校验大小和哈希后重命名为目标文件。
+        指定 consumer 时在下载的同时以 ChunkReader 按需读取已完成的部分，例如边下载边解压
+        """
+        part_path = f"{file_path}.part"
+        bitmap = ChunkBitmap(f"{file_path}.chunks", total_size, self.chunksize, self.listhash)
+
+        if os.path.exists(part_path) and os.path.getsize(part_path) == total_size and bitmap.load():
+            logger.info(f"继续未完成的下载，剩余分片 {len(bitmap.pending())}/{bitmap.num_chunks}")
         else:
-            logger.error("有分片下载失败，无法合并文件。")
+            # 预分配文件，各分片按偏移写入
+            with open(part_path, 'wb') as file:
+                file.truncate(total_size)
+            bitmap.save()
+
+        pending = bitmap.pending()
+        downloaded = (bitmap.num_chunks - len(pending)) * self.chunksize
+        scheduler = ChunkScheduler(self.urlist, pending, self.chunksize, self.max_conn, self.failed_requests)
+        file_size_mb = total_size / (1024 * 1024)
+        consumer_errors = []
+        consumer_thread = None
+        if consumer is not None:
+            def consume():
+                try:
+                    with io.BufferedReader(ChunkReader(part_path, total_size, self.chunksize, bitmap, scheduler),
+                                           buffer_size=256 * 1024) as reader:
+                        consumer(reader)
+                except Exception as e:
+                    consumer_errors.append(e)
+            consumer_thread = Thread(target=consume, name="download-consumer", daemon=True)
+            consumer_thread.start()
+
+        with tqdm(total=total_size, initial=min(downloaded, total_size), unit='B', unit_scale=True,
+                  desc=f"{file_path} ({file_size_mb:.2f} MB)", ncols=100) as progress_bar:
+            with ThreadPoolExecutor(max_workers=self.max_conn * len(self.urlist)) as executor:
+                futures = [executor.submit(self._worker, url, scheduler, part_path, total_size, bitmap, progress_bar)
+                           for url in self.urlist for _ in range(self.max_conn)]
+                for future in futures:
+                    future.result()
+        logger.info(f"各镜像下载统计 {scheduler.summary()}")
+        if consumer_thread is not None:
+            consumer_thread.join()
+
+        # 任一分片失败时抛出异常，已完成的分片保留用于续传
+        if scheduler.error is not None:
+            raise scheduler.error
+        if consumer_errors:
+            raise consumer_errors[0]
 
         # 验证下载文件
-        if os.path.getsize(file_path) != total_size:
-            logger.warning("文件大小不一致，下载可能出错。")
+        if os.path.getsize(part_path) != total_size:
+            raise RuntimeError("文件大小不一致，下载可能出错。")
+        if sha256 is not None:
+            digest = file_sha256(part_path)
+            if digest != sha256.lower():
+                os.remove(part_path)
+                bitmap.remove()
+                raise RuntimeError(f"文件哈希不一致 expected={sha256} actual={digest}")
 
-    def download_file_no_chunk(self, download_url, file_path):
+        os.replace(part_path, file_path)
+        bitmap.remove()
+        logger.info(f"下载成功，已保存到 {file_path}")
+
+    def download_file_no_chunk(self, download_url, file_path, total_size=None, sha256=None):
+        """
+        单连接下载到 .part 文件，校验大小和哈希后重命名为目标文件，下载或校验失败时删除 .part 文件并抛出异常
+        """
+        part_path = f"{file_path}.part"
         try:
-            response = HttpUtils.get(download_url, stream=True)
-            response.raise_for_status()
+            with HttpUtils.get(download_url, stream=True) as response:
+                response.raise_for_status()
+
+                file_size = total_size or int(response.headers.get('Content-Length', 0))
+                file_size_mb = file_size / (1024 * 1024)
 
-            file_size = int(response.headers.get('Content-Length', 0))
-            file_size_mb = file_size / (1024 * 1024)
+                with tqdm(total=file_size, unit='B', unit_scale=True, desc=f"{file_path} ({file_size_mb:.2f} MB)", ncols=100) as progress_bar:
+                    with open(part_path, 'wb') as file:
+                        for chunk in response.iter_content(chunk_size=8192):
+                            file.write(chunk)
+                            progress_bar.update(len(chunk))
 
-            with tqdm(total=file_size, unit='B', unit_scale=True, desc=f"{file_path} ({file_size_mb:.2f} MB)", ncols=100) as progress_bar:
-                with open(file_path, 'wb') as file:
-                    for chunk in response.iter_content(chunk_size=8192):
-                        file.write(chunk)
-                        progress_bar.update(len(chunk))
+            # 验证下载文件
+            if file_size and os.path.getsize(part_path) != file_size:
+                raise RuntimeError(f"文件大小不一致，下载可能出错 expected={file_size} actual={os.path.getsize(part_path)}")
+            if sha256 is not None:
+                digest = file_sha256(part_path)
+                if digest != sha256.lower():
+                    raise RuntimeError(f"文件哈希不一致 expected={sha256} actual={digest}")
+        except Exception:
+            if os.path.exists(part_path):
+                os.remove(part_path)
+            raise
 
-            logger.info(f"下载成功，已保存到 {file_path}")
-        except requests.RequestException as e:
-            logger.error(f"下载失败 : {e}")
+        os.replace(part_path, file_path)
+        logger.info(f"下载成功，已保存到 {file_path}")
 
-def file_download(download_url_list, download_path):
+def file_sha256(file_path):
+    sha256 = hashlib.sha256()
+    with open(file_path, 'rb') as file:
+        for data in iter(lambda: file.read(1024 * 1024), b''):
+            sha256.update(data)
+    return sha256.hexdigest()
+
+def file_download(download_url_list, download_path, expected_size=None, sha256=None, consumer=None):
+    """
+    下载文件，consumer 不为空时以文件对象调用一次，分片下载时与下载同时进行
+    """
     chunksize = 1024 * 1024     # 分片大小1MB
     max_conn = 4                # 最大连接数
+    # 并发探测所有镜像，以发布信息中的大小或第一个可用镜像的大小为准，排除大小不一致的镜像
+    sizes = probe(download_url_list)
+    total_size = expected_size or next((size for size in sizes.values() if size), None)
+    if not total_size:
+        raise RuntimeError("文件大小获取失败，地址: " + str(download_url_list))
+    mirrors = [url for url in download_url_list if sizes[url] == total_size]
+    if not mirrors:
+        raise RuntimeError(f"没有与发布信息大小一致的镜像 expected={expected_size} actual={sizes}")
     # 创建对象
-    downloader = Downloader(download_url_list, chunksize, max_conn)
-    # 下载文件
-    total_size, download_url = length(download_url_list)
-    logger.info(f"下载地址为{download_url}，文件大小为{total_size / (1024 * 1024)}MB，开始下载")
-    return downloader.download_file_no_chunk(download_url, download_path)
+    # 续传标识使用完整的镜像列表，避免某个镜像暂时不可用导致已下载的分片失效
+    source = hashlib.sha1('\n'.join(download_url_list).encode('utf-8')).hexdigest()
+    downloader = Downloader(mirrors, chunksize, max_conn, source=source)
+    logger.info(f"下载地址为{mirrors}，文件大小为{total_size / (1024 * 1024)}MB，开始下载")
+    try:
+        return downloader.download_file(total_size, download_path, sha256=sha256, consumer=consumer)
+    except RangeNotSupportedError as e:
+        logger.warning(f"服务器不支持分片下载，改为单连接下载: {e}")
+        for path in (f"{download_path}.part", f"{download_path}.chunks"):
+            if os.path.exists(path):
+                os.remove(path)
+        # 依次尝试各镜像，全部失败时抛出最后一次的异常
+        for index, url in enumerate(mirrors):
+            try:
+                downloader.download_file_no_chunk(url, download_path, total_size=total_size, sha256=sha256)
+                break
+            except (requests.RequestException, RuntimeError) as e:
+                logger.warning(f"单连接下载失败 {url}: {e}")
+                if index == len(mirrors) - 1:
+                    raise
+        # 只在校验通过后交给 consumer
+        if consumer is not None:
+            with open(download_path, 'rb') as file:
+                consumer(file)
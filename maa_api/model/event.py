@@ -0,0 +1,126 @@
+import json
+import asyncio
+import threading
+
+from collections import deque
+from typing import Any, AsyncIterator, Awaitable, Callable, Optional
+
+
+class _Subscriber:
+    def __init__(self, loop: asyncio.AbstractEventLoop, maxsize: int):
+        self.loop = loop
+        self.queue: asyncio.Queue[dict] = asyncio.Queue(maxsize=maxsize)
+        # 客户端消费过慢导致队列溢出，断开后由客户端携带游标重连补齐
+        self.overflowed = False
+
+    def offer(self, item: dict) -> None:
+        try:
+            self.queue.put_nowait(item)
+        except asyncio.QueueFull:
+            self.overflowed = True
+
+
+class PipelineEventBus:
+    """
+    流水线事件推送
+
+    事件按递增序号保存在有限长度的历史中，订阅时可携带游标只补发错过的事件；
+    游标形如 <进程启动标识>-<序号>，游标来自之前的进程或早于保留的历史时推送 reset 事件，客户端需重新获取完整快照
+    """
+
+    # 游标已过期，需要重新获取快照
+    RESET = "reset"
+
+    def __init__(self, epoch: str = '', capacity: int = 1000, subscriber_queue_size: int = 1000):
+        """
+        :params:
+            ``epoch``:                  进程启动标识，重启后序号从 0 开始，游标需与之匹配
+            ``capacity``:               保留的历史事件数
+            ``subscriber_queue_size``:  单个订阅者的待发送队列容量
+        """
+        self._lock = threading.Lock()
+        self._epoch = epoch
+        self._seq = 0
+        self._history: deque[dict] = deque(maxlen=capacity)
+        self._subscribers: set[_Subscriber] = set()
+        self._subscriber_queue_size = subscriber_queue_size
+
+    @property
+    def last_id(self) -> str:
+        return self._event_id(self._seq)
+
+    def _event_id(self, seq: int) -> str:
+        return f"{self._epoch}-{seq}"
+
+    def _parse(self, event_id: str) -> Optional[int]:
+        """
+        游标换算为序号，不属于当前进程的游标返回 None
+        """
+        epoch, _, seq = event_id.rpartition('-')
+        if epoch != self._epoch or not seq.isdigit():
+            return None
+        return int(seq)
+
+    def publish(self, event: str, data: dict[str, Any]) -> None:
+        """
+        发布事件，可在任意线程调用
+        """
+        with self._lock:
+            self._seq += 1
+            item = {'id': self._seq, 'event': event, 'data': data}
+            self._history.append(item)
+            subscribers = list(self._subscribers)
+
+        for subscriber in subscribers:
+            subscriber.loop.call_soon_threadsafe(subscriber.offer, item)
+
+    def _subscribe(self, after: Optional[str]) -> tuple[_Subscriber, list[dict]]:
+        subscriber = _Subscriber(asyncio.get_running_loop(), self._subscriber_queue_size)
+        seq = self._parse(after) if after else None
+        with self._lock:
+            self._subscribers.add(subscriber)
+            if not after or seq == self._seq:
+                missed = []
+            elif seq is not None and seq < self._seq and self._history and seq >= self._history[0]['id'] - 1:
+                missed = [item for item in self._history if item['id'] > seq]
+            else:
+                missed = [{'id': self._seq, 'event': self.RESET, 'data': {}}]
+        return subscriber, missed
+
+    def _unsubscribe(self, subscriber: _Subscriber) -> None:
+        with self._lock:
+            self._subscribers.discard(subscriber)
+
+    def _format(self, item: dict) -> str:
+        data = json.dumps(item['data'], ensure_ascii=False)
+        return f"id: {self._event_id(item['id'])}\nevent: {item['event']}\ndata: {data}\n\n"
+
+    async def stream(self,
+                     after: Optional[str] = None,
+                     is_disconnected: Optional[Callable[[], Awaitable[bool]]] = None,
+                     heartbeat: float = 15) -> AsyncIterator[str]:
+        """
+        以 Server-Sent Events 格式输出事件
+
+        :params:
+            ``after``:              游标，只输出该游标之后的事件
+            ``is_disconnected``:    检测客户端是否断开
+            ``heartbeat``:          心跳间隔（秒）
+        """
+        subscriber, missed = self._subscribe(after)
+        try:
+            yield "retry: 3000\n\n"
+            for item in missed:
+                yield self._format(item)
+
+            while not subscriber.overflowed:
+                try:
+                    item = await asyncio.wait_for(subscriber.queue.get(), timeout=heartbeat)
+                except asyncio.TimeoutError:
+                    if is_disconnected and await is_disconnected():
+                        break
+                    yield ": heartbeat\n\n"
+                    continue
+                yield self._format(item)
+        finally:
+            self._unsubscribe(subscriber)
@@ -0,0 +1,251 @@
+from typing import Callable, Optional, Union, Any
+
+from maa_api.model.utils import Message
+
+# 根据消息详情生成日志文本
+MessageFormatter = Callable[[Any], str]
+# 从回调消息中取出格式化器的键及其详情
+MessageKeyGetter = Callable[[dict], tuple[str, Any]]
+
+
+class MessageFormatterRegistry:
+    """
+    回调消息格式化注册表
+
+    以 (消息类型, what/task) 为键注册格式化函数，每条消息只执行与其匹配的格式化函数；
+    新增的原子任务或连接信息只需注册，无需修改回调处理逻辑
+    """
+
+    def __init__(self):
+        self._key_getters: dict[Message, MessageKeyGetter] = {}
+        self._formatters: dict[tuple[Message, str], MessageFormatter] = {}
+
+    def register_key(self, message: Message, key_getter: MessageKeyGetter) -> None:
+        """
+        注册消息类型的键提取函数
+
+        :params:
+            ``message``:    消息类型
+            ``key_getter``: 从消息中取出 (键, 详情) 的函数
+        """
+        self._key_getters[message] = key_getter
+
+    def register(self, message: Message, key: str, formatter: Union[MessageFormatter, str, None] = None):
+        """
+        注册格式化函数，不传 formatter 时可作为装饰器使用
+
+        :params:
+            ``message``:    消息类型
+            ``key``:        连接信息及原子任务额外信息为 what，原子任务为 task
+            ``formatter``:  格式化函数，或固定的日志文本
+        """
+        if formatter is None:
+            def decorator(func: MessageFormatter) -> MessageFormatter:
+                self._formatters[(message, key)] = func
+                return func
+            return decorator
+
+        if isinstance(formatter, str):
+            text = formatter
+            formatter = lambda _: text
+        self._formatters[(message, key)] = formatter
+        return formatter
+
+    def format(self, message: Message, d: dict) -> Optional[str]:
+        """
+        格式化回调消息
+
+        :return: 日志文本，未注册的消息返回 None
+        """
+        key_getter = self._key_getters.get(message)
+        if key_getter is None:
+            return None
+
+        try:
+            key, details = key_getter(d)
+            formatter = self._formatters.get((message, key))
+            if formatter is None:
+                return None
+            return formatter(details)
+        except Exception:
+            return f"Error: {message} {d}"
+
+
+message_formatters = MessageFormatterRegistry()
+register_formatter = message_formatters.register
+
+message_formatters.register_key(Message.ConnectionInfo, lambda d: (d.get('what', ''), d.get('details', '')))
+message_formatters.register_key(Message.SubTaskStart, lambda d: (d.get('details', {}).get('task', ''), d.get('details', {})))
+message_formatters.register_key(Message.SubTaskExtraInfo, lambda d: (d.get('what', ''), d.get('details', {})))
+
+# 连接信息
+register_formatter(Message.ConnectionInfo, 'ConnectFaild', lambda details: f"模拟器连接失败 {details}")
+register_formatter(Message.ConnectionInfo, 'Connected', "模拟器连接成功")
+register_formatter(Message.ConnectionInfo, 'UnsupportedResolution', lambda details: f"模拟器分辨率不被支持 {details}")
+register_formatter(Message.ConnectionInfo, 'ResolutionError', lambda details: f"分辨率获取错误 {details}")
+register_formatter(Message.ConnectionInfo, 'Reconnecting', lambda details: f"模拟器连接断开(adb/模拟器异常) 正在重连 {details}")
+register_formatter(Message.ConnectionInfo, 'Reconnected', lambda details: f"模拟器连接断开(adb/模拟器异常) 重连成功 {details}")
+register_formatter(Message.ConnectionInfo, 'Disconnect', lambda details: f"模拟器连接断开(adb/模拟器异常) 重连失败 {details}")
+register_formatter(Message.ConnectionInfo, 'ScreencapFailed', lambda details: f"截图失败(adb/模拟器异常) {details}")
+register_formatter(Message.ConnectionInfo, 'TouchModeNotAvailable', lambda details: f"不支持的触控模式 {details}")
+
+# 开始原子任务
+register_formatter(Message.SubTaskStart, 'StartButton2', lambda details: f"已开始战斗 {details.get('exec_times', '')} 次")
+register_formatter(Message.SubTaskStart, 'MedicineConfirm', '使用理智药')
+register_formatter(Message.SubTaskStart, 'ExpiringMedicineConfirm', '使用 48 小时内过期的理智药')
+register_formatter(Message.SubTaskStart, 'StoneConfirm', '碎石')
+register_formatter(Message.SubTaskStart, 'RecruitRefreshConfirm', '刷新标签')
+register_formatter(Message.SubTaskStart, 'RecruitConfirm', '确认招募')
+register_formatter(Message.SubTaskStart, 'RecruitNowConfirm', '使用加急许可')
+register_formatter(Message.SubTaskStart, 'ReportToPenguinStats', '汇报到企鹅数据统计')
+register_formatter(Message.SubTaskStart, 'ReportToYituliu', '汇报到一图流大数据')
+register_formatter(Message.SubTaskStart, 'InfrastDormDoubleConfirmButton', '请进行基建宿舍的二次确认')
+register_formatter(Message.SubTaskStart, 'StartExplore', lambda details: f"已开始探索 {details.get('exec_times', '')} 次")
+register_formatter(Message.SubTaskStart, 'StageTraderInvestConfirm', '已投资源石锭')
+register_formatter(Message.SubTaskStart, 'StageTraderInvestSystemFull', '投资达到了游戏上限')
+register_formatter(Message.SubTaskStart, 'ExitThenAbandon', '已放弃本次探索')
+register_formatter(Message.SubTaskStart, 'MissionCompletedFlag', '战斗完成')
+register_formatter(Message.SubTaskStart, 'MissionFailedFlag', '战斗失败')
+register_formatter(Message.SubTaskStart, 'MissionFailedFlag2', '战斗失败')
+register_formatter(Message.SubTaskStart, 'StageTraderEnter', '节点：诡异行商')
+register_formatter(Message.SubTaskStart, 'StageSafeHouseEnter', '节点：安全的角落')
+# register_formatter(Message.SubTaskStart, 'StageEncounterEnter', '节点：不期而遇')
+register_formatter(Message.SubTaskStart, 'StageCombatDpsEnter', '关卡：普通作战')
+register_formatter(Message.SubTaskStart, 'StageEmergencyDps', '关卡：紧急作战')
+register_formatter(Message.SubTaskStart, 'StageDreadfulFoe', '关卡：险路恶敌')
+
+# 原子任务额外信息
+register_formatter(Message.SubTaskExtraInfo, 'RecruitTagsDetected', lambda details: f"公招识别结果：{details.get('tags', '')}")
+register_formatter(Message.SubTaskExtraInfo, 'ReCruitSpecialTag', lambda details: f"识别到特殊Tag：{details.get('tag', '')}")
+register_formatter(Message.SubTaskExtraInfo, 'RecruitResult', lambda details: f"{details.get('level', '')} ⭐ Tags")
+register_formatter(Message.SubTaskExtraInfo, 'RecruitTagsRefreshed', "已刷新Tags")
+register_formatter(Message.SubTaskExtraInfo, 'EnterFacility', lambda details: f"当前设施：{details.get('facility', '')} {details.get('index', '')}")
+register_formatter(Message.SubTaskExtraInfo, 'StageInfo', lambda details: f"开始战斗：{details.get('name', '')}")
+register_formatter(Message.SubTaskExtraInfo, 'StageInfoError', "关卡识别错误")
+register_formatter(Message.SubTaskExtraInfo, 'RoguelikeEvent', lambda details: f"事件：{details.get('name', '')}")
+register_formatter(Message.SubTaskExtraInfo, 'SanityBeforeStage', lambda details: f"当前理智：{details.get('current_sanity', '')}/{details.get('max_sanity', '')}")
+
+@register_formatter(Message.SubTaskExtraInfo, 'StageDrops')
+def _stage_drops(details: dict) -> str:
+    drop_statistics = '\n'.join(
+        [f"{item.get('itemName', '')}: {item.get('quantity', '')}(+{item.get('addQuantity', '')})" for item in details.get('stats', [])]
+    )
+    return f"{details.get('stars', '')}⭐通关{details.get('stage', {}).get('stageCode', '')} \n掉落统计: \n{drop_statistics}"
+
+
+if __name__ == "__main__":
+    # 微基准：对比逐条构建完整字典的旧实现与注册表实现的消息处理速率
+    import timeit
+
+    def legacy_format(m: Message, d: dict) -> Optional[str]:
+        # 旧回调中日志格式化部分的原样拷贝，每条消息都重新构建完整的字典
+        log = None
+
+        # 连接信息
+        if m == Message.ConnectionInfo:
+            try:
+                con_what = d.get('what', '')
+                con_details = d.get('details', '')
+
+                con_what_infos = {
+                    'ConnectFaild': f"模拟器连接失败 {con_details}",
+                    'Connected': f"模拟器连接成功",
+                    'UnsupportedResolution': f"模拟器分辨率不被支持 {con_details}",
+                    'ResolutionError': f"分辨率获取错误 {con_details}",
+                    'Reconnecting': f"模拟器连接断开(adb/模拟器异常) 正在重连 {con_details}",
+                    'Reconnected': f"模拟器连接断开(adb/模拟器异常) 重连成功 {con_details}",
+                    'Disconnect': f"模拟器连接断开(adb/模拟器异常) 重连失败 {con_details}",
+                    'ScreencapFailed': f"截图失败(adb/模拟器异常) {con_details}",
+                    'TouchModeNotAvailable': f"不支持的触控模式 {con_details}"
+                }
+
+                if con_what in con_what_infos:
+                    log = con_what_infos[con_what]
+            except:
+                log = f"Error: {m} {d}"
+
+
+        # 开始原子任务
+        if m == Message.SubTaskStart:
+            try:
+                sub_details = d.get('details', {})
+                sub_task = sub_details.get('task', '')
+
+                sub_task_info = {
+                    'StartButton2': f"已开始战斗 {sub_details.get('exec_times', '')} 次",
+                    'MedicineConfirm': '使用理智药',
+                    'ExpiringMedicineConfirm': '使用 48 小时内过期的理智药',
+                    'StoneConfirm': '碎石',
+                    'RecruitRefreshConfirm': '刷新标签',
+                    'RecruitConfirm': '确认招募',
+                    'RecruitNowConfirm': '使用加急许可',
+                    'ReportToPenguinStats': '汇报到企鹅数据统计',
+                    'ReportToYituliu': '汇报到一图流大数据',
+                    'InfrastDormDoubleConfirmButton': '请进行基建宿舍的二次确认',
+                    'StartExplore': f"已开始探索 {sub_details.get('exec_times', '')} 次",
+                    'StageTraderInvestConfirm': '已投资源石锭',
+                    'StageTraderInvestSystemFull': '投资达到了游戏上限',
+                    'ExitThenAbandon': '已放弃本次探索',
+                    'MissionCompletedFlag': '战斗完成',
+                    'MissionFailedFlag': '战斗失败',
+                    'MissionFailedFlag2': '战斗失败',
+                    'StageTraderEnter': '节点：诡异行商',
+                    'StageSafeHouseEnter': '节点：安全的角落',
+                    # 'StageEncounterEnter': '节点：不期而遇',
+                    'StageCombatDpsEnter': '关卡：普通作战',
+                    'StageEmergencyDps': '关卡：紧急作战',
+                    'StageDreadfulFoe': '关卡：险路恶敌'
+                }
+
+                if sub_task in sub_task_info:
+                    log = sub_task_info[sub_task]
+            except:
+                log = f"Error: {m} {d}"
+
+        # 原子任务额外信息
+        if m == Message.SubTaskExtraInfo:
+            try:
+                sub_what = d.get('what', '')
+                sub_details = d.get('details', {})
+
+                drop_statistics = '\n'.join(
+                    [f"{item.get('itemName', '')}: {item.get('quantity', '')}(+{item.get('addQuantity', '')})" for item in sub_details.get('stats', [])]    
+                )
+
+                sub_task_extra_info = {
+                    'RecruitTagsDetected': f"公招识别结果：{sub_details.get('tags', '')}",
+                    'ReCruitSpecialTag': f"识别到特殊Tag：{sub_details.get('tag', '')}",
+                    'RecruitResult': f"{sub_details.get('level', '')} ⭐ Tags",
+                    'RecruitTagsRefreshed': "已刷新Tags",
+                    'EnterFacility': f"当前设施：{sub_details.get('facility', '')} {sub_details.get('index', '')}",
+                    'StageInfo': f"开始战斗：{sub_details.get('name', '')}",
+                    'StageInfoError': "关卡识别错误",
+                    'RoguelikeEvent': f"事件：{sub_details.get('name', '')}",
+                    'SanityBeforeStage': f"当前理智：{sub_details.get('current_sanity', '')}/{sub_details.get('max_sanity', '')}",
+                    'StageDrops': f"{sub_details.get('stars', '')}⭐通关{sub_details.get('stage', {}).get('stageCode', '')} \n掉落统计: \n{drop_statistics}"
+                }
+
+                if sub_what in sub_task_extra_info:
+                    log = sub_task_extra_info[sub_what]
+            except :
+                log = f"Error: {m} {d}"
+
+        return log
+
+    stats = [{'itemName': f'item{i}', 'quantity': i, 'addQuantity': 1} for i in range(8)]
+    # 模拟战斗及肉鸽中的消息分布，大部分原子任务消息没有对应的日志
+    messages = [
+        (Message.SubTaskStart, {'details': {'task': 'Roguelike@StageTraderInvestConfirm'}}),
+        (Message.SubTaskStart, {'details': {'task': 'StartButton2', 'exec_times': 3}}),
+        (Message.SubTaskStart, {'details': {'task': 'Roguelike@Abandon'}}),
+        (Message.SubTaskExtraInfo, {'what': 'StageDrops', 'details': {'stars': 3, 'stage': {'stageCode': '1-7'}, 'stats': stats}}),
+        (Message.SubTaskExtraInfo, {'what': 'Depot', 'details': {'stats': stats}}),
+        (Message.SubTaskExtraInfo, {'what': 'SanityBeforeStage', 'details': {'current_sanity': 100, 'max_sanity': 135}}),
+        (Message.ConnectionInfo, {'what': 'Connected', 'details': {}}),
+        (Message.TaskChainStart, {'taskid': 1}),
+    ]
+
+    rounds = 20000
+    for name, func in (("legacy", legacy_format), ("registry", message_formatters.format)):
+        elapsed = timeit.timeit(lambda: [func(m, d) for m, d in messages], number=rounds)
+        print(f"{name:>8}: {rounds * len(messages) / elapsed:,.0f} msg/s")
@@ -0,0 +1,114 @@
+import os
+import json
+import time
+import hashlib
+import threading
+import requests
+
+from pathlib import Path
+from typing import Any, Optional
+
+from maa_api.log import logger
+from .utils import HttpUtils
+
+
+class CachedResponse:
+    def __init__(self, content: bytes, sha256: str, changed: bool, stale: bool):
+        self.content = content
+        # 内容的 sha256 摘要
+        self.sha256 = sha256
+        # 内容与上一次缓存的不同（首次获取也视为变化）
+        self.changed = changed
+        # 网络请求失败，返回的是已过期的缓存
+        self.stale = stale
+
+    def json(self) -> Any:
+        return json.loads(self.content)
+
+
+class HttpCache:
+    """
+    HTTP 响应磁盘缓存
+
+    有效期内直接返回缓存，不访问网络；过期后携带 ETag / Last-Modified 发起条件请求，304 时沿用缓存；
+    网络异常或服务端错误时返回过期缓存，没有缓存时抛出异常
+    """
+
+    def __init__(self, cache_dir: Path):
+        self.cache_dir = cache_dir
+        self.cache_dir.mkdir(parents=True, exist_ok=True)
+        self._lock = threading.Lock()
+
+    def _paths(self, url: str) -> tuple[Path, Path]:
+        key = hashlib.sha1(url.encode('utf-8')).hexdigest()
+        return self.cache_dir / f"{key}.json", self.cache_dir / f"{key}.body"
+
+    def _load(self, url: str) -> Optional[tuple[dict, bytes]]:
+        meta_path, body_path = self._paths(url)
+        try:
+            with meta_path.open('r', encoding='utf-8') as f:
+                meta = json.load(f)
+            content = body_path.read_bytes()
+        except (OSError, ValueError):
+            return None
+        if meta.get('url') != url or hashlib.sha256(content).hexdigest() != meta.get('sha256'):
+            return None
+        return meta, content
+
+    def _save(self, url: str, meta: dict, content: Optional[bytes] = None) -> None:
+        meta_path, body_path = self._paths(url)
+        if content is not None:
+            tmp_path = body_path.with_suffix('.body.tmp')
+            tmp_path.write_bytes(content)
+            os.replace(tmp_path, body_path)
+        tmp_path = meta_path.with_suffix('.json.tmp')
+        with tmp_path.open('w', encoding='utf-8') as f:
+            json.dump({**meta, 'url': url}, f, ensure_ascii=False)
+        os.replace(tmp_path, meta_path)
+
+    def get(self, url: str, ttl: float, timeout: Optional[float] = None) -> CachedResponse:
+        """
+        :params:
+            ``url``:     请求地址
+            ``ttl``:     缓存有效期（秒），有效期内不访问网络
+            ``timeout``: 已有缓存时的请求超时，避免离线时长时间等待
+        """
+        with self._lock:
+            cached = self._load(url)
+        if cached is not None:
+            meta, content = cached
+            if time.time() - meta.get('fetched_at', 0) < ttl:
+                return CachedResponse(content, meta['sha256'], False, False)
+
+        headers = {}
+        if cached is not None:
+            if meta.get('etag'):
+                headers['If-None-Match'] = meta['etag']
+            if meta.get('last_modified'):
+                headers['If-Modified-Since'] = meta['last_modified']
+
+        try:
+            response = HttpUtils.get(url, headers=headers, timeout=timeout if cached is not None else None)
+            if response.status_code == 304 and cached is not None:
+                with self._lock:
+                    self._save(url, {**meta, 'fetched_at': time.time()})
+                return CachedResponse(content, meta['sha256'], False, False)
+            response.raise_for_status()
+        except requests.RequestException as e:
+            if cached is None:
+                raise
+            logger.warning(f"请求失败，使用过期缓存 {url}: {e}")
+            return CachedResponse(content, meta['sha256'], False, True)
+
+        new_content = response.content
+        sha256 = hashlib.sha256(new_content).hexdigest()
+        new_meta = {
+            'etag': response.headers.get('ETag'),
+            'last_modified': response.headers.get('Last-Modified'),
+            'sha256': sha256,
+            'fetched_at': time.time()
+        }
+        with self._lock:
+            self._save(url, new_meta, new_content)
+        changed = cached is None or cached[0]['sha256'] != sha256
+        return CachedResponse(new_content, sha256, changed, False)
@@ -0,0 +1,284 @@
+import os
+import time
+import shutil
+import hashlib
+import tarfile
+import zipfile
+
+from pathlib import Path, PurePosixPath
+from typing import IO, Optional
+
+from maa_api.log import logger
+from .manifest import CoreManifest
+
+# 流式比较及写入的块大小
+_BLOCK_SIZE = 1024 * 1024
+
+
+class CoreInstaller:
+    """
+    MaaCore 版本化安装
+
+    每个版本解压到 versions/<版本号> 目录，current 符号链接指向当前版本，切换版本时原子替换链接；
+    与上一版本内容相同的文件直接硬链接，不重复写入；保留最近的若干个版本用于回滚。
+    不支持符号链接的系统改为原子替换 current.version 文件记录当前版本。
+    旧的平铺安装（文件直接位于根目录）视为上一版本参与硬链接比较
+    """
+
+    VERSIONS_DIR = 'versions'
+    CURRENT_LINK = 'current'
+    CURRENT_FILE = 'current.version'
+
+    def __init__(self, root: Path, keep_versions: int = 2):
+        """
+        :params:
+            ``root``:           安装根目录
+            ``keep_versions``:  除当前版本外保留的旧版本数
+        """
+        self.root = Path(root)
+        self.versions_path = self.root / self.VERSIONS_DIR
+        self.keep_versions = keep_versions
+
+    def active_path(self) -> Path:
+        """
+        当前版本所在目录，尚未使用版本化安装时为根目录；
+        版本文件只在无法切换符号链接时写入，存在时优先于符号链接
+        """
+        try:
+            name = (self.root / self.CURRENT_FILE).read_text(encoding='utf-8').strip()
+            if name and (self.versions_path / name).is_dir():
+                return self.versions_path / name
+        except FileNotFoundError:
+            pass
+        link = self.root / self.CURRENT_LINK
+        if link.is_dir():
+            return link.resolve()
+        return self.root
+
+    def staging_path(self, version: str) -> Path:
+        return self.versions_path / f".staging-{self._dir_name(version)}"
+
+    @staticmethod
+    def _dir_name(version: str) -> str:
+        return version.replace('/', '_').replace('\\', '_')
+
+    @staticmethod
+    def _safe_target(staging: Path, name: str) -> Path:
+        relative = PurePosixPath(name)
+        if relative.is_absolute() or '..' in relative.parts:
+            raise RuntimeError(f"更新包包含非法路径: {name}")
+        return staging.joinpath(*relative.parts)
+
+    @staticmethod
+    def _contained(staging: Path, path: Path) -> bool:
+        """
+        路径解析符号链接后是否仍位于临时目录内
+        """
+        root = os.path.realpath(staging)
+        return os.path.commonpath([root, os.path.realpath(path)]) == root
+
+    def extract(self, fileobj: IO[bytes], filename: str, staging: Path) -> dict[str, dict]:
+        """
+        从文件对象流式解压到临时目录，返回各文件的大小和 sha256；
+        与当前版本内容相同的文件硬链接到当前版本，不写入数据
+        """
+        previous_path = self.active_path()
+        previous = CoreManifest.load(previous_path)
+        shutil.rmtree(staging, ignore_errors=True)
+        staging.mkdir(parents=True)
+
+        files = {}
+        stats = {'linked': 0, 'written': 0}
+
+        def write(name, src, size, mode=None):
+            target = self._safe_target(staging, name)
+            target.parent.mkdir(parents=True, exist_ok=True)
+            relative = PurePosixPath(name).as_posix()
+            entry = previous.files.get(relative) if previous is not None else None
+            files[relative], linked = self._write(src, size, target, previous_path / relative, entry)
+            stats['linked' if linked else 'written'] += 1
+            # 硬链接的文件与上一版本共享权限，不再修改
+            if mode is not None and not linked:
+                os.chmod(target, mode & 0o777)
+
+        if filename.endswith('.zip'):
+            with zipfile.ZipFile(fileobj, 'r') as zfile:
+                # 按条目在文件中的顺序解压，边下载边解压时顺序读取
+                for info in sorted(zfile.infolist(), key=lambda info: info.header_offset):
+                    if info.is_dir():
+                        self._safe_target(staging, info.filename).mkdir(parents=True, exist_ok=True)
+                        continue
+                    with zfile.open(info) as src:
+                        write(info.filename, src, info.file_size)
+        elif filename.endswith('.tar.gz'):
+            links = []
+            with tarfile.open(fileobj=fileobj, mode='r|gz') as tfile:
+                for member in tfile:
+                    if member.isdir():
+                        self._safe_target(staging, member.name).mkdir(parents=True, exist_ok=True)
+                    elif member.isfile():
+                        write(member.name, tfile.extractfile(member), member.size, member.mode)
+                    elif member.issym() or member.islnk():
+                        links.append(member)
+            # 链接在所有文件解压后创建，目标可能位于链接之后；
+            # 链接及其目标都必须位于临时目录内，避免经由链接读写目录外的文件
+            for member in links:
+                target = self._safe_target(staging, member.name)
+                if not self._contained(staging, target.parent):
+                    raise RuntimeError(f"更新包包含非法路径: {member.name}")
+                target.parent.mkdir(parents=True, exist_ok=True)
+                if member.issym():
+                    if PurePosixPath(member.linkname).is_absolute() or not self._contained(staging, target.parent / member.linkname):
+                        raise RuntimeError(f"更新包包含非法链接: {member.name} -> {member.linkname}")
+                    os.symlink(member.linkname, target)
+                else:
+                    source = self._safe_target(staging, member.linkname)
+                    if not self._contained(staging, source):
+                        raise RuntimeError(f"更新包包含非法链接: {member.name} -> {member.linkname}")
+                    os.link(source, target)
+            # 之后创建的链接可能改变之前链接的解析结果，全部创建后再检查一遍
+            for member in links:
+                if member.issym() and not self._contained(staging, self._safe_target(staging, member.name)):
+                    raise RuntimeError(f"更新包包含非法链接: {member.name} -> {member.linkname}")
+        else:
+            raise RuntimeError(f"不支持的更新包格式: {filename}")
+
+        logger.info(f"解压完成，写入 {stats['written']} 个文件，复用 {stats['linked']} 个未变化的文件")
+        return files
+
+    @staticmethod
+    def _write(src: IO[bytes], size: int, target: Path, previous_file: Path,
+               entry: Optional[dict]) -> tuple[dict, bool]:
+        """
+        写入单个文件；大小与上一版本相同时边读边比较，内容一致则硬链接，出现差异时补写已比较的前缀后继续写入
+
+        :return: (文件大小及 sha256, 是否硬链接到上一版本)
+        """
+        sha256 = hashlib.sha256()
+        if entry is None or entry['size'] != size or not previous_file.is_file():
+            with open(target, 'wb') as out:
+                for block in iter(lambda: src.read(_BLOCK_SIZE), b''):
+                    sha256.update(block)
+                    out.write(block)
+            return {'size': size, 'sha256': sha256.hexdigest()}, False
+
+        out = None
+        matched = 0
+        with open(previous_file, 'rb') as old:
+            try:
+                for block in iter(lambda: src.read(_BLOCK_SIZE), b''):
+                    sha256.update(block)
+                    if out is None:
+                        if old.read(len(block)) == block:
+                            matched += len(block)
+                            continue
+                        out = open(target, 'wb')
+                        old.seek(0)
+                        remaining = matched
+                        while remaining:
+                            data = old.read(min(_BLOCK_SIZE, remaining))
+                            out.write(data)
+                            remaining -= len(data)
+                    out.write(block)
+            finally:
+                if out is not None:
+                    out.close()
+
+        digest = sha256.hexdigest()
+        if out is not None:
+            return {'size': size, 'sha256': digest}, False
+        if digest != entry['sha256']:
+            # 内容一致但与清单记录不符，说明上一版本清单已失效，复制一份
+            shutil.copy2(previous_file, target)
+            return {'size': size, 'sha256': digest}, False
+        try:
+            os.link(previous_file, target)
+        except OSError:
+            # 不支持硬链接的文件系统
+            shutil.copy2(previous_file, target)
+        return {'size': size, 'sha256': digest}, True
+
+    def commit(self, staging: Path, version: str, files: dict[str, dict]) -> Path:
+        """
+        将临时目录发布为新版本并切换为当前版本
+        """
+        version_path = self.versions_path / self._dir_name(version)
+        if version_path.exists():
+            if version_path.resolve() == self.active_path().resolve():
+                # 重新安装当前版本时使用新目录，旧目录保留到被清理
+                version_path = self.versions_path / f"{self._dir_name(version)}-{int(time.time())}"
+            else:
+                shutil.rmtree(version_path)
+        os.replace(staging, version_path)
+        CoreManifest(version, files).save(version_path)
+        self.activate(version_path.name)
+        self.prune()
+        return version_path
+
+    def activate(self, name: str) -> None:
+        """
+        原子切换当前版本
+        """
+        link = self.root / self.CURRENT_LINK
+        tmp_link = self.root / f"{self.CURRENT_LINK}.tmp"
+        version_file = self.root / self.CURRENT_FILE
+        try:
+            self._remove_link(tmp_link)
+            os.symlink(Path(self.VERSIONS_DIR) / name, tmp_link, target_is_directory=True)
+            os.replace(tmp_link, link)
+        except OSError as e:
+            logger.warning(f"无法切换符号链接，改用版本文件记录当前版本: {e}")
+            tmp_file = self.root / f"{self.CURRENT_FILE}.tmp"
+            tmp_file.write_text(name, encoding='utf-8')
+            os.replace(tmp_file, version_file)
+            # 版本文件优先于符号链接，旧链接删除失败时也不影响切换
+            for stale in (tmp_link, link):
+                try:
+                    self._remove_link(stale)
+                except OSError as e:
+                    logger.warning(f"旧的版本链接删除失败 {stale}: {e}")
+        else:
+            # 链接切换成功后删除之前回退时写入的版本文件
+            version_file.unlink(missing_ok=True)
+        logger.info(f"MaaCore 当前版本已切换为 {name}")
+
+    @staticmethod
+    def _remove_link(path: Path) -> None:
+        if not path.is_symlink():
+            return
+        try:
+            path.unlink()
+        except OSError:
+            # Windows 的目录符号链接需按目录删除
+            os.rmdir(path)
+
+    def versions(self) -> list[Path]:
+        """
+        已安装的版本，按安装时间从新到旧排列
+        """
+        if not self.versions_path.exists():
+            return []
+        paths = [path for path in self.versions_path.iterdir() if path.is_dir() and not path.name.startswith('.')]
+        return sorted(paths, key=lambda path: CoreManifest.path_of(path).stat().st_mtime
+                      if CoreManifest.path_of(path).exists() else 0, reverse=True)
+
+    def prune(self) -> None:
+        """
+        清理超出保留数量的旧版本，当前版本始终保留
+        """
+        active = self.active_path().resolve()
+        old_versions = [path for path in self.versions() if path.resolve() != active]
+        for path in old_versions[self.keep_versions:]:
+            shutil.rmtree(path, ignore_errors=True)
+            logger.info(f"已清理 MaaCore 旧版本 {path.name}")
+
+    def rollback(self) -> Optional[str]:
+        """
+        回滚到上一个已安装的版本，返回切换后的版本目录名
+        """
+        active = self.active_path().resolve()
+        old_versions = [path for path in self.versions() if path.resolve() != active]
+        if not old_versions:
+            return None
+        self.activate(old_versions[0].name)
+        return old_versions[0].name
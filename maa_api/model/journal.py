@@ -0,0 +1,131 @@
+import os
+import json
+import threading
+
+from pathlib import Path
+from typing import Any, Callable, Optional
+
+from maa_api.log import logger
+
+
+class PipelineJournal:
+    """
+    流水线状态日志
+
+    每次状态变更以一行 JSON 追加到 journal 文件，写入开销与流水线大小无关；
+    事件数达到阈值后将当前状态压缩为 snapshot 并清空 journal，重启时通过 snapshot + journal 回放恢复状态
+    """
+
+    # 新增任务 {id, task}
+    TASK_ADDED = "task_added"
+    # 任务状态变更 {id, status}
+    TASK_STATUS = "task_status"
+    # 任务归档为旧批次 {ids}
+    TASK_ARCHIVED = "task_archived"
+    # 删除超出保留批次数的旧任务 {ids}
+    TASK_REMOVED = "task_removed"
+    # 流水线状态变更 {status}
+    PIPELINE_STATUS = "pipeline_status"
+    # 追加日志 {log, seq}
+    LOG_APPENDED = "log_appended"
+    # 清空日志 {}
+    LOG_CLEARED = "log_cleared"
+
+    def __init__(self, journal_path: Path, snapshot_path: Path, compact_events: int = 1000):
+        """
+        :params:
+            ``journal_path``:   journal 文件路径
+            ``snapshot_path``:  snapshot 文件路径
+            ``compact_events``: 触发压缩的事件数
+        """
+        self.journal_path = journal_path
+        self.snapshot_path = snapshot_path
+        self.compact_events = compact_events
+        self._lock = threading.Lock()
+        self._file = None
+        self._events = 0
+
+    def append(self, event: str, **data: Any) -> None:
+        line = json.dumps({'event': event, **data}, ensure_ascii=False)
+        with self._lock:
+            if self._file is None:
+                self._file = self.journal_path.open('a', encoding='utf-8')
+            self._file.write(line + '\n')
+            self._file.flush()
+            self._events += 1
+
+    def should_compact(self) -> bool:
+        return self._events >= self.compact_events
+
+    def compact(self, state: Callable[[], dict]) -> None:
+        """
+        将当前状态写入 snapshot 并清空 journal
+
+        :params:
+            ``state``: 生成当前状态的函数，调用方需保证调用期间状态不被修改
+        """
+        with self._lock:
+            tmp_path = self.snapshot_path.with_suffix('.tmp')
+            with tmp_path.open('w', encoding='utf-8') as f:
+                json.dump(state(), f, ensure_ascii=False)
+            os.replace(tmp_path, self.snapshot_path)
+
+            if self._file is not None:
+                self._file.close()
+            self._file = self.journal_path.open('w', encoding='utf-8')
+            self._events = 0
+
+    def replay(self) -> Optional[dict]:
+        """
+        读取 snapshot 并回放 journal
+
+        :return: 恢复的状态，没有任何记录时返回 None
+        """
+        with self._lock:
+            state = None
+            if self.snapshot_path.exists():
+                with self.snapshot_path.open('r', encoding='utf-8') as f:
+                    state = json.load(f)
+
+            if self.journal_path.exists():
+                with self.journal_path.open('r', encoding='utf-8') as f:
+                    for line in f:
+                        try:
+                            event = json.loads(line)
+                        except json.JSONDecodeError:
+                            # 进程中断时最后一行可能写入不完整
+                            logger.warning(f"跳过损坏的流水线日志 {self.journal_path}: {line!r}")
+                            continue
+                        if state is None:
+                            state = {'status': None, 'tasks': {}, 'archived': [], 'logs': [], 'log_seq': 0}
+                        self._apply(state, event)
+                        self._events += 1
+
+            return state
+
+    def _apply(self, state: dict, event: dict) -> None:
+        name = event.get('event')
+        if name == self.TASK_ADDED:
+            state['tasks'][str(event['id'])] = event['task']
+        elif name == self.TASK_STATUS:
+            task = state['tasks'].get(str(event['id']))
+            if task is not None:
+                task['status'] = event['status']
+        elif name == self.TASK_ARCHIVED:
+            for task_id in event['ids']:
+                task = state['tasks'].get(str(task_id))
+                if task is not None:
+                    task['is_now'] = False
+            state.setdefault('archived', []).append(event['ids'])
+        elif name == self.TASK_REMOVED:
+            removed_ids = set(event['ids'])
+            for task_id in removed_ids:
+                state['tasks'].pop(str(task_id), None)
+            state['archived'] = [batch for batch in state.get('archived', []) if not removed_ids.issuperset(batch)]
+        elif name == self.PIPELINE_STATUS:
+            state['status'] = event['status']
+        elif name == self.LOG_APPENDED:
+            state['logs'].append(event['log'])
+            state['log_seq'] = event.get('seq', state.get('log_seq', 0))
+        elif name == self.LOG_CLEARED:
+            state['logs'] = []
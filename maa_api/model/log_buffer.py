@@ -0,0 +1,139 @@
+import json
+import bisect
+import threading
+
+from collections import deque
+from pathlib import Path
+from typing import Optional
+
+
+class LogBuffer:
+    """
+    流水线日志环形缓冲
+
+    内存中只保留最近 capacity 条日志，更早的日志按顺序溢写到磁盘文件；
+    每条日志分配递增序号，可按序号增量读取
+    """
+
+    # 溢写文件每隔多少条记录一次偏移量
+    INDEX_INTERVAL = 256
+
+    def __init__(self, capacity: int = 1000, spill_path: Optional[Path] = None):
+        """
+        :params:
+            ``capacity``:   内存中保留的日志条数
+            ``spill_path``: 溢写文件路径，为空时直接丢弃溢出的日志
+        """
+        self._lock = threading.Lock()
+        self._capacity = capacity
+        self._entries: deque[tuple[int, str]] = deque()
+        self._seq = 0
+        self._spill_path = spill_path
+        # 溢写文件的稀疏索引 (序号, 文件偏移)
+        self._spill_index: list[tuple[int, int]] = []
+        self._spill_count = 0
+        self._spill_first_seq: Optional[int] = None
+        self._truncate_spill()
+
+    @property
+    def last_seq(self) -> int:
+        return self._seq
+
+    def __len__(self) -> int:
+        return len(self._entries) + self._spill_count
+
+    def append(self, log: str) -> int:
+        """
+        追加日志
+
+        :return: 日志序号
+        """
+        with self._lock:
+            self._seq += 1
+            self._entries.append((self._seq, log))
+            if len(self._entries) > self._capacity:
+                self._spill(self._entries.popleft())
+            return self._seq
+
+    def resume(self, seq: int) -> None:
+        """
+        从指定序号之后继续编号，重启后接续上次进程的序号，客户端的游标不会大于新日志的序号
+        """
+        with self._lock:
+            self._seq = max(self._seq, seq)
+
+    def clear(self) -> None:
+        """
+        清空日志，序号继续递增以保证增量读取的游标不回退
+        """
+        with self._lock:
+            self._entries.clear()
+            self._truncate_spill()
+
+    def after(self, seq: int, limit: int) -> list[dict]:
+        """
+        获取序号大于 seq 的日志，按序号升序最多返回 limit 条
+        """
+        with self._lock:
+            result: list[dict] = []
+            if self._spill_first_seq is not None and seq + 1 < self._memory_first_seq():
+                result = self._read_spill(seq, limit)
+            for entry_seq, log in self._entries:
+                if len(result) >= limit:
+                    break
+                if entry_seq > seq:
+                    result.append({'seq': entry_seq, 'log': log})
+            return result
+
+    def tail(self, limit: int) -> list[dict]:
+        """
+        获取内存中最近的 limit 条日志
+        """
+        with self._lock:
+            entries = list(self._entries)[-limit:] if limit > 0 else []
+            return [{'seq': entry_seq, 'log': log} for entry_seq, log in entries]
+
+    def all(self) -> list[str]:
+        """
+        获取当前批次的全部日志，包括已溢写到磁盘的部分
+        """
+        return [entry['log'] for entry in self.after(0, len(self))]
+
+    def _memory_first_seq(self) -> int:
+        return self._entries[0][0] if self._entries else self._seq + 1
+
+    def _truncate_spill(self) -> None:
+        self._spill_index = []
+        self._spill_count = 0
+        self._spill_first_seq = None
+        if self._spill_path is not None:
+            self._spill_path.write_text('', encoding='utf-8')
+
+    def _spill(self, entry: tuple[int, str]) -> None:
+        if self._spill_path is None:
+            return
+        entry_seq, log = entry
+        with self._spill_path.open('ab') as f:
+            offset = f.tell()
+            f.write((json.dumps({'seq': entry_seq, 'log': log}, ensure_ascii=False) + '\n').encode('utf-8'))
+        if self._spill_count % self.INDEX_INTERVAL == 0:
+            self._spill_index.append((entry_seq, offset))
+        if self._spill_first_seq is None:
+            self._spill_first_seq = entry_seq
+        self._spill_count += 1
+
+    def _read_spill(self, seq: int, limit: int) -> list[dict]:
+        # 从不大于 seq + 1 的最近索引位置开始顺序读取
+        pos = bisect.bisect_right(self._spill_index, (seq + 1, float('inf'))) - 1
+        offset = self._spill_index[max(pos, 0)][1]
+
+        result = []
+        with self._spill_path.open('rb') as f:
+            f.seek(offset)
+            for line in f:
+                entry = json.loads(line)
+                if entry['seq'] > seq:
+                    result.append(entry)
+                    if len(result) >= limit:
+                        break
+        return result
@@ -0,0 +1,105 @@
+import os
+import json
+import time
+
+from pathlib import Path
+from typing import Optional
+
+from maa_api.log import logger
+from .downloader import file_sha256
+
+# 各平台的核心库文件名
+CORE_LIBRARIES = ('MaaCore.dll', 'libMaaCore.dylib', 'libMaaCore.so')
+
+
+class CoreManifest:
+    """
+    MaaCore 安装清单
+
+    安装时记录版本号及每个文件的大小和 sha256，读取版本号时无需加载核心库；
+    同时记录核心库的大小和修改时间，核心库被手动替换时清单视为无效
+    """
+
+    FILE_NAME = 'maa_manifest.json'
+    # 不属于安装内容的文件和目录
+    EXCLUDES = (FILE_NAME, 'cache', '.staging', 'versions', 'current', 'current.tmp', 'current.version')
+    # 安装目录下的更新包及下载中的临时文件
+    EXCLUDE_SUFFIXES = ('.part', '.chunks', '.tmp', '.zip', '.tar.gz')
+
+    def __init__(self, version: str, files: dict[str, dict], core: Optional[dict] = None,
+                 installed_at: Optional[float] = None):
+        self.version = version
+        # 相对路径 -> {size, sha256}
+        self.files = files
+        # 核心库 {name, size, mtime_ns}
+        self.core = core
+        self.installed_at = installed_at or time.time()
+
+    @staticmethod
+    def path_of(root: Path) -> Path:
+        return Path(root) / CoreManifest.FILE_NAME
+
+    @staticmethod
+    def scan(root: Path, excludes: tuple = ()) -> dict[str, dict]:
+        """
+        计算目录下所有文件的大小和 sha256
+        """
+        root = Path(root)
+        excludes = CoreManifest.EXCLUDES + tuple(excludes)
+        files = {}
+        for dirpath, dirnames, filenames in os.walk(root):
+            relative_dir = Path(dirpath).relative_to(root)
+            if relative_dir == Path('.'):
+                dirnames[:] = [name for name in dirnames if name not in excludes]
+                filenames = [name for name in filenames
+                             if name not in excludes and not name.endswith(CoreManifest.EXCLUDE_SUFFIXES)]
+            for name in filenames:
+                path = Path(dirpath) / name
+                files[(relative_dir / name).as_posix()] = {
+                    'size': path.stat().st_size,
+                    'sha256': file_sha256(path)
+                }
+        return files
+
+    @staticmethod
+    def core_stat(root: Path) -> Optional[dict]:
+        for name in CORE_LIBRARIES:
+            path = Path(root) / name
+            if path.exists():
+                stat = path.stat()
+                return {'name': name, 'size': stat.st_size, 'mtime_ns': stat.st_mtime_ns}
+        return None
+
+    @staticmethod
+    def load(root: Path) -> Optional['CoreManifest']:
+        """
+        读取安装清单，清单不存在、损坏或核心库已被替换时返回 None
+        """
+        try:
+            with CoreManifest.path_of(root).open('r', encoding='utf-8') as f:
+                data = json.load(f)
+            manifest = CoreManifest(data['version'], data['files'], data.get('core'), data.get('installed_at'))
+        except FileNotFoundError:
+            return None
+        except (OSError, ValueError, KeyError) as e:
+            logger.warning(f"MaaCore 安装清单无效: {e}")
+            return None
+
+        if manifest.core != CoreManifest.core_stat(root):
+            logger.warning("MaaCore 核心库与安装清单不一致")
+            return None
+        return manifest
+
+    def save(self, root: Path) -> None:
+        self.core = CoreManifest.core_stat(root)
+        data = {
+            'version': self.version,
+            'installed_at': self.installed_at,
+            'core': self.core,
+            'files': self.files
+        }
+        path = CoreManifest.path_of(root)
+        tmp_path = path.with_suffix('.json.tmp')
+        with tmp_path.open('w', encoding='utf-8') as f:
+            json.dump(data, f, ensure_ascii=False)
+        os.replace(tmp_path, path)
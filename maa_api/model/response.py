@@ -8,6 +8,7 @@ class ResponseCode(Enum):
     UNAUTHORIZED = 10401
     FORBIDDEN = 10403
     NOT_FOUND = 10404
+    SERVICE_UNAVAILABLE = 10503
     SERVER_ERROR = 50000
 
 class Response(BaseModel):
@@ -39,6 +40,10 @@ class Response(BaseModel):
     def not_found(cls, message: str = "not found", data: Any = None) -> "Response":
         return cls(code=ResponseCode.NOT_FOUND.value, message=message, data=data)
 
+    @classmethod
+    def service_unavailable(cls, message: str = "service unavailable", data: Any = None) -> "Response":
+        return cls(code=ResponseCode.SERVICE_UNAVAILABLE.value, message=message, data=data)
+
     @classmethod
     def server_error(cls, message: str = "server error", data: Any = None) -> "Response":
         return cls(code=ResponseCode.SERVER_ERROR.value, message=message, data=data)
\ No newline at end of file
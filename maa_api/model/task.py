@@ -1,27 +1,53 @@
+import io
 import os
 import json
+import time
 import pathlib
+import threading
 import urllib.request
 
+from contextlib import contextmanager
+from PIL import Image
 from pydantic import BaseModel, PrivateAttr
 from enum import Enum
 from typing import Optional, Any
 from datetime import datetime
-
-from .utils import HttpUtils
+from concurrent.futures import Future, TimeoutError as FutureTimeoutError
 
 from maa_api.model.asst import Asst
+from maa_api.model.callback import CallbackQueue, CallbackMessage
+from maa_api.model.formatter import message_formatters
+from maa_api.model.journal import PipelineJournal
+from maa_api.model.event import PipelineEventBus
+from maa_api.model.log_buffer import LogBuffer
+from maa_api.model.response import Response
 from maa_api.model.utils import Message, InstanceOptionType, Version
 from maa_api.model.updater import Updater
+from maa_api.model.worker import CoreWorker, CoreWorkerError, RemoteAsst
 from maa_api.config.config import Config
 from maa_api.config.path_config import LOG_PATH, LIB_PATH
 from maa_api.exception.response_exception import ResponseException
+from maa_api.service import adb_service, resource_service
 from maa_api.log import logger
 
 TASK_PIPELINE_LOG_DIR = LOG_PATH / "task_pipeline"
 TASK_PIPELINE_LOG_DIR.mkdir(parents=True, exist_ok=True)
 MAA_LIB_DIR = LIB_PATH / 'maa'
 MAA_LIB_DIR.mkdir(parents=True, exist_ok=True)
+# MaaCore 截图缓冲区大小，需容纳 1280x720 截图的 PNG 编码结果
+MAA_IMAGE_BUFFER_SIZE = 1280 * 720 * 4
+# 核心资源锁，热更新资源与启动任务互斥
+_core_resource_lock = threading.RLock()
+# Asst 实例配置：触控方案使用 maatouch，暂停下干员
+_ASST_OPTIONS = {
+    InstanceOptionType.touch_type: 'maatouch',
+    InstanceOptionType.deployment_with_pause: '1'
+}
+# 设备连接失败后的重试间隔（秒），每次失败翻倍
+DEVICE_RETRY_DELAY = 5
+DEVICE_RETRY_MAX_DELAY = 300
+# 进程启动标识，保证重启后 ETag 不与之前的版本号冲突
+_PIPELINE_EPOCH = format(int(datetime.now().timestamp()), 'x')
 class TaskStatus(Enum):
     # 等待执行
     PENDING = "pending"
@@ -66,89 +92,646 @@ class TaskPipelineStatus(str, Enum):
     # 命令被取消
     CANCELLED = "cancelled"
 
+class CoreInitPhase(str, Enum):
+    # 等待初始化
+    PENDING = "pending"
+    # 校验 MAA 版本
+    UPDATING = "updating"
+    # 加载核心资源
+    LOADING = "loading"
+    # 加载活动资源
+    LOADING_OTA = "loading_ota"
+    # 连接模拟器
+    CONNECTING = "connecting"
+    # 初始化完成
+    READY = "ready"
+    # MaaCore 工作进程异常退出，正在重启
+    RESTARTING = "restarting"
+    # 初始化失败
+    FAILED = "failed"
+
 class TaskPipeline(BaseModel):
+    device: str = ''
     status: TaskPipelineStatus = TaskPipelineStatus.IDLE
-    tasks: list[Task] = []
-    logs: list[str] = []
-    _task_dict: dict[str, Task] = {}
-    _asst: Optional[Asst] = PrivateAttr(None)
+    # 流水线任务 id -> 任务，id 由流水线分配，重启或更换 Asst 实例后不会重复
+    _task_dict: dict[int, Task] = PrivateAttr(default_factory=dict)
+    _next_task_id: int = PrivateAttr(1)
+    # 旧批次的任务 id，按归档顺序排列，只保留最近 _archive_batches 个批次
+    _archived_batches: list[list[int]] = PrivateAttr(default_factory=list)
+    _archive_batches: int = PrivateAttr(10)
+    # 当前 Asst 实例的 MaaCore 任务 id -> 流水线任务 id，MaaCore 任务 id 随实例从 1 重新编号
+    _core_task_ids: dict[int, int] = PrivateAttr(default_factory=dict)
+    _asst: Optional[Asst | RemoteAsst] = PrivateAttr(None)
+    # 回调路由参数
+    _route_arg: int = PrivateAttr(0)
+    # Asst 实例所属的 MaaCore 代数，热切换后落后的实例在空闲时重建
+    _core_generation: int = PrivateAttr(0)
+    # 添加、启动任务与更换 Asst 实例互斥，各设备互不影响
+    _core_lock: threading.RLock = PrivateAttr(default_factory=threading.RLock)
+    # 设备连接失败的原因，未连接的设备在使用时重新连接，失败后按退避间隔重试
+    _connect_error: Optional[str] = PrivateAttr(None)
+    _connect_delay: float = PrivateAttr(0)
+    _connect_retry_time: float = PrivateAttr(0)
+    _journal: Optional[PipelineJournal] = PrivateAttr(None)
+    _event_bus: PipelineEventBus = PrivateAttr(default_factory=lambda: PipelineEventBus(epoch=_PIPELINE_EPOCH))
+    _log_buffer: LogBuffer = PrivateAttr(None)
+    _lock: threading.RLock = PrivateAttr(default_factory=threading.RLock)
+    # 状态版本号，每次状态变更递增
+    _version: int = PrivateAttr(0)
+    # 按版本缓存的序列化快照 (版本号, ETag, 响应内容)
+    _snapshot_cache: Optional[tuple[int, str, bytes]] = PrivateAttr(None)
+    # 当前批次的完成信号，批次结束时以最终状态完成
+    _completion: Optional[Future] = PrivateAttr(None)
+
+    def __init__(self, **data):
+        super().__init__(**data)
+        device_tag = _device_tag(self.device)
+        self._journal = PipelineJournal(
+            journal_path=TASK_PIPELINE_LOG_DIR / f"pipeline_{device_tag}.journal.jsonl",
+            snapshot_path=TASK_PIPELINE_LOG_DIR / f"pipeline_{device_tag}.snapshot.json",
+            compact_events=Config.get_config('app', 'journal_compact_events', 1000)
+        )
+        self._log_buffer = LogBuffer(
+            capacity=Config.get_config('app', 'pipeline_log_capacity', 1000),
+            spill_path=TASK_PIPELINE_LOG_DIR / f"pipeline_{device_tag}.logs.jsonl"
+        )
+        self._archive_batches = Config.get_config('app', 'pipeline_archive_batches', 10)
+
+    @property
+    def event_bus(self) -> PipelineEventBus:
+        return self._event_bus
+
+    @property
+    def log_buffer(self) -> LogBuffer:
+        return self._log_buffer
+
+    @property
+    def connected(self) -> bool:
+        return self._asst is not None
+
+    @property
+    def connect_error(self) -> Optional[str]:
+        return self._connect_error
 
     def running(self) -> bool:
         return self._asst.running() if self._asst else False
+
+    def bind_asst(self, asst: Asst | RemoteAsst) -> None:
+        """
+        更换 Asst 实例，旧实例的任务 id 不再对应
+        """
+        with self._lock:
+            self._asst = asst
+            self._core_task_ids = {}
+            self._connect_error = None
+            self._connect_delay = 0
+
+    def connect_failed(self, error: str) -> float:
+        """
+        记录连接失败，返回距下次重试的秒数
+        """
+        self._connect_error = error
+        self._connect_delay = min(self._connect_delay * 2, DEVICE_RETRY_MAX_DELAY) if self._connect_delay else DEVICE_RETRY_DELAY
+        self._connect_retry_time = time.monotonic() + self._connect_delay
+        return self._connect_delay
+
+    def task_id_of(self, core_task_id: int) -> int:
+        """
+        MaaCore 任务 id 换算为流水线任务 id
+        """
+        with self._lock:
+            task_id = self._core_task_ids.get(core_task_id)
+        if task_id is None:
+            raise ResponseException(f"未知的任务 taskid={core_task_id}")
+        return task_id
     
     def _check_runing(self) -> None:
         if self.running():
             raise ResponseException("流水线任务正在运行中，不允许多实例访问")
+
+    def idle(self) -> bool:
+        """
+        核心未运行且没有已添加未执行的任务，此时可以更换 Asst 实例
+        """
+        with self._lock:
+            if any(task.is_now and task.status == TaskStatus.PENDING for task in self._task_dict.values()):
+                return False
+        return not self.running()
         
     def _to_serializable_dict(self):
+        """
+        快照内容，大小与保留的批次数及日志容量有关，不随历史增长；
+        日志只保留内存中最近 pipeline_log_capacity 条，已溢写到磁盘的更早日志不写入快照，重启后不再恢复
+        """
         pipeline_dict = {
+            'device': self.device,
             'status': self.status.value,
-            '_task_dict': {k: v.dict() for k, v in self._task_dict.items()},
-            'tasks': [task.dict() for task in self.tasks],
-            'logs': self.logs
+            'tasks': {k: v.dict() for k, v in self._task_dict.items()},
+            'archived': self._archived_batches,
+            'logs': [entry['log'] for entry in self._log_buffer.tail(len(self._log_buffer))],
+            'log_seq': self._log_buffer.last_seq
         }
         return pipeline_dict
-    
-    def _save_pipeline(self):
-        file_path = TASK_PIPELINE_LOG_DIR / "pipeline.json"
-        task_pipeline_dict = self._to_serializable_dict()
 
-        with file_path.open('w', encoding='utf-8') as f:
-            json.dump(task_pipeline_dict, f, ensure_ascii=False, indent=4)
+    def _prune_archived(self) -> None:
+        """
+        删除超出保留批次数的旧任务，调用方需持有 self._lock
+        """
+        excess = len(self._archived_batches) - self._archive_batches
+        if excess <= 0:
+            return
+        removed_ids = {task_id for batch in self._archived_batches[:excess] for task_id in batch}
+        del self._archived_batches[:excess]
+        for task_id in removed_ids:
+            self._task_dict.pop(task_id, None)
+        self._core_task_ids = {k: v for k, v in self._core_task_ids.items() if v not in removed_ids}
+        self._record(PipelineJournal.TASK_REMOVED, ids=sorted(removed_ids))
+
+    def _record(self, event: str, **data) -> None:
+        """
+        记录状态变更，调用方需持有 self._lock
+        """
+        self._version += 1
+        self._event_bus.publish(event, {**data, 'version': self._version})
+        if self._journal is None:
+            return
+        self._journal.append(event, **data)
+        if self._journal.should_compact():
+            self._journal.compact(self._to_serializable_dict)
+
+    def restore(self) -> None:
+        """
+        从 snapshot 及 journal 恢复流水线状态
+        """
+        state = self._journal.replay()
+        if state is None:
+            return
+
+        with self._lock:
+            self._task_dict = {int(k): Task(**v) for k, v in state.get('tasks', {}).items()}
+            self._next_task_id = max(self._task_dict, default=0) + 1
+            archived = [[task_id for task_id in batch if task_id in self._task_dict] for batch in state.get('archived', [])]
+            # 旧版本的快照没有批次信息，未归入批次的旧任务视为同一个批次
+            batched_ids = {task_id for batch in archived for task_id in batch}
+            legacy_ids = [task_id for task_id, task in self._task_dict.items() if not task.is_now and task_id not in batched_ids]
+            self._archived_batches = [batch for batch in [legacy_ids, *archived] if batch]
+            # 恢复的日志沿用原序号，之后的日志接续上次进程的序号
+            logs = state.get('logs', [])
+            self._log_buffer.resume(max(state.get('log_seq', 0) - len(logs), 0))
+            for log in logs:
+                self._log_buffer.append(log)
+            if state.get('status'):
+                self.status = TaskPipelineStatus(state['status'])
+
+            # 上次进程退出时未结束的批次已无法继续执行，按中断处理；
+            # 已添加未执行的任务随 MaaCore 实例一起丢失，无论流水线状态如何都标记为取消
+            for task in self._task_dict.values():
+                if task.is_now and task.status in (TaskStatus.PENDING, TaskStatus.RUNNING):
+                    task.status = TaskStatus.CANCELLED
+            if self.status == TaskPipelineStatus.RUNNING:
+                self.status = TaskPipelineStatus.CANCELLED
+            self._prune_archived()
+            self._journal.compact(self._to_serializable_dict)
+            self._version += 1
+
+    def set_task_status(self, task_id: int, status: TaskStatus) -> None:
+        with self._lock:
+            self._task_dict[task_id].status = status
+            self._record(PipelineJournal.TASK_STATUS, id=task_id, status=status.value)
+
+    def set_status(self, status: TaskPipelineStatus) -> None:
+        with self._lock:
+            self.status = status
+            self._record(PipelineJournal.PIPELINE_STATUS, status=status.value)
+
+    def append_log(self, log: str) -> None:
+        with self._lock:
+            seq = self._log_buffer.append(log)
+            self._record(PipelineJournal.LOG_APPENDED, log=log, seq=seq)
 
     def append_task(self, task: Task) -> None:
-        self._check_runing()
-
-        task_id = self._asst.append_task(task.type_name, task.params)
-        if not task_id:
-            raise ResponseException("添加任务失败")
-        self._task_dict[task_id] = task
-        self._save_pipeline()
+        with pipeline_pool.using_core(self):
+            self._check_runing()
+
+            core_task_id = self._asst.append_task(task.type_name, task.params)
+            if not core_task_id:
+                raise ResponseException("添加任务失败")
+            with self._lock:
+                task_id = self._next_task_id
+                self._next_task_id += 1
+                self._core_task_ids[core_task_id] = task_id
+                self._task_dict[task_id] = task
+                self._record(PipelineJournal.TASK_ADDED, id=task_id, task=task.dict())
         
     def start(self) -> bool:
+        with pipeline_pool.using_core(self):
+            return self._start()
+
+    def _start(self) -> bool:
         self._check_runing()
 
-        # 任务执行前，将当前批次所有非pending任务标记为旧批次任务
-        if self._task_dict:
-            for task in self._task_dict.values():
+        with self._lock:
+            # 任务执行前，将当前批次所有非pending任务标记为旧批次任务
+            archived_ids = []
+            for task_id, task in self._task_dict.items():
                 if task.is_now and task.status != TaskStatus.PENDING:
                     task.is_now = False
-        # 清除旧任务缓存日志
-        self.logs = []
+                    archived_ids.append(task_id)
+            if archived_ids:
+                self._archived_batches.append(archived_ids)
+                self._record(PipelineJournal.TASK_ARCHIVED, ids=archived_ids)
+                self._prune_archived()
+            # 清除旧任务缓存日志
+            self._log_buffer.clear()
+            self._record(PipelineJournal.LOG_CLEARED)
+            # 先于核心启动创建完成信号，避免回调早于等待方
+            self.finish()
+            self._completion = Future()
         
-        if not self._asst.start():
+        with _core_resource_lock:
+            started = self._asst.start()
+        if not started:
+            self.finish()
             raise ResponseException("执行任务失败")
-        self.status = TaskPipelineStatus.RUNNING
-        self._save_pipeline()
+        self.set_status(TaskPipelineStatus.RUNNING)
         return True
     
     def stop(self) -> bool:
-        # 任务停止后，将当前批次所有非completed任务标记为cancelled
-        if self._task_dict:
-            for task in self._task_dict.values():
+        if self._asst is None:
+            raise ResponseException(f"设备未连接 device={self.device}")
+
+        with self._lock:
+            # 任务停止后，将当前批次所有非completed任务标记为cancelled
+            for task_id, task in self._task_dict.items():
                 if task.is_now and task.status != TaskStatus.COMPLETED:
                     task.status = TaskStatus.CANCELLED
+                    self._record(PipelineJournal.TASK_STATUS, id=task_id, status=task.status.value)
 
         if not self._asst.stop():
             raise ResponseException("停止任务失败")
-        self.status = TaskPipelineStatus.CANCELLED
-        self._save_pipeline()
+        self.set_status(TaskPipelineStatus.CANCELLED)
+        # 核心已停止时不会再有 TaskChainStopped 回调
+        if not self.running():
+            self.finish()
         return True
 
-    def active_tasks(self):
-        self.tasks = [task for task in self._task_dict.values() if task.is_now]
-        self._save_pipeline()
-        return self
-    
-task_pipeline = TaskPipeline()
+    def abort(self, log: str) -> None:
+        """
+        MaaCore 工作进程异常退出，当前批次按失败结束
+        """
+        with self._lock:
+            if self.status == TaskPipelineStatus.RUNNING:
+                for task_id, task in self._task_dict.items():
+                    if task.is_now and task.status in (TaskStatus.PENDING, TaskStatus.RUNNING):
+                        task.status = TaskStatus.FAILED
+                        self._record(PipelineJournal.TASK_STATUS, id=task_id, status=task.status.value)
+                self.set_status(TaskPipelineStatus.FAILED)
+            else:
+                # 已添加未执行的任务随工作进程一起丢失
+                for task_id, task in self._task_dict.items():
+                    if task.is_now and task.status == TaskStatus.PENDING:
+                        task.status = TaskStatus.CANCELLED
+                        self._record(PipelineJournal.TASK_STATUS, id=task_id, status=task.status.value)
+            self.append_log(f'{_current_time()} {log}')
+        self.finish()
+
+    def finish(self) -> None:
+        """
+        结束当前批次，唤醒所有等待方
+        """
+        with self._lock:
+            completion = self._completion
+            if completion is not None and not completion.done():
+                completion.set_result(self.status)
+
+    def wait(self, timeout: Optional[float] = None) -> bool:
+        """
+        阻塞等待当前批次结束，超时返回 False
+        """
+        completion = self._completion
+        if completion is None:
+            return not self.running()
+        try:
+            completion.result(timeout)
+            return True
+        except FutureTimeoutError:
+            return False
+
+    def active_tasks(self) -> list[Task]:
+        with self._lock:
+            return [task for task in self._task_dict.values() if task.is_now]
+
+    def screenshot(self) -> bytes:
+        """
+        获取 MaaCore 最近一次截图并编码为 JPEG，不额外占用 adb 连接
+        """
+        if self._asst is None:
+            raise ResponseException("MAA 核心尚未连接")
+
+        with self._asst.image_lock:
+            view = self._asst.get_image_view(MAA_IMAGE_BUFFER_SIZE)
+            if view is None:
+                raise ResponseException("MAA 截图获取失败")
+            with Image.open(io.BytesIO(view)) as image:
+                image.load()
+        return adb_service.encode_jpeg(image)
+
+    def etag(self) -> str:
+        return f'"{_PIPELINE_EPOCH}-{self._version}"'
+
+    def snapshot(self) -> dict:
+        with self._lock:
+            return {
+                'device': self.device,
+                'status': self.status.value,
+                'version': self._version,
+                # 事件流游标，订阅 /api/maa/pipeline/events 时从此处继续
+                'event_id': self._event_bus.last_id,
+                'tasks': [{'id': task_id, **task.dict()} for task_id, task in self._task_dict.items() if task.is_now],
+                # 日志通过 /api/maa/pipeline/logs 增量获取
+                'log_seq': self._log_buffer.last_seq
+            }
+
+    def snapshot_json(self) -> tuple[str, bytes]:
+        """
+        获取当前版本的序列化快照，同一版本只序列化一次
 
-def _task_log(msg: str):
+        :return: (ETag, 响应内容)
+        """
+        with self._lock:
+            cache = self._snapshot_cache
+            if cache is None or cache[0] != self._version:
+                content = Response.success(data=self.snapshot()).json(ensure_ascii=False).encode('utf-8')
+                cache = (self._version, self.etag(), content)
+                self._snapshot_cache = cache
+            return cache[1], cache[2]
+
+class TaskPipelinePool:
+    """
+    按设备地址管理多个任务流水线，每个流水线持有独立的 Asst 实例，
+    回调通过 AsstCreateEx 的自定义参数路由到对应的流水线
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._pipelines: dict[str, TaskPipeline] = {}
+        self._callback_routes: dict[int, TaskPipeline] = {}
+        self.default_device: Optional[str] = None
+        # 核心初始化状态
+        self.phase: CoreInitPhase = CoreInitPhase.PENDING
+        self.error: Optional[str] = None
+        self.ready_time: Optional[str] = None
+        # MaaCore 所在目录
+        self.core_path: Optional[pathlib.Path] = None
+        self.adb_path: Optional[str] = None
+        # MaaCore 工作进程，未启用时 MaaCore 加载在当前进程中
+        self.worker: Optional[CoreWorker] = None
+        # 热切换后仍有流水线在使用的旧工作进程
+        self._retired: list[CoreWorker] = []
+        # MaaCore 代数，每次热切换或重启工作进程时递增
+        self._generation = 0
+        # 工作进程异常退出后的重启次数
+        self.worker_restarts = 0
+        # 保护当前工作进程、代数及旧工作进程列表，初始化完成与工作进程退出在同一把锁下判断
+        self._swap_lock = threading.RLock()
+
+    @property
+    def ready(self) -> bool:
+        return self.phase == CoreInitPhase.READY
+
+    def set_phase(self, phase: CoreInitPhase, error: Optional[str] = None) -> None:
+        self.phase = phase
+        self.error = error
+        if phase == CoreInitPhase.READY:
+            self.ready_time = datetime.now().strftime('%Y-%m-%d %H:%M:%S')
+
+    def mark_ready(self) -> None:
+        """
+        初始化完成，此后工作进程异常退出时自动重启；工作进程在初始化期间已退出时初始化失败
+        """
+        with self._swap_lock:
+            if self.worker is not None and not self.worker.alive:
+                raise CoreWorkerError("MaaCore 工作进程在初始化期间退出")
+            self.set_phase(CoreInitPhase.READY)
+
+    def devices(self) -> list[str]:
+        return list(self._pipelines.keys())
+
+    def pipelines(self) -> list[TaskPipeline]:
+        return list(self._pipelines.values())
+
+    def get(self, device: Optional[str] = None) -> TaskPipeline:
+        device = device or self.default_device
+        pipeline = self._pipelines.get(device)
+        if pipeline is None:
+            raise ResponseException(f"未知的设备: {device}")
+        return pipeline
+
+    def reload_resources(self, incremental_path: pathlib.Path) -> bool:
+        """
+        热加载增量资源，有流水线正在运行时不加载并返回 False
+        """
+        with _core_resource_lock:
+            if any(pipeline.running() for pipeline in self.pipelines()):
+                return False
+            loaded = self.worker.load_resource(incremental_path) if self.worker else Asst.load_resource(incremental_path)
+            if not loaded:
+                raise RuntimeError(f"增量资源加载失败: {incremental_path}")
+            return True
+
+    def start_worker(self, core_path: pathlib.Path) -> CoreWorker:
+        """
+        启动加载指定版本 MaaCore 的工作进程，已同步的活动资源一并加载
+        """
+        incremental_path = None
+        if self.core_path and resource_service.ota_tasks_path(self.core_path).exists():
+            incremental_path = resource_service.ota_resource_dir(self.core_path)
+        return CoreWorker(core_path, incremental_path, _callback_queue.put, on_exit=self._worker_exited).start()
+
+    def _worker_exited(self, worker: CoreWorker) -> None:
+        """
+        工作进程异常退出：使用该进程的流水线按失败结束，当前工作进程退出时在后台重启；
+        初始化完成前退出时不重启，由初始化按失败处理
+        """
+        with self._swap_lock:
+            for pipeline in self.pipelines():
+                if isinstance(pipeline._asst, RemoteAsst) and pipeline._asst.worker is worker:
+                    pipeline.abort('MaaCore 异常退出，任务已中断')
+                    # 下次使用时在重启后的工作进程中重建 Asst 实例
+                    pipeline._core_generation = -1
+            if worker is not self.worker:
+                restart = False
+            elif self.phase != CoreInitPhase.READY:
+                logger.error(f"MaaCore 工作进程在初始化期间退出 phase={self.phase.value}")
+                return
+            else:
+                restart = True
+                self.set_phase(CoreInitPhase.RESTARTING, error="MaaCore 工作进程异常退出，正在重启")
+        if restart:
+            threading.Thread(target=self._restart_worker, args=(worker.core_path,),
+                             name="maa-core-restart", daemon=True).start()
+        else:
+            self.refresh_idle()
+
+    def _restart_worker(self, core_path: pathlib.Path, max_delay: float = 60) -> None:
+        delay = 1
+        while True:
+            try:
+                worker = self.start_worker(core_path)
+                break
+            except Exception as e:
+                logger.error(f"MaaCore 工作进程重启失败，{delay} 秒后重试", exc_info=e)
+                self.set_phase(CoreInitPhase.RESTARTING, error=f"MaaCore 工作进程重启失败，{delay} 秒后重试: {e}")
+                time.sleep(delay)
+                delay = min(delay * 2, max_delay)
+        with self._swap_lock:
+            self.worker = worker
+            self._generation += 1
+            self.worker_restarts += 1
+            # 与切换工作进程同时恢复就绪，新工作进程随即退出时可以再次重启
+            self.set_phase(CoreInitPhase.READY)
+        logger.info(f"MaaCore 工作进程已重启 restarts={self.worker_restarts}")
+        try:
+            self.refresh_idle()
+        except Exception as e:
+            logger.error("MaaCore 工作进程重启后重连设备失败", exc_info=e)
+
+    def swap_core(self, core_path: pathlib.Path) -> None:
+        """
+        热切换 MaaCore：新版本在新的工作进程中加载完成后再切换，空闲的流水线立即改用新版本，
+        正在运行的流水线继续在旧工作进程中执行，结束后再切换，旧工作进程在没有流水线使用后退出
+        """
+        if self.worker is None:
+            raise RuntimeError("未启用 MaaCore 工作进程，无法热切换")
+        worker = self.start_worker(core_path)
+        with self._swap_lock:
+            self._retired.append(self.worker)
+            self.worker = worker
+            self._generation += 1
+        logger.info(f"MaaCore 已切换为 {worker.version}，正在运行的流水线结束后切换")
+        if not self.refresh_idle():
+            threading.Thread(target=self._drain_retired, name="maa-core-drain", daemon=True).start()
+
+    @contextmanager
+    def using_core(self, pipeline: TaskPipeline):
+        """
+        添加、启动任务期间持有当前的 Asst 实例，流水线空闲时先切换到最新版本
+        """
+        with pipeline._core_lock:
+            self._refresh(pipeline)
+            yield
+
+    def _refresh(self, pipeline: TaskPipeline) -> bool:
+        """
+        为落后的空闲流水线重建 Asst 实例，返回流水线是否已使用最新版本，调用方需持有 pipeline._core_lock
+        """
+        with self._swap_lock:
+            worker, generation = self.worker, self._generation
+        if pipeline._asst is None:
+            # 未连接的设备，距上次连接失败不足退避间隔时直接返回上次的错误
+            if time.monotonic() < pipeline._connect_retry_time:
+                raise ResponseException(f"设备未连接 device={pipeline.device}: {pipeline.connect_error}")
+            self._connect(pipeline, worker, generation)
+            return True
+        if worker is None or pipeline._core_generation == generation:
+            return True
+        if not pipeline.idle():
+            return False
+        old_asst = pipeline._asst
+        # 新实例的 MaaCore 任务 id 从 1 重新编号，流水线任务 id 不受影响
+        self._connect(pipeline, worker, generation)
+        if isinstance(old_asst, RemoteAsst):
+            old_asst.destroy()
+        return True
+
+    def _connect(self, pipeline: TaskPipeline, worker: Optional[CoreWorker], generation: int) -> None:
+        try:
+            asst = _create_asst(self.adb_path, pipeline.device, pipeline._route_arg, worker)
+        except Exception as e:
+            delay = pipeline.connect_failed(str(e))
+            logger.error(f"MAA ADB 连接失败 device={pipeline.device}，{delay} 秒后可重试", exc_info=e)
+            raise ResponseException(f"设备未连接 device={pipeline.device}: {e}")
+        pipeline.bind_asst(asst)
+        pipeline._core_generation = generation
+
+    def connect(self, pipeline: TaskPipeline) -> bool:
+        """
+        连接设备，失败时只记录在该设备的流水线上，不影响其他设备
+        """
+        with pipeline._core_lock:
+            try:
+                return self._refresh(pipeline)
+            except ResponseException:
+                return False
+
+    def refresh_idle(self) -> bool:
+        """
+        切换所有空闲的流水线并退出不再使用的旧工作进程，返回是否已全部切换
+        """
+        refreshed = True
+        for pipeline in self.pipelines():
+            try:
+                with pipeline._core_lock:
+                    refreshed = self._refresh(pipeline) and refreshed
+            except ResponseException:
+                # 连接失败已记录在流水线上
+                refreshed = False
+            except Exception as e:
+                logger.error(f"MaaCore 实例切换失败 device={pipeline.device}", exc_info=e)
+                refreshed = False
+        with self._swap_lock:
+            in_use = {id(pipeline._asst.worker) for pipeline in self.pipelines() if isinstance(pipeline._asst, RemoteAsst)}
+            idle_workers = [worker for worker in self._retired if id(worker) not in in_use]
+            self._retired = [worker for worker in self._retired if id(worker) in in_use]
+        for worker in idle_workers:
+            worker.shutdown()
+        return refreshed
+
+    def _drain_retired(self, interval: float = 30) -> None:
+        while True:
+            time.sleep(interval)
+            try:
+                if self.refresh_idle():
+                    return
+            except Exception as e:
+                logger.error("MaaCore 热切换失败", exc_info=e)
+
+    def route(self, arg: Optional[int]) -> Optional[TaskPipeline]:
+        return self._callback_routes.get(arg)
+
+    def add(self, device: str) -> int:
+        """
+        注册设备流水线
+
+        :return: 回调路由参数，创建 Asst 时作为自定义参数传入
+        """
+        with self._lock:
+            if device in self._pipelines:
+                raise RuntimeError(f"设备重复注册: {device}")
+            pipeline = TaskPipeline(device=device)
+            pipeline.restore()
+            # 0 会被当作空指针传回，路由参数从 1 开始
+            route_arg = len(self._callback_routes) + 1
+            pipeline._route_arg = route_arg
+            pipeline._core_generation = self._generation
+            self._pipelines[device] = pipeline
+            self._callback_routes[route_arg] = pipeline
+            if self.default_device is None:
+                self.default_device = device
+            return route_arg
+
+pipeline_pool = TaskPipelinePool()
+
+def _device_tag(device: str) -> str:
+    return device.replace(':', '_').replace('/', '_')
+
+def _task_log(device: str, msgs: list[str]):
     current_date = datetime.now().strftime('%Y-%m-%d')
 
-    file_path = TASK_PIPELINE_LOG_DIR / f'task_pipeline_{current_date}.log'
+    file_path = TASK_PIPELINE_LOG_DIR / f'task_pipeline_{_device_tag(device)}_{current_date}.log'
 
     with file_path.open('a', encoding='utf-8') as f:
-        f.write(msg)
+        f.writelines(msgs)
 
 def _current_time() -> str:
     return datetime.now().strftime('%H:%M:%S')
@@ -158,138 +741,83 @@ def _current_datetime() -> str:
 
 @Asst.CallBackType
 def _callback(msg, details, arg):
-    m = Message(msg)
-    d = json.loads(details.decode('utf-8'))
-    task_dict = task_pipeline._task_dict
+    # 在 MaaCore 工作线程中执行，只做入队，解析及写日志由消费线程完成
+    _callback_queue.put(msg, details, arg)
+
+def _handle_messages(batch: list[CallbackMessage]):
+    # 按设备汇总本批次日志，每个设备每批次只写一次文件
+    task_logs: dict[str, list[str]] = {}
 
-    log = None
+    for msg, details, arg in batch:
+        task_pipeline = pipeline_pool.route(arg)
+        if task_pipeline is None:
+            logger.warning(f"未找到回调对应的流水线 arg={arg}")
+            continue
 
-    # 连接信息
-    if m == Message.ConnectionInfo:
+        device_logs = task_logs.setdefault(task_pipeline.device, [])
         try:
-            con_what = d.get('what', '')
-            con_details = d.get('details', '')
-
-            con_what_infos = {
-                'ConnectFaild': f"模拟器连接失败 {con_details}",
-                'Connected': f"模拟器连接成功",
-                'UnsupportedResolution': f"模拟器分辨率不被支持 {con_details}",
-                'ResolutionError': f"分辨率获取错误 {con_details}",
-                'Reconnecting': f"模拟器连接断开(adb/模拟器异常) 正在重连 {con_details}",
-                'Reconnected': f"模拟器连接断开(adb/模拟器异常) 重连成功 {con_details}",
-                'Disconnect': f"模拟器连接断开(adb/模拟器异常) 重连失败 {con_details}",
-                'ScreencapFailed': f"截图失败(adb/模拟器异常) {con_details}",
-                'TouchModeNotAvailable': f"不支持的触控模式 {con_details}"
-            }
+            m = Message(msg)
+            d = json.loads(details.decode('utf-8'))
+            log = _handle_message(task_pipeline, m, d)
+        except Exception as e:
+            logger.error(f"回调消息处理失败 msg={msg} details={details}", exc_info=e)
+            continue
+
+        if log:
+            task_pipeline.append_log(f'{_current_time()} {log}')
+            device_logs.append(f'{_current_datetime()} {log} \n')
+        device_logs.append(f'{m} {d} {arg} \n')
+
+    for device, msgs in task_logs.items():
+        if msgs:
+            _task_log(device, msgs)
+
+def _handle_message(task_pipeline: TaskPipeline, m: Message, d: dict) -> Optional[str]:
+    task_dict = task_pipeline._task_dict
+
+    # 连接信息及原子任务信息，按 (消息类型, what/task) 查找已注册的格式化函数
+    log = message_formatters.format(m, d)
 
-            if con_what in con_what_infos:
-                log = con_what_infos[con_what]
-        except:
-            log = f"Error: {m} {d}"
+    # 任务链消息中的 MaaCore 任务 id 换算为流水线任务 id
+    if m in (Message.TaskChainStart, Message.TaskChainCompleted, Message.TaskChainStopped, Message.TaskChainError):
+        task_id = task_pipeline.task_id_of(d['taskid'])
+        task = task_dict[task_id]
 
     # 开始任务
     if m == Message.TaskChainStart:
-        task = task_dict[d['taskid']]
         if task.type_name != d['taskchain']:
             raise ResponseException(f"任务链子任务不匹配 task_type={task.type_name} taskchain={d['taskchain']}")
-        task_pipeline._task_dict[d['taskid']].status = TaskStatus.RUNNING
+        task_pipeline.set_task_status(task_id, TaskStatus.RUNNING)
         log = f'开始任务 [{task.task_name}]'
 
     # 完成任务
     if m == Message.TaskChainCompleted:
-        task = task_dict[d['taskid']]
         if task.type_name != d['taskchain']:
             raise ResponseException(f"任务链子任务不匹配 task_type={task.type_name} taskchain={d['taskchain']}")
-        task_pipeline._task_dict[d['taskid']].status = TaskStatus.COMPLETED
+        task_pipeline.set_task_status(task_id, TaskStatus.COMPLETED)
         log = f'完成任务 [{task.task_name}]'
 
     # 停止任务
     if m == Message.TaskChainStopped:
-        task = task_dict[d['taskid']]
+        task_pipeline.finish()
         log = f'停止任务 [{task.task_name}]'
 
     # 异常任务
     if m == Message.TaskChainError:
-        task = task_dict[d['taskid']]
         if task.type_name != d['taskchain']:
             raise ResponseException(f"任务链子任务不匹配 task_type={task.type_name} taskchain={d['taskchain']}")
-        task_pipeline._task_dict[d['taskid']].status = TaskStatus.FAILED
+        task_pipeline.set_task_status(task_id, TaskStatus.FAILED)
         log = f'任务失败 [{task.task_name}]'
 
     # 完成全部任务
     if m == Message.AllTasksCompleted:
-        task_pipeline.status = TaskPipelineStatus.COMPLETED
+        task_pipeline.set_status(TaskPipelineStatus.COMPLETED)
+        task_pipeline.finish()
         log = '已完成全部任务'
 
-    # 开始原子任务
-    if m == Message.SubTaskStart:
-        try:
-            sub_details = d.get('details', {})
-            sub_task = sub_details.get('task', '')
-
-            sub_task_info = {
-                'StartButton2': f"已开始战斗 {sub_details.get('exec_times', '')} 次",
-                'MedicineConfirm': '使用理智药',
-                'ExpiringMedicineConfirm': '使用 48 小时内过期的理智药',
-                'StoneConfirm': '碎石',
-                'RecruitRefreshConfirm': '刷新标签',
-                'RecruitConfirm': '确认招募',
-                'RecruitNowConfirm': '使用加急许可',
-                'ReportToPenguinStats': '汇报到企鹅数据统计',
-                'ReportToYituliu': '汇报到一图流大数据',
-                'InfrastDormDoubleConfirmButton': '请进行基建宿舍的二次确认',
-                'StartExplore': f"已开始探索 {sub_details.get('exec_times', '')} 次",
-                'StageTraderInvestConfirm': '已投资源石锭',
-                'StageTraderInvestSystemFull': '投资达到了游戏上限',
-                'ExitThenAbandon': '已放弃本次探索',
-                'MissionCompletedFlag': '战斗完成',
-                'MissionFailedFlag': '战斗失败',
-                'MissionFailedFlag2': '战斗失败',
-                'StageTraderEnter': '节点：诡异行商',
-                'StageSafeHouseEnter': '节点：安全的角落',
-                # 'StageEncounterEnter': '节点：不期而遇',
-                'StageCombatDpsEnter': '关卡：普通作战',
-                'StageEmergencyDps': '关卡：紧急作战',
-                'StageDreadfulFoe': '关卡：险路恶敌'
-            }
-
-            if sub_task in sub_task_info:
-                log = sub_task_info[sub_task]
-        except:
-            log = f"Error: {m} {d}"
+    return log
 
-    # 原子任务额外信息
-    if m == Message.SubTaskExtraInfo:
-        try:
-            sub_what = d.get('what', '')
-            sub_details = d.get('details', {})
-
-            drop_statistics = '\n'.join(
-                [f"{item.get('itemName', '')}: {item.get('quantity', '')}(+{item.get('addQuantity', '')})" for item in sub_details.get('stats', [])]    
-            )
-
-            sub_task_extra_info = {
-                'RecruitTagsDetected': f"公招识别结果：{sub_details.get('tags', '')}",
-                'ReCruitSpecialTag': f"识别到特殊Tag：{sub_details.get('tag', '')}",
-                'RecruitResult': f"{sub_details.get('level', '')} ⭐ Tags",
-                'RecruitTagsRefreshed': "已刷新Tags",
-                'EnterFacility': f"当前设施：{sub_details.get('facility', '')} {sub_details.get('index', '')}",
-                'StageInfo': f"开始战斗：{sub_details.get('name', '')}",
-                'StageInfoError': "关卡识别错误",
-                'RoguelikeEvent': f"事件：{sub_details.get('name', '')}",
-                'SanityBeforeStage': f"当前理智：{sub_details.get('current_sanity', '')}/{sub_details.get('max_sanity', '')}",
-                'StageDrops': f"{sub_details.get('stars', '')}⭐通关{sub_details.get('stage', {}).get('stageCode', '')} \n掉落统计: \n{drop_statistics}"
-            }
-
-            if sub_what in sub_task_extra_info:
-                log = sub_task_extra_info[sub_what]
-        except :
-            log = f"Error: {m} {d}"
-
-    if log:
-        task_pipeline.logs.append(f'{_current_time()} {log}')
-        _task_log(f'{_current_datetime()} {log} \n')
-    _task_log(f'{m} {d} {arg} \n')
+_callback_queue = CallbackQueue(_handle_messages, maxsize=Config.get_config('app', 'callback_queue_size', 10000))
 
 def _init_asst():
     maa_core_path = Config.get_config('app', 'maa_core_path')
@@ -298,44 +826,121 @@ def _init_asst():
     maa_core_path = os.path.expanduser(maa_core_path)
     path = pathlib.Path(maa_core_path).resolve()
 
-    # 更新maa版本
+    # 更新maa版本，网络异常时沿用本地版本
+    pipeline_pool.set_phase(CoreInitPhase.UPDATING)
     logger.info("开始校验 MAA 版本")
-    Updater(path, Version.Stable).update()
-
-    # 加载核心资源
+    updater = Updater(path, Version.Stable)
+    previous_path = updater.installer.active_path()
+    try:
+        updater.update()
+    except Exception as e:
+        logger.warning(f"MAA 版本校验失败，使用本地版本: {e}")
+
+    # 加载当前版本的核心资源，启用工作进程时 MaaCore 加载在工作进程中，可以不重启服务热切换版本
+    pipeline_pool.set_phase(CoreInitPhase.LOADING)
     logger.info("开始加载 MAA 核心资源")
-    Asst.load(path=path)
+    try:
+        _load_core(updater.installer.active_path())
+    except Exception as e:
+        # 刚安装的新版本加载失败时回滚到之前的版本
+        if updater.installer.active_path() == previous_path or updater.installer.rollback() is None:
+            raise
+        logger.error(f"MAA 核心资源加载失败，已回滚到 {updater.installer.active_path().name}", exc_info=e)
+        _load_core(updater.installer.active_path())
     logger.info("MAA 核心资源加载成功")
 
-    # 加载活动资源
+    # 加载活动资源，网络异常时沿用缓存的活动资源
+    pipeline_pool.set_phase(CoreInitPhase.LOADING_OTA)
     logger.info("开始加载版本活动资源")
-    ota_tasks_url = 'https://ota.maa.plus/MaaAssistantArknights/api/resource/tasks.json'
-    ota_tasks_path = path / 'cache' / 'resource' / 'tasks.json'
-    ota_tasks_path.parent.mkdir(parents=True, exist_ok=True)
-    resp = HttpUtils.get(ota_tasks_url)
-    with open(ota_tasks_path, 'w', encoding='utf-8') as f:
-        f.write(resp.text)
-    Asst.load(path=path, incremental_path=path / 'cache')
-    logger.info("版本活动资源加载成功")
-
-    # 配置回调函数
-    asst = Asst(callback=_callback)
-    # 触控方案配置
-    asst.set_instance_option(InstanceOptionType.touch_type, 'maatouch')
-    # 暂停下干员
-    asst.set_instance_option(InstanceOptionType.deployment_with_pause, '1')
-
+    pipeline_pool.core_path = path
+    try:
+        resource_service.sync_ota_resources(path)
+    except Exception as e:
+        logger.warning(f"版本活动资源下载失败，使用缓存资源: {e}")
+    if resource_service.ota_tasks_path(path).exists():
+        pipeline_pool.reload_resources(resource_service.ota_resource_dir(path))
+        logger.info("版本活动资源加载成功")
+
+    pipeline_pool.set_phase(CoreInitPhase.CONNECTING)
     adb_path = Config.get_config('adb', 'path')
     if not adb_path:
         # 如果adb路径未设置，使用Path环境变量
         adb_path = 'adb'
-    adb_address = Config.get_config('adb', 'address')
+    pipeline_pool.adb_path = adb_path
+
+    # 各设备独立连接，离线的设备不影响其他设备，在使用时重新连接
+    for adb_address in adb_service.adb_addresses():
+        pipeline_pool.add(adb_address)
+    connected = [pipeline_pool.connect(pipeline) for pipeline in pipeline_pool.pipelines()]
+
+    pipeline_pool.mark_ready()
+    logger.info(f"MAA 核心初始化完成，已连接设备 {sum(connected)}/{len(connected)}")
+
+def _load_core(core_path: pathlib.Path) -> None:
+    if Config.get_config('app', 'core_worker', True):
+        pipeline_pool.worker = pipeline_pool.start_worker(core_path)
+    else:
+        Asst.load(path=core_path)
+
+def _init_asst_safely():
+    try:
+        _init_asst()
+    except Exception as e:
+        logger.error("MAA 核心初始化失败", exc_info=e)
+        pipeline_pool.set_phase(CoreInitPhase.FAILED, error=str(e))
+
+def init_asst_async() -> threading.Thread:
+    """
+    在后台线程中初始化 MAA 核心，初始化进度通过 pipeline_pool.phase 查询
+    """
+    thread = threading.Thread(target=_init_asst_safely, name="maa-core-init", daemon=True)
+    thread.start()
+    return thread
+
+def _create_asst(adb_path: str, adb_address: str, route_arg: int, worker: Optional[CoreWorker] = None) -> Asst | RemoteAsst:
+    # 启用工作进程时在指定（默认为当前）的工作进程中创建，回调消息由工作进程转发
+    worker = worker or pipeline_pool.worker
+    if worker is not None:
+        asst = worker.create_asst(route_arg, adb_path, adb_address, _ASST_OPTIONS)
+        logger.info(f"MAA ADB 连接成功 address={adb_address} version={worker.version}")
+        return asst
+
+    # 配置回调函数，自定义参数用于路由到对应设备的流水线
+    asst = Asst(callback=_callback, arg=route_arg)
+    for option_type, option_value in _ASST_OPTIONS.items():
+        asst.set_instance_option(option_type, option_value)
+
     if not asst.connect(adb_path, adb_address):
         raise RuntimeError(f"MAA ADB 连接失败 path={adb_path} address={adb_address}")
+    logger.info(f"MAA ADB 连接成功 address={adb_address}")
         
     return asst
 
-task_pipeline._asst = _init_asst()
+_update_lock = threading.Lock()
+
+def update_core() -> bool:
+    """
+    检查并安装 MaaCore 新版本，安装完成后热切换，返回是否已切换
+    """
+    if not _update_lock.acquire(blocking=False):
+        logger.info("MaaCore 正在更新中")
+        return False
+    try:
+        updater = Updater(pipeline_pool.core_path, Version.Stable)
+        updater.update()
+        active_path = updater.installer.active_path()
+        if active_path.resolve() == pipeline_pool.worker.core_path.resolve():
+            return False
+        try:
+            pipeline_pool.swap_core(active_path)
+        except Exception:
+            # 新版本加载失败，继续使用当前版本，并切回之前的版本，重启服务后不会加载失败的版本
+            previous = updater.installer.rollback()
+            logger.error(f"MaaCore {active_path.name} 加载失败，已回滚到 {previous}")
+            raise
+        return True
+    finally:
+        _update_lock.release()
 
 class StartUpTask(Task):
     def __init__(self,
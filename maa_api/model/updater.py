@@ -1,15 +1,18 @@
 import platform
 import re
 import os
-import tarfile
-import zipfile
-
-from urllib.error import HTTPError, URLError
+import shutil
 
 from .asst import Asst
-from .utils import Version, HttpUtils
+from .utils import Version
+from .http_cache import HttpCache
+from .manifest import CoreManifest
+from .installer import CoreInstaller
+from .worker import CoreWorker
 from . import downloader
 
+from maa_api.config.config import Config
+from maa_api.config.path_config import CACHE_PATH
 from maa_api.log import logger
 
 
@@ -17,6 +20,14 @@ class Updater:
     # API的地址
     Mirrors = ["https://ota.maa.plus"]
     Summary_json = "/MaaAssistantArknights/api/version/summary.json"
+    # 版本信息缓存，有效期内重启不访问网络，离线时使用过期缓存
+    http_cache = HttpCache(CACHE_PATH / "version")
+    # 已有缓存时重新校验的请求超时（秒）
+    REVALIDATE_TIMEOUT = 5
+
+    @staticmethod
+    def version_check_ttl():
+        return Config.get_config('app', 'version_check_ttl', 3600)
 
     @staticmethod
     def custom_print(s):
@@ -31,6 +42,8 @@ class Updater:
         self.latest_json = None
         self.latest_version = None
         self.assets_object = None
+        # 版本化安装，path 为安装根目录
+        self.installer = CoreInstaller(path, keep_versions=Config.get_config('app', 'core_keep_versions', 2))
 
     @staticmethod
     def map_version_type(version):
@@ -43,11 +56,26 @@ class Updater:
     
     def get_cur_version(self):
         """
-        从MaaCore.dll获取当前版本号
-        这里是复用原来的方法
+        从当前版本的安装清单获取版本号，清单不存在时从MaaCore.dll获取并补写清单
         """
-        Asst.load(path=self.path)
-        return Asst().get_version()
+        active_path = self.installer.active_path()
+        manifest = CoreManifest.load(active_path)
+        if manifest is not None:
+            return manifest.version
+
+        if Config.get_config('app', 'core_worker', True):
+            # MaaCore 只加载在工作进程中，读取版本号后退出
+            worker = CoreWorker(active_path, None, on_event=lambda *args: None).start()
+            version = worker.version
+            worker.shutdown()
+        else:
+            Asst.load(path=active_path)
+            version = Asst().get_version()
+        try:
+            CoreManifest(version, CoreManifest.scan(active_path)).save(active_path)
+        except OSError as e:
+            self.custom_print(f"写入安装清单失败: {e}")
+        return version
 
     def get_latest_version(self):
         """
@@ -61,9 +89,7 @@ class Updater:
             i = retry_times % len(api_url)
             request_url = api_url[i] + version_summary
             try:
-                response_json = HttpUtils.get(request_url)
-                response_json.raise_for_status()
-                response_data = response_json.json()
+                response_data = self.http_cache.get(request_url, self.version_check_ttl(), self.REVALIDATE_TIMEOUT).json()
                 """
                 解析JSON
                 e.g.
@@ -91,12 +117,11 @@ class Updater:
                 continue
         return False, False
 
-    @staticmethod
-    def get_download_url(detail):
+    def get_download_url(self, detail):
         """
         1.获取系统及架构信息
         2.找到对应的版本
-        3.返回镜像url列表&文件名
+        3.返回镜像url列表&文件名，对应的发布信息保存在 self.assets_object
         """
         """
         获取系统信息，包括：
@@ -126,9 +151,7 @@ class Updater:
         retry = 3
         for _ in range(retry):
             try:
-                detail_json = HttpUtils.get(detail)
-                detail_json.raise_for_status()
-                detail_data = detail_json.json()
+                detail_data = self.http_cache.get(detail, self.version_check_ttl(), self.REVALIDATE_TIMEOUT).json()
                 assets_list = detail_data["details"]["assets"]     # 列表，子元素为字典
                 # 找到对应系统和架构的版本
                 for assets in assets_list:
@@ -152,12 +175,10 @@ class Updater:
                     pattern = r"^MAA-.*-" + re.escape(system_platform) + r"\.(zip|tar\.gz)$"
                     match = re.match(pattern, assets_name)
                     if match:
-                        # Mirrors镜像列表
-                        # mirrors = assets["mirrors"]
-                        mirrors = []
+                        # GitHub的release链接及Mirrors镜像列表，由下载器按各镜像吞吐量分配分片
                         github_url = assets["browser_download_url"]
-                        # 加上GitHub的release链接
-                        mirrors.append(github_url)
+                        mirrors = [github_url] + assets.get("mirrors", [])
+                        self.assets_object = assets
                         return mirrors, assets_name
             except Exception:
                 continue
@@ -171,9 +192,9 @@ class Updater:
         # 从API获取最新版本
         latest_version, version_detail = self.get_latest_version()
         
-        # 检查路径是否为空或目录为空
-        if not self.path or (os.path.isdir(self.path) and not os.listdir(self.path)):
-            self.custom_print("路径目录为空，开始下载最新版本")
+        # 检查路径是否为空或尚未安装核心库
+        if not self.path or CoreManifest.core_stat(self.installer.active_path()) is None:
+            self.custom_print("未安装 MaaCore，开始下载最新版本")
             needs_update = True
         else:
             # 从dll获取MAA的版本
@@ -194,32 +215,31 @@ class Updater:
                 return
 
             file = os.path.join(self.path, filename)
+            # 发布信息中的文件大小及 sha256 摘要（如有）用于校验下载结果
+            expected_size = self.assets_object.get("size")
+            digest = self.assets_object.get("digest") or ""
+            sha256 = digest[len("sha256:"):] if digest.startswith("sha256:") else None
+            # 边下载边解压到版本临时目录，与当前版本相同的文件硬链接复用；下载和校验全部通过后原子切换版本
+            staging_path = self.installer.staging_path(latest_version)
+            extracted = {}
             max_retry = 3
             for retry_frequency in range(max_retry):
                 try:
                     self.custom_print(f"开始下载，第{retry_frequency + 1}次尝试")
-                    downloader.file_download(download_url_list=url_list, download_path=file)
+                    # 失败后重试时从已完成的分片继续下载
+                    downloader.file_download(download_url_list=url_list, download_path=file,
+                                             expected_size=expected_size, sha256=sha256,
+                                             consumer=lambda fileobj: extracted.update(
+                                                 files=self.installer.extract(fileobj, filename, staging_path)))
                     break
-                except (HTTPError, URLError) as e:
+                except Exception as e:
                     self.custom_print(f"下载失败: {e}")
+            else:
+                shutil.rmtree(staging_path, ignore_errors=True)
+                self.custom_print('更新未完成')
+                return
 
             self.custom_print('开始安装更新')
-            file_extension = os.path.splitext(filename)[1]
-            unzip = False
-            try:
-                if file_extension == '.zip':
-                    with zipfile.ZipFile(file, 'r') as zfile:
-                        zfile.extractall(self.path)
-                    unzip = True
-                elif file_extension == '.gz':
-                    with tarfile.open(file, 'r:gz') as tfile:
-                        tfile.extractall(self.path)
-                    unzip = True
-            except Exception as e:
-                self.custom_print(f"解压失败: {e}")
-
+            self.installer.commit(staging_path, latest_version, extracted['files'])
             os.remove(file)
-            if unzip:
-                self.custom_print('更新完成')
-            else:
-                self.custom_print('更新未完成')
+            self.custom_print('更新完成')
@@ -1,8 +1,10 @@
 import requests
+import threading
 from maa_api.config.config import Config
 
 from requests.adapters import HTTPAdapter
 from urllib3.util.retry import Retry
+from urllib.parse import urlsplit
 
 from typing import Union, Dict, List, Any, Type
 from enum import Enum, IntEnum, unique, auto
@@ -78,6 +80,7 @@ class Version(Enum):
 class HttpUtils:
     """
     HTTP工具类，封装了常用的HTTP请求方法，并支持从参数发送请求。
+    同一主机的请求共享一个连接池会话，复用 keep-alive 连接。
     """
 
     proxies = None
@@ -87,8 +90,15 @@ class HttpUtils:
         'https': proxy_path,
     }
 
-    # 统一的超时时间设置（秒）
+    # 统一的超时时间设置（秒），可通过 timeout 参数单次覆盖
     TIMEOUT = 60
+    # 每个主机的连接池大小
+    POOL_SIZE = Config.get_config('app', 'http_pool_size', 10)
+    # 是否保持长连接
+    KEEP_ALIVE = Config.get_config('app', 'http_keep_alive', True)
+
+    _sessions: dict[str, requests.Session] = {}
+    _sessions_lock = threading.Lock()
 
     @staticmethod
     def get_session_with_retries():
@@ -99,72 +109,114 @@ class HttpUtils:
             status_forcelist=[500, 502, 503, 504],
             allowed_methods=["HEAD", "GET", "OPTIONS"]
         )
-        adapter = HTTPAdapter(max_retries=retries)
+        adapter = HTTPAdapter(pool_connections=1, pool_maxsize=HttpUtils.POOL_SIZE, max_retries=retries)
         session.mount('http://', adapter)
         session.mount('https://', adapter)
+        if not HttpUtils.KEEP_ALIVE:
+            session.headers['Connection'] = 'close'
         return session
 
     @staticmethod
-    def get(url, params=None, headers=None, **kwargs):
-        session = HttpUtils.get_session_with_retries()
-        return session.get(url, params=params, headers=headers, proxies=HttpUtils.proxies, timeout=HttpUtils.TIMEOUT, **kwargs)
+    def get_session(url):
+        """
+        获取 url 所在主机的共享会话，不存在时创建
+        """
+        parsed = urlsplit(url)
+        host = f"{parsed.scheme}://{parsed.netloc}"
+        with HttpUtils._sessions_lock:
+            session = HttpUtils._sessions.get(host)
+            if session is None:
+                session = HttpUtils.get_session_with_retries()
+                HttpUtils._sessions[host] = session
+            return session
 
     @staticmethod
-    def post(url, data=None, json=None, headers=None, **kwargs):
-        session = HttpUtils.get_session_with_retries()
-        return session.post(url, data=data, json=json, headers=headers, proxies=HttpUtils.proxies, timeout=HttpUtils.TIMEOUT, **kwargs)
+    def close():
+        with HttpUtils._sessions_lock:
+            for session in HttpUtils._sessions.values():
+                session.close()
+            HttpUtils._sessions.clear()
 
     @staticmethod
-    def put(url, data=None, headers=None, **kwargs):
-        session = HttpUtils.get_session_with_retries()
-        return session.put(url, data=data, headers=headers, proxies=HttpUtils.proxies, timeout=HttpUtils.TIMEOUT, **kwargs)
+    def get(url, params=None, headers=None, timeout=None, **kwargs):
+        session = HttpUtils.get_session(url)
+        return session.get(url, params=params, headers=headers, proxies=HttpUtils.proxies, timeout=timeout or HttpUtils.TIMEOUT, **kwargs)
 
     @staticmethod
-    def delete(url, headers=None, **kwargs):
-        session = HttpUtils.get_session_with_retries()
-        return session.delete(url, headers=headers, proxies=HttpUtils.proxies, timeout=HttpUtils.TIMEOUT, **kwargs)
+    def post(url, data=None, json=None, headers=None, timeout=None, **kwargs):
+        session = HttpUtils.get_session(url)
+        return session.post(url, data=data, json=json, headers=headers, proxies=HttpUtils.proxies, timeout=timeout or HttpUtils.TIMEOUT, **kwargs)
 
     @staticmethod
-    def patch(url, data=None, headers=None, **kwargs):
-        session = HttpUtils.get_session_with_retries()
-        return session.patch(url, data=data, headers=headers, proxies=HttpUtils.proxies, timeout=HttpUtils.TIMEOUT, **kwargs)
+    def put(url, data=None, headers=None, timeout=None, **kwargs):
+        session = HttpUtils.get_session(url)
+        return session.put(url, data=data, headers=headers, proxies=HttpUtils.proxies, timeout=timeout or HttpUtils.TIMEOUT, **kwargs)
+
+    @staticmethod
+    def delete(url, headers=None, timeout=None, **kwargs):
+        session = HttpUtils.get_session(url)
+        return session.delete(url, headers=headers, proxies=HttpUtils.proxies, timeout=timeout or HttpUtils.TIMEOUT, **kwargs)
+
+    @staticmethod
+    def patch(url, data=None, headers=None, timeout=None, **kwargs):
+        session = HttpUtils.get_session(url)
+        return session.patch(url, data=data, headers=headers, proxies=HttpUtils.proxies, timeout=timeout or HttpUtils.TIMEOUT, **kwargs)
 
     @classmethod
-    def head(cls, url, headers=None, **kwargs):
-        session = HttpUtils.get_session_with_retries()
-        return session.head(url, headers=headers, proxies=HttpUtils.proxies, timeout=HttpUtils.TIMEOUT, **kwargs)
+    def head(cls, url, headers=None, timeout=None, **kwargs):
+        session = HttpUtils.get_session(url)
+        return session.head(url, headers=headers, proxies=HttpUtils.proxies, timeout=timeout or HttpUtils.TIMEOUT, **kwargs)
 
     @staticmethod
-    def send_request(method, url, params=None, data=None, json=None, headers=None, **kwargs):
+    def send_request(method, url, params=None, data=None, json=None, headers=None, timeout=None, **kwargs):
         method = method.lower()
         if method not in ['get', 'post', 'put', 'delete', 'patch']:
             raise ValueError(f"Unsupported HTTP method: {method}")
         
-        session = HttpUtils.get_session_with_retries()
+        session = HttpUtils.get_session(url)
         func = getattr(session, method)
-        return func(url, params=params, data=data, json=json, headers=headers, proxies=HttpUtils.proxies, timeout=HttpUtils.TIMEOUT, **kwargs)
+        return func(url, params=params, data=data, json=json, headers=headers, proxies=HttpUtils.proxies, timeout=timeout or HttpUtils.TIMEOUT, **kwargs)
     
 
 if __name__ == "__main__":
-    url = 'https://github.com/MaaAssistantArknights/MaaAssistantArknights/releases/download/v5.14.1/MAA-v5.14.1-win-x64.zip'
+    # 对比每次新建会话与共享连接池会话的请求速率
+    import time
+    from concurrent.futures import ThreadPoolExecutor
+    from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+    class Handler(BaseHTTPRequestHandler):
+        protocol_version = 'HTTP/1.1'
+        disable_nagle_algorithm = True
+
+        def do_GET(self):
+            body = b'ok'
+            self.send_response(200)
+            self.send_header('Content-Length', str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+        def log_message(self, format, *args):
+            pass
+
+    server = ThreadingHTTPServer(('127.0.0.1', 0), Handler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    url = f'http://127.0.0.1:{server.server_port}/'
+    HttpUtils.proxies = None
+    total, workers = 2000, 8
+
+    def legacy(_):
+        session = HttpUtils.get_session_with_retries()
+        session.get(url, timeout=HttpUtils.TIMEOUT)
+        session.close()
 
-    response = HttpUtils.head(url, allow_redirects=True)
-    file_size = response.headers.get('Content-Length')
-    print(file_size)
+    def pooled(_):
+        HttpUtils.get(url)
 
-    try:
-        # 使用 HttpUtils.get() 下载文件
-        response = HttpUtils.get(url, stream=True)
-        
-        # 检查请求是否成功
-        if response.status_code == 200:
-            # 打开文件进行写入
-            with open('MAA-v5.14.1-win-x64.zip', 'wb') as file:
-                # 分块写入文件
-                for chunk in response.iter_content(chunk_size=8192):
-                    file.write(chunk)
-            print(f"文件已成功下载并保存为 {'MAA-v5.14.1-win-x64.zip'}")
-        else:
-            print(f"下载失败，状态码: {response.status_code}")
-    except Exception as e:
-        print(f"下载过程中发生错误: {e}")
\ No newline at end of file
+    for name, func in (('新建会话', legacy), ('共享会话', pooled)):
+        start = time.perf_counter()
+        with ThreadPoolExecutor(max_workers=workers) as executor:
+            list(executor.map(func, range(total)))
+        elapsed = time.perf_counter() - start
+        print(f"{name}: {total / elapsed:,.0f} req/s")
+
+    server.shutdown()
@@ -0,0 +1,308 @@
+import itertools
+import threading
+import multiprocessing
+
+from concurrent.futures import Future, TimeoutError as FutureTimeoutError
+from multiprocessing.connection import Connection
+from pathlib import Path
+from typing import Any, Callable, Optional
+
+from maa_api.model.asst import Asst
+from maa_api.model.utils import InstanceOptionType, JSON
+from maa_api.log import logger
+
+# 工作进程内的 Asst 实例初始化及资源加载超时（秒）
+WORKER_START_TIMEOUT = 300
+# 普通命令的超时（秒），连接设备可能较慢
+WORKER_CALL_TIMEOUT = 120
+
+
+class CoreWorkerError(RuntimeError):
+    """
+    MaaCore 工作进程不可用或命令执行失败
+    """
+
+
+def _worker_main(conn: Connection, core_path: str, incremental_path: Optional[str]) -> None:
+    """
+    工作进程入口，加载 MaaCore 并持有所有 Asst 实例，按顺序执行主进程发来的命令（创建实例除外），回调消息直接转发回主进程
+
+    请求 (请求 id, 命令, 参数)，响应 ('reply', 请求 id, 是否成功, 结果)，回调 ('event', 消息类型, 原始 json 字节, 自定义参数)
+    """
+    send_lock = threading.Lock()
+
+    def send(message: tuple) -> None:
+        with send_lock:
+            conn.send(message)
+
+    @Asst.CallBackType
+    def callback(msg, details, arg):
+        send(('event', msg, details, arg))
+
+    try:
+        Asst.load(path=core_path)
+        if incremental_path:
+            Asst.load_resource(incremental_path)
+        version = Asst().get_version()
+    except Exception as e:
+        send(('failed', f"{type(e).__name__}: {e}"))
+        return
+    send(('ready', version))
+
+    instances: dict[int, Asst] = {}
+
+    def create(instance_id: int, route_arg: int, adb_path: str, address: str, options: dict[int, str]) -> bool:
+        asst = Asst(callback=callback, arg=route_arg)
+        for option_type, option_value in options.items():
+            asst.set_instance_option(InstanceOptionType(option_type), option_value)
+        if not asst.connect(adb_path, address):
+            raise RuntimeError(f"MAA ADB 连接失败 path={adb_path} address={address}")
+        instances[instance_id] = asst
+        return True
+
+    def image(instance_id: int, size: int) -> Optional[bytes]:
+        view = instances[instance_id].get_image_view(size)
+        return bytes(view) if view is not None else None
+
+    handlers: dict[str, Callable[..., Any]] = {
+        'create': create,
+        'destroy': lambda instance_id: instances.pop(instance_id, None) is not None,
+        'append_task': lambda instance_id, type_name, params: instances[instance_id].append_task(type_name, params),
+        'start': lambda instance_id: instances[instance_id].start(),
+        'stop': lambda instance_id: instances[instance_id].stop(),
+        'running': lambda instance_id: instances[instance_id].running(),
+        'image': image,
+        'load_resource': lambda path: Asst.load_resource(path),
+        'shutdown': lambda: True,
+    }
+
+    def execute(request_id: int, command: str, args: tuple) -> None:
+        try:
+            send(('reply', request_id, True, handlers[command](*args)))
+        except Exception as e:
+            send(('reply', request_id, False, f"{type(e).__name__}: {e}"))
+
+    while True:
+        try:
+            request_id, command, args = conn.recv()
+        except (EOFError, OSError):
+            break
+        if command == 'create':
+            # 创建实例需要连接设备，耗时较长，在独立线程中执行，不阻塞其他设备的命令
+            threading.Thread(target=execute, args=(request_id, command, args), daemon=True).start()
+            continue
+        execute(request_id, command, args)
+        if command == 'shutdown':
+            break
+
+    instances.clear()
+
+
+class CoreWorker:
+    """
+    MaaCore 工作进程，主进程侧的代理
+
+    每个工作进程加载一份 MaaCore，可以同时持有多个设备的 Asst 实例；
+    命令通过管道发送并等待响应，回调消息由读取线程转交给 on_event，不在请求线程中处理
+    """
+
+    def __init__(self,
+                 core_path: Path,
+                 incremental_path: Optional[Path],
+                 on_event: Callable[[int, bytes, Optional[int]], None],
+                 on_exit: Optional[Callable[['CoreWorker'], None]] = None):
+        """
+        :params:
+            ``core_path``:          MaaCore 所在目录
+            ``incremental_path``:   增量资源目录
+            ``on_event``:           回调消息处理函数，在读取线程中执行
+            ``on_exit``:            工作进程退出时调用，在读取线程中执行
+        """
+        self.core_path = Path(core_path)
+        self.incremental_path = incremental_path
+        self.version: Optional[str] = None
+        self._on_event = on_event
+        self._on_exit = on_exit
+        self._conn: Optional[Connection] = None
+        self._process: Optional[multiprocessing.Process] = None
+        self._send_lock = threading.Lock()
+        self._pending: dict[int, Future] = {}
+        self._pending_lock = threading.Lock()
+        self._request_ids = itertools.count(1)
+        self._instance_ids = itertools.count(1)
+        self._ready: Future = Future()
+        self._closing = False
+        self.alive = False
+
+    @property
+    def pid(self) -> Optional[int]:
+        return self._process.pid if self._process else None
+
+    def start(self) -> 'CoreWorker':
+        """
+        启动工作进程并等待 MaaCore 加载完成
+        """
+        context = multiprocessing.get_context('spawn')
+        parent_conn, child_conn = context.Pipe()
+        incremental_path = str(self.incremental_path) if self.incremental_path else None
+        self._process = context.Process(target=_worker_main, args=(child_conn, str(self.core_path), incremental_path),
+                                        name=f"maa-core-{self.core_path.name}", daemon=True)
+        self._process.start()
+        child_conn.close()
+        self._conn = parent_conn
+        self.alive = True
+        threading.Thread(target=self._read, name=f"maa-core-reader-{self._process.pid}", daemon=True).start()
+
+        try:
+            self.version = self._ready.result(WORKER_START_TIMEOUT)
+        except FutureTimeoutError:
+            self.kill()
+            raise CoreWorkerError("MaaCore 工作进程启动超时")
+        logger.info(f"MaaCore 工作进程已启动 pid={self.pid} version={self.version} path={self.core_path}")
+        return self
+
+    def _read(self) -> None:
+        while True:
+            try:
+                message = self._conn.recv()
+            except (EOFError, OSError):
+                break
+
+            kind = message[0]
+            if kind == 'event':
+                try:
+                    self._on_event(*message[1:])
+                except Exception as e:
+                    logger.error("MaaCore 回调消息转交失败", exc_info=e)
+            elif kind == 'reply':
+                _, request_id, ok, result = message
+                with self._pending_lock:
+                    future = self._pending.pop(request_id, None)
+                if future is not None:
+                    if ok:
+                        future.set_result(result)
+                    else:
+                        future.set_exception(CoreWorkerError(result))
+            elif kind == 'ready':
+                self._ready.set_result(message[1])
+            elif kind == 'failed':
+                self._ready.set_exception(CoreWorkerError(f"MaaCore 加载失败: {message[1]}"))
+
+        self._exited()
+
+    def _exited(self) -> None:
+        self.alive = False
+        error = CoreWorkerError("MaaCore 工作进程已退出")
+        if not self._ready.done():
+            self._ready.set_exception(error)
+        with self._pending_lock:
+            pending, self._pending = self._pending, {}
+        for future in pending.values():
+            future.set_exception(error)
+
+        if self._process is not None:
+            self._process.join(timeout=5)
+        if not self._closing:
+            logger.error(f"MaaCore 工作进程异常退出 pid={self.pid} exitcode={self._process.exitcode}")
+            if self._on_exit is not None:
+                self._on_exit(self)
+
+    def call(self, command: str, *args: Any, timeout: float = WORKER_CALL_TIMEOUT) -> Any:
+        if not self.alive:
+            raise CoreWorkerError("MaaCore 工作进程已退出")
+        request_id = next(self._request_ids)
+        future = Future()
+        with self._pending_lock:
+            self._pending[request_id] = future
+        try:
+            with self._send_lock:
+                self._conn.send((request_id, command, args))
+        except (OSError, ValueError) as e:
+            with self._pending_lock:
+                self._pending.pop(request_id, None)
+            raise CoreWorkerError(f"MaaCore 工作进程通信失败: {e}")
+        try:
+            return future.result(timeout)
+        except FutureTimeoutError:
+            with self._pending_lock:
+                self._pending.pop(request_id, None)
+            raise CoreWorkerError(f"MaaCore 工作进程命令超时 command={command}")
+
+    def create_asst(self, route_arg: int, adb_path: str, address: str, options: dict[InstanceOptionType, str]) -> 'RemoteAsst':
+        """
+        在工作进程中创建 Asst 实例并连接设备
+        """
+        instance_id = next(self._instance_ids)
+        self.call('create', instance_id, route_arg, adb_path, address,
+                  {int(option_type): value for option_type, value in options.items()})
+        return RemoteAsst(self, instance_id)
+
+    def load_resource(self, path: Path) -> bool:
+        return self.call('load_resource', str(path))
+
+    def shutdown(self, timeout: float = 30) -> None:
+        """
+        正常退出工作进程，超时后强制结束
+        """
+        self._closing = True
+        if self.alive:
+            try:
+                self.call('shutdown', timeout=timeout)
+            except CoreWorkerError:
+                pass
+        if self._process is not None:
+            self._process.join(timeout=timeout)
+        self.kill()
+        logger.info(f"MaaCore 工作进程已退出 pid={self.pid} version={self.version}")
+
+    def kill(self) -> None:
+        self._closing = True
+        if self._process is not None and self._process.is_alive():
+            self._process.kill()
+            self._process.join(timeout=5)
+
+
+class RemoteAsst:
+    """
+    工作进程中 Asst 实例的代理，提供流水线使用的 Asst 接口
+    """
+
+    def __init__(self, worker: CoreWorker, instance_id: int):
+        self.worker = worker
+        self.instance_id = instance_id
+        self._image_lock = threading.Lock()
+
+    def append_task(self, type_name: str, params: JSON = {}) -> int:
+        return self.worker.call('append_task', self.instance_id, type_name, params)
+
+    def start(self) -> bool:
+        return self.worker.call('start', self.instance_id)
+
+    def stop(self) -> bool:
+        return self.worker.call('stop', self.instance_id)
+
+    def running(self) -> bool:
+        if not self.worker.alive:
+            return False
+        try:
+            return self.worker.call('running', self.instance_id)
+        except CoreWorkerError:
+            return False
+
+    @property
+    def image_lock(self) -> threading.Lock:
+        return self._image_lock
+
+    def get_image_view(self, size: int) -> Optional[memoryview]:
+        content = self.worker.call('image', self.instance_id, size)
+        return memoryview(content) if content is not None else None
+
+    def get_version(self) -> Optional[str]:
+        return self.worker.version
+
+    def destroy(self) -> None:
+        if self.worker.alive:
+            try:
+                self.worker.call('destroy', self.instance_id)
+            except CoreWorkerError as e:
+                logger.warning(f"MaaCore 实例释放失败 instance={self.instance_id}: {e}")
@@ -1,15 +1,43 @@
-from fastapi import APIRouter, Depends
-from fastapi.responses import FileResponse
+from typing import Optional
+from fastapi import APIRouter, Depends, Query, Request
+from fastapi.responses import Response, StreamingResponse
 
 from maa_api.service import adb_service
-from maa_api.config.config import Config
 from maa_api.dependence.auth import token_auth
+from maa_api.exception.response_exception import ResponseException
 
 router = APIRouter()
 
+def _adb_address(device: Optional[str]) -> str:
+    adb_addresses = adb_service.adb_addresses()
+    adb_address = device or (adb_addresses[0] if adb_addresses else None)
+    if adb_address not in adb_addresses:
+        raise ResponseException(f"未知的设备: {device}")
+    return adb_address
+
 @router.get('/api/adb/screenshot', dependencies=[Depends(token_auth)])
-def get_screenshot():
-    adb_address = Config.get_config("adb", "address")
-    screenshot_path = adb_service.adb_screenshot(adb_address)
-    print(screenshot_path)
-    return FileResponse(screenshot_path)
\ No newline at end of file
+async def get_screenshot(
+    request: Request,
+    device: Optional[str] = None,
+    format: str = Query('jpeg', regex='^(jpeg|webp|png)$'),
+    quality: Optional[int] = Query(None, ge=1, le=95),
+    width: Optional[int] = Query(None, ge=1),
+    height: Optional[int] = Query(None, ge=1)
+):
+    adb_address = _adb_address(device)
+    screenshot = await adb_service.adb_screenshot_variant(adb_address, format, quality, width, height)
+
+    # 画面未变化时返回 304，不重复传输
+    headers = {'Cache-Control': 'no-cache', 'ETag': screenshot.etag}
+    if request.headers.get('if-none-match') == screenshot.etag:
+        return Response(status_code=304, headers=headers)
+    return Response(content=screenshot.content, media_type=screenshot.media_type, headers=headers)
+
+@router.get('/api/adb/screenshot/stream', dependencies=[Depends(token_auth)])
+async def get_screenshot_stream(device: Optional[str] = None):
+    adb_address = _adb_address(device)
+    return StreamingResponse(
+        adb_service.adb_screen_stream(adb_address, boundary='frame'),
+        media_type='multipart/x-mixed-replace; boundary=frame',
+        headers={'Cache-Control': 'no-cache', 'X-Accel-Buffering': 'no'}
+    )
\ No newline at end of file
@@ -0,0 +1,25 @@
+from fastapi import APIRouter
+from fastapi.responses import JSONResponse
+
+from maa_api.model.response import Response
+from maa_api.model.task import pipeline_pool
+
+router = APIRouter()
+
+@router.get("/api/health/ready")
+async def get_ready():
+    data = {
+        'ready': pipeline_pool.ready,
+        'phase': pipeline_pool.phase.value,
+        'error': pipeline_pool.error,
+        'ready_time': pipeline_pool.ready_time,
+        'devices': pipeline_pool.devices(),
+        # 连接失败的设备及原因，不影响其他设备
+        'disconnected': {pipeline.device: pipeline.connect_error for pipeline in pipeline_pool.pipelines() if not pipeline.connected},
+        'core_version': pipeline_pool.worker.version if pipeline_pool.worker else None,
+        'worker_restarts': pipeline_pool.worker_restarts
+    }
+    if pipeline_pool.ready:
+        return Response.success(data=data)
+    # 未就绪时返回 503，便于容器探针判断
+    return JSONResponse(Response.service_unavailable(data=data).dict(), status_code=503)
\ No newline at end of file
@@ -1,18 +1,39 @@
 import json
 
-from fastapi import APIRouter, Depends, BackgroundTasks
+from typing import Optional
+from fastapi import APIRouter, Depends, BackgroundTasks, Request, Query
+from fastapi.responses import Response as RawResponse, StreamingResponse
 
 from maa_api.model.response import Response
 from maa_api.model.request import TaskRequest
-from maa_api.model.task import task_pipeline
+from maa_api.model.task import pipeline_pool, update_core
 from maa_api.config.path_config import DAILY_TASK_FILE_PATH
 from maa_api.dependence.auth import token_auth
+from maa_api.dependence.ready import core_ready
 from maa_api.scheduler import daily_art_task_scheduler
 
 router = APIRouter()
 
-@router.post("/api/maa/pipeline", dependencies=[Depends(token_auth)])
-async def post_tasks(request: list[TaskRequest]):
+# 会调用 MaaCore 工作进程或等待流水线锁（压缩日志时持有锁写文件）的接口使用同步函数，在线程池中执行，不阻塞事件循环
+
+@router.get("/api/maa/devices", dependencies=[Depends(token_auth)])
+def get_devices():
+    devices = [
+        {
+            'device': pipeline.device,
+            'status': pipeline.status.value,
+            'running': pipeline.running(),
+            'connected': pipeline.connected,
+            'error': pipeline.connect_error,
+            'default': pipeline.device == pipeline_pool.default_device
+        }
+        for pipeline in pipeline_pool.pipelines()
+    ]
+    return Response.success(data=devices)
+
+@router.post("/api/maa/pipeline", dependencies=[Depends(token_auth), Depends(core_ready)])
+def post_tasks(request: list[TaskRequest], device: Optional[str] = None):
+    task_pipeline = pipeline_pool.get(device)
     if task_pipeline.running():
         return Response.bad_request(message='流水线任务正在运行中，不允许多实例访问')
 
@@ -23,13 +44,58 @@ async def post_tasks(request: list[TaskRequest]):
 
     return Response.success()
 
-@router.get("/api/maa/pipeline", dependencies=[Depends(token_auth)])
-async def get_tasks():
-    return Response.success(data=task_pipeline.active_tasks())
+@router.get("/api/maa/pipeline", dependencies=[Depends(token_auth), Depends(core_ready)])
+def get_tasks(request: Request, device: Optional[str] = None):
+    task_pipeline = pipeline_pool.get(device)
+    # 状态未变化时直接返回 304，不做序列化
+    headers = {'Cache-Control': 'no-cache'}
+    etag = task_pipeline.etag()
+    if request.headers.get('if-none-match') == etag:
+        return RawResponse(status_code=304, headers={'ETag': etag, **headers})
+
+    etag, content = task_pipeline.snapshot_json()
+    return RawResponse(content=content, media_type='application/json', headers={'ETag': etag, **headers})
+
+@router.get("/api/maa/pipeline/logs", dependencies=[Depends(token_auth), Depends(core_ready)])
+def get_pipeline_logs(device: Optional[str] = None,
+                            after: Optional[int] = None,
+                            limit: int = Query(default=100, ge=1, le=1000)):
+    log_buffer = pipeline_pool.get(device).log_buffer
+    # 不传 after 时返回最近的 limit 条日志
+    logs = log_buffer.tail(limit) if after is None else log_buffer.after(after, limit)
+    return Response.success(data={'logs': logs, 'last_seq': log_buffer.last_seq})
+
+@router.get("/api/maa/pipeline/events", dependencies=[Depends(token_auth), Depends(core_ready)])
+async def get_pipeline_events(request: Request, device: Optional[str] = None, after: Optional[str] = None):
+    task_pipeline = pipeline_pool.get(device)
+    # 浏览器断线重连时通过 Last-Event-ID 携带最新游标，优先于首次连接时的 after 参数；
+    # 服务重启后游标不属于当前进程，推送 reset 让客户端重新获取快照
+    last_event_id = request.headers.get('last-event-id')
+    if last_event_id:
+        after = last_event_id
+
+    return StreamingResponse(
+        task_pipeline.event_bus.stream(after, request.is_disconnected),
+        media_type='text/event-stream',
+        headers={'Cache-Control': 'no-cache', 'X-Accel-Buffering': 'no'}
+    )
+
+@router.get("/api/maa/screenshot", dependencies=[Depends(token_auth), Depends(core_ready)])
+def get_maa_screenshot(device: Optional[str] = None):
+    content = pipeline_pool.get(device).screenshot()
+    return RawResponse(content=content, media_type='image/jpeg', headers={'Cache-Control': 'no-cache'})
+
+@router.delete("/api/maa/pipeline", dependencies=[Depends(token_auth), Depends(core_ready)])
+def delete_tasks(device: Optional[str] = None):
+    pipeline_pool.get(device).stop()
+    return Response.success()
 
-@router.delete("/api/maa/pipeline", dependencies=[Depends(token_auth)])
-async def delete_tasks():
-    task_pipeline.stop()
+@router.post("/api/maa/core/update", dependencies=[Depends(token_auth), Depends(core_ready)])
+async def post_core_update(background_tasks: BackgroundTasks):
+    # 新版本在新的工作进程中加载，正在运行的流水线不受影响
+    if pipeline_pool.worker is None:
+        return Response.bad_request(message='未启用 MaaCore 工作进程，更新后需重启服务')
+    background_tasks.add_task(update_core)
     return Response.success()
 
 @router.get("/api/maa/daily", dependencies=[Depends(token_auth)])
@@ -49,7 +115,7 @@ async def update_daily_tasks(request: dict):
     except Exception as e:
         raise RuntimeError(e)
     
-@router.post("/api/maa/daily/execute")
-async def test(background_tasks: BackgroundTasks):
-    background_tasks.add_task(daily_art_task_scheduler.daily_art_task)
+@router.post("/api/maa/daily/execute", dependencies=[Depends(core_ready)])
+async def test(background_tasks: BackgroundTasks, device: Optional[str] = None):
+    background_tasks.add_task(daily_art_task_scheduler.daily_art_task, device)
     return Response.success()
\ No newline at end of file
@@ -1,63 +1,86 @@
 import threading
-import time
 import copy
 from apscheduler.schedulers.background import BackgroundScheduler
 
 from maa_api.log import logger
 from maa_api.service import adb_service
-from maa_api.config.config import Config
-from maa_api.model.task import TaskStatus, Task, StartUpTask, CloseDownTask, task_pipeline
+from maa_api.model.task import TaskStatus, Task, TaskPipeline, StartUpTask, CloseDownTask, pipeline_pool
 
-task_lock = threading.Lock()
+# 每个设备独立加锁，一个设备的重启恢复不影响其他设备的闪退检测
+_device_locks: dict[str, threading.Lock] = {}
+_device_locks_lock = threading.Lock()
+
+def _device_lock(device: str) -> threading.Lock:
+    with _device_locks_lock:
+        return _device_locks.setdefault(device, threading.Lock())
 
 def check_ark_running_scheduler():
+    if not pipeline_pool.ready:
+        return
+    for task_pipeline in pipeline_pool.pipelines():
+        threading.Thread(target=check_device, args=(task_pipeline,),
+                         name=f"check-ark-running-{task_pipeline.device}", daemon=True).start()
+
+def check_device(task_pipeline: TaskPipeline):
+    # 使用锁确保同一设备同时只有一个检测在运行，上一次的重启恢复未结束时跳过
+    lock = _device_lock(task_pipeline.device)
+    if not lock.acquire(blocking=False):
+        return
+    try:
+        check_ark_running(task_pipeline)
+    except Exception as e:
+        logger.error(f"客户端运行检测失败 device={task_pipeline.device}", exc_info=e)
+    finally:
+        lock.release()
+
+def check_ark_running(task_pipeline: TaskPipeline):
     ark_package_name = "com.hypergryph.arknights.bilibili"
-    adb_address = Config.get_config("adb", "address")
-
-    # 使用锁确保同时只有一个任务在运行
-    with task_lock:
-        if task_pipeline.running() and not adb_service.adb_check_running(adb_address, ark_package_name):
-            logger.info("检测到任务流水线运行时客户端闪退，开始重启！")
-
-            # 复制未完成的任务
-            old_tasks: list[Task] = []
-            for task in task_pipeline.tasks:
-                if task.status != TaskStatus.COMPLETED and task.is_now:
-                    copy_task = copy.deepcopy(task)
-                    copy_task.status = TaskStatus.PENDING
-                    copy_task.is_now = True
-                    old_tasks.append(copy_task)
-
-            logger.info(f"当前未完成的任务 {old_tasks}")
-
-            # 中断任务
-            logger.info("开始执行任务中断操作")
-            if task_pipeline.stop():
-                logger.info("任务中断执行成功")
-
-            # 等待任务流水线停止
-            wait_for_asst_stop("任务已中断！")
-
-            # 执行客户端重启任务
-            logger.info("开始执行客户端重启任务")
-            restart_pipeline()
-
-            # 重新添加未完成的任务
-            for task in old_tasks:
-                task_pipeline.append_task(task)
-            task_pipeline.start()
-            logger.info("开始执行未完成的任务")
-
-def restart_pipeline():
+    adb_address = task_pipeline.device
+
+    if task_pipeline.running() and not adb_service.adb_check_running(adb_address, ark_package_name):
+        logger.info(f"检测到任务流水线运行时客户端闪退，开始重启！device={adb_address}")
+
+        # 复制未完成的任务
+        old_tasks: list[Task] = []
+        for task in task_pipeline.active_tasks():
+            if task.status != TaskStatus.COMPLETED and task.is_now:
+                copy_task = copy.deepcopy(task)
+                copy_task.status = TaskStatus.PENDING
+                copy_task.is_now = True
+                old_tasks.append(copy_task)
+
+        logger.info(f"当前未完成的任务 {old_tasks}")
+
+        # 中断任务
+        logger.info("开始执行任务中断操作")
+        if task_pipeline.stop():
+            logger.info("任务中断执行成功")
+
+        # 等待任务流水线停止
+        wait_for_asst_stop(task_pipeline, "任务已中断！")
+
+        # 执行客户端重启任务
+        logger.info("开始执行客户端重启任务")
+        restart_pipeline(task_pipeline)
+
+        # 重新添加未完成的任务
+        for task in old_tasks:
+            task_pipeline.append_task(task)
+        task_pipeline.start()
+        logger.info("开始执行未完成的任务")
+
+def restart_pipeline(task_pipeline: TaskPipeline):
     task_pipeline.append_task(CloseDownTask(client_type="Bilibili"))
     task_pipeline.append_task(StartUpTask(client_type="Bilibili", start_game_enabled=True))
     task_pipeline.start()
 
-    wait_for_asst_stop("客户端重启成功")
+    wait_for_asst_stop(task_pipeline, "客户端重启成功")
     
-def wait_for_asst_stop(success_message):
-    while task_pipeline.running():
-        time.sleep(0.1)
+def wait_for_asst_stop(task_pipeline: TaskPipeline, success_message):
+    # 批次结束由回调唤醒，超时后再确认一次核心状态，兜底未收到回调的情况
+    while not task_pipeline.wait(timeout=60):
+        if not task_pipeline.running():
+            break
     logger.info(success_message)
 
 def start():
@@ -1,5 +1,4 @@
 import json
-import time
 import datetime
 
 from jinja2 import Environment, FileSystemLoader
@@ -7,10 +6,11 @@ from apscheduler.schedulers.background import BackgroundScheduler
 
 from maa_api.config.path_config import DAILY_TASK_FILE_PATH, STATIC_PATH
 from maa_api.model.request import TaskRequest
-from maa_api.model.task import task_pipeline
+from maa_api.model.task import pipeline_pool
 from maa_api.service import smtp_service
+from maa_api.log import logger
 
-def daily_art_task():
+def daily_art_task(device: str = None):
     if not DAILY_TASK_FILE_PATH.exists():
         return
     
@@ -30,6 +30,11 @@ def daily_art_task():
     if not enable:
         return
     
+    if not pipeline_pool.ready:
+        logger.warning(f"MAA 核心尚未就绪，跳过日常任务 phase={pipeline_pool.phase.value}")
+        return
+
+    task_pipeline = pipeline_pool.get(device)
     if task_pipeline.running():
         return
     
@@ -37,17 +42,18 @@ def daily_art_task():
         task_pipeline.append_task(req.to_task())
 
     task_pipeline.start()
-
-    while task_pipeline.running():
-            time.sleep(1)
+    # 批次结束由回调唤醒，超时后再确认一次核心状态，兜底未收到回调的情况
+    while not task_pipeline.wait(timeout=60):
+        if not task_pipeline.running():
+            break
 
     env = Environment(loader=FileSystemLoader(str(STATIC_PATH)))
     template = env.get_template('email_template.html')
 
     email_content = template.render(
          status = task_pipeline.status,
-         tasks=task_pipeline.active_tasks().tasks,
-         logs=task_pipeline.logs
+         tasks=task_pipeline.active_tasks(),
+         logs=task_pipeline.log_buffer.all()
     )
         
     smtp_service.send_email("MAA-API 日志通知", email_content, email)
@@ -0,0 +1,40 @@
+import threading
+
+from apscheduler.schedulers.background import BackgroundScheduler
+
+from maa_api.config.config import Config
+from maa_api.log import logger
+from maa_api.model.task import pipeline_pool
+from maa_api.service import resource_service
+
+sync_lock = threading.Lock()
+# 已下载但尚未加载的活动资源，等所有流水线空闲时加载
+pending_reload = False
+
+def sync_resources_scheduler():
+    global pending_reload
+    with sync_lock:
+        if not pipeline_pool.ready:
+            return
+        try:
+            if resource_service.sync_ota_resources(pipeline_pool.core_path):
+                pending_reload = True
+        except Exception as e:
+            logger.warning(f"版本活动资源同步失败: {e}")
+    reload_resources_scheduler()
+
+def reload_resources_scheduler():
+    global pending_reload
+    with sync_lock:
+        if not pending_reload or not pipeline_pool.ready:
+            return
+        if pipeline_pool.reload_resources(resource_service.ota_resource_dir(pipeline_pool.core_path)):
+            pending_reload = False
+            logger.info("版本活动资源热加载成功")
+
+def start():
+    scheduler = BackgroundScheduler()
+    scheduler.add_job(sync_resources_scheduler, 'interval', seconds=Config.get_config('app', 'ota_sync_interval', 3600))
+    # 有流水线运行时推迟加载，定期重试
+    scheduler.add_job(reload_resources_scheduler, 'interval', seconds=60)
+    scheduler.start()
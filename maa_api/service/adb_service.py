@@ -1,51 +1,393 @@
+import io
+import time
+import asyncio
+import threading
 import adbutils
 
-from pathlib import Path
+from PIL import Image, ImageChops, ImageStat
+from typing import AsyncIterator, Optional
+from concurrent.futures import Future, ThreadPoolExecutor
 from adbutils._device import AdbDevice
 
-from maa_api.config.path_config import IMAGE_PATH
 from maa_api.config.config import Config
+from maa_api.log import logger
 
-"""adb连接"""
-def adb_connect(address: str) -> AdbDevice:
+"""adb连接地址列表，第一个为默认设备"""
+def adb_addresses() -> list[str]:
+    addresses = Config.get_config("adb", "address")
+    if not addresses:
+        return []
+    if isinstance(addresses, str):
+        return [addresses]
+    return [str(address) for address in addresses]
+
+class _DeviceHandle:
+    def __init__(self, address: str):
+        self.address = address
+        self.device: Optional[AdbDevice] = None
+        self.lock = threading.Lock()
+        # 上次确认设备在线的时间
+        self.alive_time = 0.0
+        # 连续重连失败次数及下次允许重连的时间
+        self.failures = 0
+        self.retry_time = 0.0
+
+_device_handles: dict[str, _DeviceHandle] = {}
+_device_handles_lock = threading.Lock()
+
+# 重连退避时间范围（秒）
+_RECONNECT_BACKOFF_MIN = 1
+_RECONNECT_BACKOFF_MAX = 60
+
+def _device_handle(address: str) -> _DeviceHandle:
+    with _device_handles_lock:
+        handle = _device_handles.get(address)
+        if handle is None:
+            handle = _DeviceHandle(address)
+            _device_handles[address] = handle
+        return handle
+
+def _device_alive(device: AdbDevice) -> bool:
     try:
-        adbutils.adb.connect(address)
-        devices = adbutils.adb.device_list()
-
-        # 检查是否连接到预期的设备
-        connected_device = None
-        for device in devices:
-            if device.serial == address:
-                connected_device = device
-                break
-
-        if connected_device:
-            return connected_device
-        else:
-            raise RuntimeError(f"没有预期的设备连接: {address}")
-    except Exception as e:
-        raise RuntimeError("ADB 连接失败:", str(e))
+        return device.get_state() == "device"
+    except Exception:
+        return False
+
+def _device_connect(address: str) -> AdbDevice:
+    adbutils.adb.connect(address)
+    device = adbutils.adb.device(serial=address)
+    # 检查是否连接到预期的设备
+    if not _device_alive(device):
+        raise RuntimeError(f"没有预期的设备连接: {address}")
+    return device
+
+"""adb连接，复用已建立的设备句柄，仅在句柄失效时按退避间隔重连"""
+def adb_connect(address: str) -> AdbDevice:
+    handle = _device_handle(address)
+    probe_interval = Config.get_config("adb", "probe_interval", 5)
+
+    with handle.lock:
+        now = time.monotonic()
+        if handle.device is not None:
+            # 探测间隔内直接复用句柄，超过间隔后做一次轻量的在线检查
+            if now - handle.alive_time < probe_interval or _device_alive(handle.device):
+                handle.alive_time = now
+                return handle.device
+            handle.device = None
+
+        if now < handle.retry_time:
+            raise RuntimeError(f"ADB 连接失败: {address} 重连退避中，{handle.retry_time - now:.1f} 秒后重试")
+
+        try:
+            handle.device = _device_connect(address)
+        except Exception as e:
+            handle.failures += 1
+            backoff = min(_RECONNECT_BACKOFF_MIN * 2 ** (handle.failures - 1), _RECONNECT_BACKOFF_MAX)
+            handle.retry_time = now + backoff
+            raise RuntimeError("ADB 连接失败:", str(e))
+
+        handle.failures = 0
+        handle.retry_time = 0.0
+        handle.alive_time = now
+        return handle.device
+
+"""标记设备句柄失效，下次使用时重新探测"""
+def adb_invalidate(address: str) -> None:
+    handle = _device_handle(address)
+    with handle.lock:
+        handle.alive_time = 0.0
     
 
-"""adb截屏"""
-def adb_screenshot(address: str) -> Path:
+# 支持的截图格式及对应的 Content-Type
+IMAGE_MEDIA_TYPES = {
+    "jpeg": "image/jpeg",
+    "webp": "image/webp",
+    "png": "image/png",
+}
+
+"""按配置的截屏质量编码 JPEG"""
+def encode_jpeg(pil_image: Image.Image) -> bytes:
+    return encode_image(pil_image)
+
+"""缩放并编码截图，宽高为上限且保持比例，不放大；quality 为空时使用配置的截屏质量"""
+def encode_image(pil_image: Image.Image, format: str = "jpeg", quality: Optional[int] = None,
+                 max_width: Optional[int] = None, max_height: Optional[int] = None) -> bytes:
+    if quality is None:
+        quality = Config.get_config("adb", "screenshot_quality")
+
+    image = pil_image.convert("RGB")
+    if max_width or max_height:
+        size = (max_width or image.width, max_height or image.height)
+        if image.width > size[0] or image.height > size[1]:
+            image.thumbnail(size, Image.BILINEAR)
+
+    buffer = io.BytesIO()
+    if format == "png":
+        image.save(buffer, format="PNG", compress_level=1)
+    else:
+        image.save(buffer, format=format.upper(), quality=quality)
+    return buffer.getvalue()
+
+# 进程启动标识，保证重启后截图 ETag 不与之前的冲突
+_SCREENSHOT_EPOCH = format(int(time.time()), 'x')
+# 画面变化检测的缩略图尺寸
+_SIGNATURE_SIZE = (32, 18)
+
+# 每帧最多缓存的截图规格数，超出后的规格每次重新编码
+_MAX_VARIANTS = 8
+
+class _Frame:
+    """
+    一帧画面及其各规格的编码结果，画面未变化的截屏共享同一帧
+    """
+
+    def __init__(self, image: Image.Image, content: bytes, etag: str, signature: Image.Image):
+        self.image = image
+        self.content = content
+        self.etag = etag
+        # 灰度缩略图，用于判断画面是否变化
+        self.signature = signature
+        self.variants: dict[tuple, Future] = {}
+        self.variants_lock = threading.Lock()
+
+class Screenshot:
+    def __init__(self, frame: _Frame, capture_time: float):
+        self.frame = frame
+        self.capture_time = capture_time
+
+    @property
+    def content(self) -> bytes:
+        return self.frame.content
+
+    @property
+    def etag(self) -> str:
+        return self.frame.etag
+
+class ScreenshotVariant:
+    def __init__(self, content: bytes, media_type: str, etag: str):
+        self.content = content
+        self.media_type = media_type
+        self.etag = etag
+
+class _ScreenshotCache:
+    def __init__(self):
+        # 同一设备同时只进行一次截屏，等待中的请求复用这次的结果
+        self.capture_lock = threading.Lock()
+        self.screenshot: Optional[Screenshot] = None
+        self.frame_count = 0
+
+    def fresh(self, ttl: float) -> Optional[Screenshot]:
+        screenshot = self.screenshot
+        if screenshot is not None and time.monotonic() - screenshot.capture_time < ttl:
+            return screenshot
+        return None
+
+_screenshot_caches: dict[str, _ScreenshotCache] = {}
+_screenshot_caches_lock = threading.Lock()
+
+def _screenshot_cache(address: str) -> _ScreenshotCache:
+    with _screenshot_caches_lock:
+        cache = _screenshot_caches.get(address)
+        if cache is None:
+            cache = _ScreenshotCache()
+            _screenshot_caches[address] = cache
+        return cache
+
+def _signature(pil_image: Image.Image) -> Image.Image:
+    return pil_image.convert("L").resize(_SIGNATURE_SIZE, Image.BILINEAR)
+
+def _unchanged(previous: Optional[Screenshot], signature: Image.Image) -> bool:
+    if previous is None:
+        return False
+    threshold = Config.get_config("adb", "screenshot_diff_threshold", 2)
+    # 缩略图逐像素差值的均值，范围 0-255
+    diff = ImageStat.Stat(ImageChops.difference(previous.frame.signature, signature)).mean[0]
+    return diff <= threshold
+
+"""截屏并与上一帧比较，画面未变化时沿用上一帧的编码结果及 ETag，调用方需持有 capture_lock"""
+def _capture(address: str, cache: _ScreenshotCache) -> Screenshot:
     try:
         device = adb_connect(address=address)
         pil_image = device.screenshot()
+        capture_time = time.monotonic()
     except Exception as e:
+        adb_invalidate(address)
         raise RuntimeError("ADB 截屏失败:", str(e))
-    
+
     try:
-        _dir = IMAGE_PATH / "screenshot"
-        _dir.mkdir(parents=True, exist_ok=True)
-        _path = _dir / "screenshot.jpeg"
+        previous = cache.screenshot
+        signature = _signature(pil_image)
+        if _unchanged(previous, signature):
+            screenshot = Screenshot(previous.frame, capture_time)
+        else:
+            cache.frame_count += 1
+            etag = f'"{_SCREENSHOT_EPOCH}-{address.replace(":", "_")}-{cache.frame_count}"'
+            frame = _Frame(pil_image, encode_jpeg(pil_image), etag, signature)
+            screenshot = Screenshot(frame, capture_time)
+    except Exception as e:
+        raise RuntimeError("ADB 截屏编码失败:", str(e))
 
-        screenshot_quality = Config.get_config("adb", "screenshot_quality")
+    cache.screenshot = screenshot
+    return screenshot
 
-        pil_image.save(_path, quality=screenshot_quality)
-        return _path
-    except Exception as e:
-        raise RuntimeError(f"ADB 截屏保存失败 Path={_path}", str(e))
+"""adb截屏；缓存有效期内直接返回内存中的截图，并发请求共享同一次截屏"""
+def adb_screenshot(address: str) -> Screenshot:
+    ttl = Config.get_config("adb", "screenshot_ttl", 1)
+    cache = _screenshot_cache(address)
+
+    screenshot = cache.fresh(ttl)
+    if screenshot is not None:
+        return screenshot
+
+    with cache.capture_lock:
+        # 等待期间其他请求可能已完成截屏
+        screenshot = cache.fresh(ttl)
+        if screenshot is None:
+            screenshot = _capture(address, cache)
+        return screenshot
+
+_encode_executor: Optional[ThreadPoolExecutor] = None
+_encode_executor_lock = threading.Lock()
+
+def _encoder() -> ThreadPoolExecutor:
+    global _encode_executor
+    with _encode_executor_lock:
+        if _encode_executor is None:
+            workers = Config.get_config("adb", "encode_workers", 2)
+            _encode_executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="screenshot-encode")
+        return _encode_executor
+
+"""按指定规格输出截图，缩放编码在独立的线程池中进行，同一帧的相同规格只编码一次"""
+async def adb_screenshot_variant(address: str, format: str = "jpeg", quality: Optional[int] = None,
+                                 max_width: Optional[int] = None, max_height: Optional[int] = None) -> ScreenshotVariant:
+    loop = asyncio.get_running_loop()
+    screenshot = await loop.run_in_executor(None, adb_screenshot, address)
+    frame = screenshot.frame
+
+    if format == "jpeg" and quality is None and max_width is None and max_height is None:
+        return ScreenshotVariant(frame.content, IMAGE_MEDIA_TYPES[format], frame.etag)
+
+    key = (format, quality, max_width, max_height)
+    with frame.variants_lock:
+        future = frame.variants.get(key)
+        if future is None:
+            future = _encoder().submit(encode_image, frame.image, format, quality, max_width, max_height)
+            if len(frame.variants) < _MAX_VARIANTS:
+                frame.variants[key] = future
+
+    content = await asyncio.wrap_future(future)
+    etag = f'{frame.etag[:-1]}-{format}-{quality or ""}-{max_width or ""}x{max_height or ""}"'
+    return ScreenshotVariant(content, IMAGE_MEDIA_TYPES[format], etag)
+
+class _StreamViewer:
+    def __init__(self, loop: asyncio.AbstractEventLoop):
+        self.loop = loop
+        # 只保留最新一帧，观看端消费慢时丢弃旧帧
+        self.queue: asyncio.Queue[bytes] = asyncio.Queue(maxsize=1)
+
+    def offer(self, content: bytes) -> None:
+        if self.queue.full():
+            self.queue.get_nowait()
+        self.queue.put_nowait(content)
+
+class _ScreenStream:
+    """
+    设备实时画面，同一设备只运行一个截屏循环并分发给所有观看端，无人观看时循环退出
+    """
+
+    def __init__(self, address: str):
+        self.address = address
+        self.lock = threading.Lock()
+        self.viewers: set[_StreamViewer] = set()
+        self.thread: Optional[threading.Thread] = None
+
+    def add_viewer(self, viewer: _StreamViewer) -> None:
+        # 画面未变化时不会推送新帧，先发送缓存中的最近一帧
+        screenshot = _screenshot_cache(self.address).screenshot
+        if screenshot is not None:
+            viewer.offer(screenshot.content)
+
+        with self.lock:
+            self.viewers.add(viewer)
+            if self.thread is None:
+                self.thread = threading.Thread(target=self._run, name=f"screen-stream-{self.address}", daemon=True)
+                self.thread.start()
+
+    def remove_viewer(self, viewer: _StreamViewer) -> None:
+        with self.lock:
+            self.viewers.discard(viewer)
+
+    def _push(self, viewer: _StreamViewer, content: bytes) -> None:
+        try:
+            viewer.loop.call_soon_threadsafe(viewer.offer, content)
+        except RuntimeError:
+            # 观看端的事件循环已关闭，不会再消费画面
+            self.remove_viewer(viewer)
+
+    def _run(self) -> None:
+        try:
+            self._loop()
+        except Exception as e:
+            logger.error(f"实时画面截屏异常退出 address={self.address}", exc_info=e)
+        finally:
+            # 截屏循环退出后允许重新启动，已被新的截屏循环替换时不覆盖
+            with self.lock:
+                if self.thread is threading.current_thread():
+                    self.thread = None
+
+    def _loop(self) -> None:
+        interval = 1 / Config.get_config("adb", "stream_fps", 2)
+        cache = _screenshot_cache(self.address)
+        logger.info(f"开始实时画面截屏 address={self.address}")
+        last_etag = None
+
+        while True:
+            with self.lock:
+                if not self.viewers:
+                    self.thread = None
+                    logger.info(f"实时画面无人观看，停止截屏 address={self.address}")
+                    return
+                viewers = list(self.viewers)
+
+            start_time = time.monotonic()
+            try:
+                with cache.capture_lock:
+                    screenshot = _capture(self.address, cache)
+            except Exception as e:
+                logger.warning(f"实时画面截屏失败 address={self.address} {e}")
+                time.sleep(1)
+                continue
+
+            # 画面未变化时跳过推送
+            if screenshot.etag != last_etag:
+                last_etag = screenshot.etag
+                for viewer in viewers:
+                    self._push(viewer, screenshot.content)
+            time.sleep(max(0.0, interval - (time.monotonic() - start_time)))
+
+_screen_streams: dict[str, _ScreenStream] = {}
+_screen_streams_lock = threading.Lock()
+
+"""adb实时画面，以 multipart/x-mixed-replace 格式输出 JPEG 帧"""
+async def adb_screen_stream(address: str, boundary: str = "frame") -> AsyncIterator[bytes]:
+    with _screen_streams_lock:
+        stream = _screen_streams.get(address)
+        if stream is None:
+            stream = _ScreenStream(address)
+            _screen_streams[address] = stream
+
+    viewer = _StreamViewer(asyncio.get_running_loop())
+    stream.add_viewer(viewer)
+    try:
+        while True:
+            content = await viewer.queue.get()
+            yield (
+                f"--{boundary}\r\n"
+                f"Content-Type: image/jpeg\r\n"
+                f"Content-Length: {len(content)}\r\n\r\n"
+            ).encode() + content + b"\r\n"
+    finally:
+        stream.remove_viewer(viewer)
 
 def adb_check_running(address: str, package_name: str) -> bool:
     try:
@@ -56,4 +398,141 @@ def adb_check_running(address: str, package_name: str) -> bool:
         
         return any(package_name in app for app in running_apps)
     except Exception as e:
-        raise RuntimeError("ADB 获取运行应用失败:", str(e))
\ No newline at end of file
+        adb_invalidate(address)
+        raise RuntimeError("ADB 获取运行应用失败:", str(e))
+
+if __name__ == "__main__":
+    # 截图接口基准：本地模拟 adb server，对比每次连接并扫描设备列表的旧实现与复用设备句柄的实现
+    import socketserver
+    import statistics
+    from concurrent.futures import ThreadPoolExecutor
+    from maa_api.config.path_config import IMAGE_PATH
+
+    # 模拟 adb server 每条命令的处理耗时及设备截屏耗时（秒）
+    ADB_COMMAND_DELAY = 0.002
+    SCREENCAP_DELAY = 0.05
+    address = "127.0.0.1:5555"
+    png_buffer = io.BytesIO()
+    Image.linear_gradient("L").resize((1280, 720)).convert("RGB").save(png_buffer, format="PNG")
+    png_bytes = png_buffer.getvalue()
+    adb_commands = [0]
+
+    class FakeAdbServer(socketserver.StreamRequestHandler):
+        def _okay(self, block: Optional[str] = None) -> None:
+            data = b"OKAY"
+            if block is not None:
+                data += f"{len(block.encode()):04x}".encode() + block.encode()
+            self.wfile.write(data)
+
+        def handle(self):
+            while True:
+                header = self.rfile.read(4)
+                if len(header) < 4:
+                    return
+                command = self.rfile.read(int(header, 16)).decode()
+                adb_commands[0] += 1
+                time.sleep(ADB_COMMAND_DELAY)
+                if command == "host:version":
+                    self._okay("0028")
+                elif command.startswith("host:connect:"):
+                    self._okay(f"already connected to {address}")
+                elif command == "host:devices":
+                    # 设备列表中还有其他模拟器
+                    self._okay("".join(f"emulator-{5554 + i * 2}\tdevice\n" for i in range(8)) + f"{address}\tdevice\n")
+                elif command.endswith(":get-state"):
+                    self._okay("device")
+                elif command.startswith("host:transport:"):
+                    self._okay()
+                    continue
+                elif command == "shell:screencap -p":
+                    time.sleep(SCREENCAP_DELAY)
+                    self.wfile.write(b"OKAY" + png_bytes)
+                else:
+                    self.wfile.write(b"FAIL" + f"{len(command):04x}".encode() + command.encode())
+                return
+
+    class FakeAdbTCPServer(socketserver.ThreadingTCPServer):
+        daemon_threads = True
+        allow_reuse_address = True
+        # 默认的监听队列过短，并发连接时会触发 1 秒的 SYN 重传
+        request_queue_size = 128
+
+    server = FakeAdbTCPServer(("127.0.0.1", 0), FakeAdbServer)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    adbutils.adb = adbutils.AdbClient(host="127.0.0.1", port=server.server_address[1])
+
+    def legacy_adb_connect(address: str) -> AdbDevice:
+        # 旧实现的原样拷贝
+        try:
+            adbutils.adb.connect(address)
+            devices = adbutils.adb.device_list()
+
+            # 检查是否连接到预期的设备
+            connected_device = None
+            for device in devices:
+                if device.serial == address:
+                    connected_device = device
+                    break
+
+            if connected_device:
+                return connected_device
+            else:
+                raise RuntimeError(f"没有预期的设备连接: {address}")
+        except Exception as e:
+            raise RuntimeError("ADB 连接失败:", str(e))
+
+    def legacy_adb_screenshot(address: str):
+        # 旧实现的原样拷贝
+        try:
+            device = legacy_adb_connect(address=address)
+            pil_image = device.screenshot()
+        except Exception as e:
+            raise RuntimeError("ADB 截屏失败:", str(e))
+
+        try:
+            _dir = IMAGE_PATH / "screenshot"
+            _dir.mkdir(parents=True, exist_ok=True)
+            _path = _dir / "screenshot.jpeg"
+
+            screenshot_quality = Config.get_config("adb", "screenshot_quality")
+
+            pil_image.save(_path, quality=screenshot_quality)
+            return _path
+        except Exception as e:
+            raise RuntimeError(f"ADB 截屏保存失败 Path={_path}", str(e))
+
+    def reused_adb_screenshot(address: str):
+        # 每次请求都截屏并编码，只体现复用设备句柄的效果
+        return encode_jpeg(adb_connect(address).screenshot())
+
+    def cached_adb_screenshot(address: str):
+        return adb_screenshot(address).content
+
+    clients, requests_per_client = 8, 25
+
+    def run(func) -> list[float]:
+        def client(_) -> list[float]:
+            latencies = []
+            for _ in range(requests_per_client):
+                start = time.perf_counter()
+                func(address)
+                latencies.append(time.perf_counter() - start)
+            return latencies
+
+        with ThreadPoolExecutor(max_workers=clients) as executor:
+            return [latency for latencies in executor.map(client, range(clients)) for latency in latencies]
+
+    for name, func in (("旧实现", legacy_adb_screenshot),
+                       ("复用句柄", reused_adb_screenshot),
+                       ("复用句柄+截图缓存", cached_adb_screenshot)):
+        adb_commands[0] = 0
+        _screenshot_caches.clear()
+        start = time.perf_counter()
+        latencies = run(func)
+        elapsed = time.perf_counter() - start
+        quantiles = statistics.quantiles(latencies, n=100)
+        print(f"{name}: {clients} 个客户端 {len(latencies)} 次请求 "
+              f"p50 {quantiles[49] * 1000:.2f} ms p99 {quantiles[98] * 1000:.2f} ms "
+              f"{len(latencies) / elapsed:,.1f} req/s adb 命令 {adb_commands[0]} 条")
+
+    server.shutdown()
@@ -0,0 +1,38 @@
+import os
+import json
+
+from pathlib import Path
+
+from maa_api.config.path_config import CACHE_PATH
+from maa_api.model.http_cache import HttpCache
+from maa_api.model.manifest import file_sha256
+from maa_api.log import logger
+
+OTA_TASKS_URL = 'https://ota.maa.plus/MaaAssistantArknights/api/resource/tasks.json'
+
+# 活动资源缓存，每次同步以条件请求校验，未变化时服务端返回 304
+_ota_cache = HttpCache(CACHE_PATH / "ota")
+
+"""增量资源目录，作为 incremental_path 加载"""
+def ota_resource_dir(core_path: Path) -> Path:
+    return Path(core_path) / 'cache'
+
+def ota_tasks_path(core_path: Path) -> Path:
+    return ota_resource_dir(core_path) / 'resource' / 'tasks.json'
+
+"""同步版本活动资源，内容哈希与本地文件一致时不重写，返回本地资源是否发生变化"""
+def sync_ota_resources(core_path: Path) -> bool:
+    response = _ota_cache.get(OTA_TASKS_URL, 0, timeout=10)
+    # 校验内容，避免错误页面覆盖可用的资源
+    json.loads(response.content)
+
+    tasks_path = ota_tasks_path(core_path)
+    if tasks_path.exists() and file_sha256(tasks_path) == response.sha256:
+        return False
+
+    tasks_path.parent.mkdir(parents=True, exist_ok=True)
+    tmp_path = tasks_path.with_suffix('.json.tmp')
+    tmp_path.write_bytes(response.content)
+    os.replace(tmp_path, tasks_path)
+    logger.info(f"版本活动资源已更新 sha256={response.sha256}")
+    return True
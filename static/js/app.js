@@ -2,6 +2,11 @@ const { createApp, ref } = Vue;
 
 const createTaskDialogVisible = ref(false)
 
+// 流水线事件流连接
+let pipelineEventSource = null
+// 已获取的最新日志序号
+let pipelineLogSeq = 0
+
 const app = createApp({
     data() {
         return {
@@ -10,6 +15,7 @@ const app = createApp({
 
             dailyTasks: {},
             adbScreenshot: "",
+            liveView: false,
             pipeline: {
                 status: 'idle',
                 tasks: [],
@@ -242,16 +248,22 @@ const app = createApp({
 
         fetchAdbScreenshot() {
             const url = this.constructUrlWithToken('/api/adb/screenshot')
+            // 窄屏只需缩略图
+            const params = window.innerWidth < 768 ? { width: 480 } : {};
             axios.get(url, {
+                params,
                 responseType: 'arraybuffer'
             })
                 .then(resp => {
+                    if (this.liveView) {
+                        return;
+                    }
                     const base64Image = btoa(
                         new Uint8Array(resp.data)
                             .reduce((data, byte) => data + String.fromCharCode(byte), '')
                     );
 
-                    this.adbScreenshot = `data:image/jpeg;base64,${base64Image}`
+                    this.adbScreenshot = `data:${resp.headers['content-type']};base64,${base64Image}`
 
                     this.$notify({
                         title: '成功',
@@ -270,12 +282,25 @@ const app = createApp({
                 })
         },
 
+        toggleLiveView(enabled) {
+            if (enabled) {
+                // 浏览器直接渲染 multipart 流，切换 src 时自动断开
+                this.adbScreenshot = this.constructUrlWithToken('/api/adb/screenshot/stream');
+            } else {
+                this.fetchAdbScreenshot();
+            }
+        },
+
         fetchMaaPipelineData() {
             const url = this.constructUrlWithToken('/api/maa/pipeline')
             axios.get(url)
                 .then(resp => {
                     if (resp.data.code === 10200) {
-                        this.pipeline = resp.data.data;
+                        this.pipeline = { ...resp.data.data, logs: [] };
+                        // 以快照中的日志序号为准，服务重启后序号可能回退
+                        pipelineLogSeq = this.pipeline.log_seq;
+                        this.subscribeMaaPipelineEvents(this.pipeline.event_id);
+                        this.fetchMaaPipelineLogs();
                         this.$notify({
                             title: '成功',
                             message: '流水线数据获取成功',
@@ -300,6 +325,73 @@ const app = createApp({
                 });
         },
 
+        fetchMaaPipelineLogs() {
+            const url = this.constructUrlWithToken('/api/maa/pipeline/logs')
+            axios.get(url, { params: { limit: 1000 } })
+                .then(resp => {
+                    if (resp.data.code === 10200) {
+                        const logs = resp.data.data.logs;
+                        this.pipeline.logs = logs.map(entry => entry.log);
+                        pipelineLogSeq = logs.length > 0 ? logs[logs.length - 1].seq : resp.data.data.last_seq;
+                    }
+                })
+                .catch(err => {
+                    console.error("fetchMaaPipelineLogs 异常 ", err);
+                });
+        },
+
+        subscribeMaaPipelineEvents(eventId) {
+            if (pipelineEventSource) {
+                pipelineEventSource.close();
+            }
+
+            const urlParams = new URLSearchParams({ after: eventId });
+            const token = this.getToken();
+            if (token) {
+                urlParams.append('token', token);
+            }
+            const source = new EventSource(`/api/maa/pipeline/events?${urlParams.toString()}`);
+
+            const findTask = (id) => this.pipeline.tasks.find(task => task.id === id);
+            source.addEventListener('task_added', e => {
+                const data = JSON.parse(e.data);
+                if (!findTask(data.id)) {
+                    this.pipeline.tasks.push({ id: data.id, ...data.task });
+                }
+            });
+            source.addEventListener('task_status', e => {
+                const data = JSON.parse(e.data);
+                const task = findTask(data.id);
+                if (task) {
+                    task.status = data.status;
+                }
+            });
+            source.addEventListener('task_archived', e => {
+                const data = JSON.parse(e.data);
+                this.pipeline.tasks = this.pipeline.tasks.filter(task => !data.ids.includes(task.id));
+            });
+            source.addEventListener('pipeline_status', e => {
+                this.pipeline.status = JSON.parse(e.data).status;
+            });
+            source.addEventListener('log_appended', e => {
+                const data = JSON.parse(e.data);
+                if (data.seq > pipelineLogSeq) {
+                    this.pipeline.logs.push(data.log);
+                    pipelineLogSeq = data.seq;
+                }
+            });
+            source.addEventListener('log_cleared', _ => {
+                this.pipeline.logs = [];
+            });
+            // 游标已过期，重新获取完整快照
+            source.addEventListener('reset', _ => {
+                source.close();
+                this.fetchMaaPipelineData();
+            });
+
+            pipelineEventSource = source;
+        },
+
         cancelMaaPipelineData() {
             this.$confirm('确定停止流水线任务？')
                 .then(_ => {
@@ -380,7 +472,9 @@ const app = createApp({
         },
 
         refreshMaaPipelineDataAndScreenshot() {
-            this.fetchAdbScreenshot();
+            if (!this.liveView) {
+                this.fetchAdbScreenshot();
+            }
             this.fetchMaaPipelineData();
         }
     },
@@ -0,0 +1,13 @@
+import os
+import shutil
+import tempfile
+
+from pathlib import Path
+
+ROOT = Path(__file__).resolve().parent.parent
+
+# 导入 maa_api 时会读取工作目录下的 config.yaml 并创建 resource 目录，测试在临时目录中运行
+_workdir = tempfile.mkdtemp(prefix='maa-api-test-')
+for name in ('config.yaml', 'daily_task_template.json'):
+    shutil.copy(ROOT / name, _workdir)
+os.chdir(_workdir)
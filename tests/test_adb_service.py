@@ -0,0 +1,165 @@
+import asyncio
+
+import pytest
+
+from maa_api.service import adb_service
+
+
+class StubDevice:
+    def __init__(self, adb: 'StubAdb'):
+        self.adb = adb
+
+    def get_state(self) -> str:
+        self.adb.probes += 1
+        return self.adb.state
+
+
+class StubAdb:
+    """
+    替代 adbutils.adb，记录连接及在线探测次数
+    """
+
+    def __init__(self):
+        self.state = 'device'
+        self.fail = False
+        self.connects = 0
+        self.probes = 0
+
+    def connect(self, address: str) -> None:
+        self.connects += 1
+        if self.fail:
+            raise ConnectionError('connection refused')
+
+    def device(self, serial: str) -> StubDevice:
+        return StubDevice(self)
+
+
+class Clock:
+    def __init__(self):
+        self.now = 1000.0
+
+    def __call__(self) -> float:
+        return self.now
+
+
+@pytest.fixture
+def adb(monkeypatch):
+    stub = StubAdb()
+    monkeypatch.setattr(adb_service.adbutils, 'adb', stub)
+    monkeypatch.setattr(adb_service, '_device_handles', {})
+    return stub
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    clock = Clock()
+    monkeypatch.setattr(adb_service.time, 'monotonic', clock)
+    monkeypatch.setattr(adb_service.Config, 'get_config', lambda module, key, default=None: default)
+    return clock
+
+
+def test_reuse_handle_within_probe_interval(adb, clock):
+    device = adb_service.adb_connect('127.0.0.1:5555')
+    assert (adb.connects, adb.probes) == (1, 1)
+
+    clock.now += 1
+    assert adb_service.adb_connect('127.0.0.1:5555') is device
+    assert (adb.connects, adb.probes) == (1, 1)
+
+    # 超过探测间隔后只做一次在线检查，不重新连接
+    clock.now += 10
+    assert adb_service.adb_connect('127.0.0.1:5555') is device
+    assert (adb.connects, adb.probes) == (1, 2)
+
+
+def test_reconnect_when_device_offline(adb, clock):
+    adb_service.adb_connect('127.0.0.1:5555')
+    adb.state = 'offline'
+    clock.now += 10
+    with pytest.raises(RuntimeError):
+        adb_service.adb_connect('127.0.0.1:5555')
+    assert adb.connects == 2
+
+    adb.state = 'device'
+    clock.now += 1
+    adb_service.adb_connect('127.0.0.1:5555')
+    assert adb.connects == 3
+
+
+def test_invalidate_forces_probe(adb, clock):
+    adb_service.adb_connect('127.0.0.1:5555')
+    adb_service.adb_invalidate('127.0.0.1:5555')
+    adb_service.adb_connect('127.0.0.1:5555')
+    assert (adb.connects, adb.probes) == (1, 2)
+
+
+def test_reconnect_backoff(adb, clock):
+    adb.fail = True
+    for backoff in (1, 2, 4):
+        with pytest.raises(RuntimeError):
+            adb_service.adb_connect('127.0.0.1:5555')
+        connects = adb.connects
+        # 退避期间不访问 adb server
+        clock.now += backoff - 0.5
+        with pytest.raises(RuntimeError, match='退避'):
+            adb_service.adb_connect('127.0.0.1:5555')
+        assert adb.connects == connects
+        clock.now += 0.5
+
+    # 连接成功后退避清零
+    adb.fail = False
+    adb_service.adb_connect('127.0.0.1:5555')
+    handle = adb_service._device_handle('127.0.0.1:5555')
+    assert (handle.failures, handle.retry_time) == (0, 0.0)
+
+
+class BrokenLoop:
+    def call_soon_threadsafe(self, callback, *args):
+        raise ValueError('broken loop')
+
+
+@pytest.fixture
+def frames(monkeypatch):
+    """
+    截屏每次返回新的一帧
+    """
+    frame_ids = iter(range(1000))
+
+    def capture(address, cache):
+        return adb_service.Screenshot(adb_service._Frame(None, b'frame', f'"{next(frame_ids)}"', None), 0)
+    monkeypatch.setattr(adb_service, '_capture', capture)
+    monkeypatch.setattr(adb_service.Config, 'get_config', lambda module, key, default=None: 100 if key == 'stream_fps' else default)
+
+
+def test_screen_stream_drops_closed_viewers(frames):
+    stream = adb_service._ScreenStream('127.0.0.1:5555')
+    closed_loop = asyncio.new_event_loop()
+    closed_loop.close()
+    stream.add_viewer(adb_service._StreamViewer(closed_loop))
+    stream.thread.join(5)
+
+    # 关闭的观看端被移除，截屏循环正常退出，之后的观看端可以重新启动截屏
+    assert not stream.viewers
+    assert stream.thread is None
+
+    async def watch():
+        viewer = adb_service._StreamViewer(asyncio.get_running_loop())
+        stream.add_viewer(viewer)
+        try:
+            return await asyncio.wait_for(viewer.queue.get(), 5)
+        finally:
+            stream.remove_viewer(viewer)
+    assert asyncio.run(watch()) == b'frame'
+
+
+def test_screen_stream_restarts_after_error(frames):
+    stream = adb_service._ScreenStream('127.0.0.1:5556')
+    stream.add_viewer(adb_service._StreamViewer(BrokenLoop()))
+    thread = stream.thread
+    thread.join(5)
+
+    # 截屏循环异常退出后，新的观看端重新启动截屏
+    assert stream.thread is None
+    stream.add_viewer(adb_service._StreamViewer(BrokenLoop()))
+    assert stream.thread is not None and stream.thread is not thread
+    stream.thread.join(5)
@@ -0,0 +1,173 @@
+import os
+import time
+import hashlib
+import threading
+
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import pytest
+import requests
+
+from maa_api.model import downloader
+from maa_api.model.utils import HttpUtils
+
+CHUNK_SIZE = 64 * 1024
+PAYLOAD = os.urandom(16 * CHUNK_SIZE)
+SHA256 = hashlib.sha256(PAYLOAD).hexdigest()
+
+
+class Mirror:
+    """
+    本地镜像服务器，delay 为每个请求的响应延迟（秒）；
+    mode 为 ranged（支持 Range）、full（忽略 Range 返回完整文件）、broken（GET 返回 404）、
+    truncated（忽略 Range，只返回一半内容后断开）或 corrupt（忽略 Range，返回长度相同但内容错误的文件）
+    """
+
+    def __init__(self, delay: float = 0.0, mode: str = 'ranged'):
+        self.requests = 0
+        mirror = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = 'HTTP/1.1'
+            disable_nagle_algorithm = True
+
+            def do_HEAD(self):
+                self.send_response(200)
+                self.send_header('Content-Length', str(len(PAYLOAD)))
+                self.end_headers()
+
+            def do_GET(self):
+                mirror.requests += 1
+                time.sleep(delay)
+                if mode == 'broken':
+                    self.send_response(404)
+                    self.send_header('Content-Length', '0')
+                    self.end_headers()
+                    return
+                body, status = PAYLOAD, 200
+                range_header = self.headers.get('Range')
+                if mode == 'ranged' and range_header:
+                    start, end = map(int, range_header[len('bytes='):].split('-'))
+                    body, status = PAYLOAD[start:end + 1], 206
+                elif mode == 'corrupt':
+                    body = PAYLOAD[::-1]
+                self.send_response(status)
+                self.send_header('Content-Length', str(len(body)))
+                self.end_headers()
+                if mode == 'truncated':
+                    self.wfile.write(body[:len(body) // 2])
+                    self.close_connection = True
+                    return
+                self.wfile.write(body)
+
+            def log_message(self, format, *args):
+                pass
+
+        self.server = ThreadingHTTPServer(('127.0.0.1', 0), Handler)
+        self.server.daemon_threads = True
+        self.url = f"http://127.0.0.1:{self.server.server_port}/MAA.zip"
+        threading.Thread(target=self.server.serve_forever, daemon=True).start()
+
+    def close(self):
+        self.server.shutdown()
+        self.server.server_close()
+
+
+@pytest.fixture
+def mirrors(monkeypatch):
+    # 不经过配置的代理访问本地服务器
+    monkeypatch.setattr(HttpUtils, 'proxies', None)
+    monkeypatch.setattr(HttpUtils, '_sessions', {})
+    created = []
+
+    def create(*args, **kwargs):
+        mirror = Mirror(*args, **kwargs)
+        created.append(mirror)
+        return mirror
+
+    yield create
+    for mirror in created:
+        mirror.close()
+
+
+def _read(path) -> bytes:
+    with open(path, 'rb') as file:
+        return file.read()
+
+
+def test_fast_mirror_takes_more_chunks(mirrors, tmp_path):
+    fast, slow = mirrors(delay=0.01), mirrors(delay=0.2)
+    target = tmp_path / 'MAA.zip'
+    instance = downloader.Downloader([fast.url, slow.url], CHUNK_SIZE, 2)
+    instance.download_file(len(PAYLOAD), str(target), sha256=SHA256)
+
+    assert _read(target) == PAYLOAD
+    assert fast.requests > slow.requests
+    assert not os.path.exists(f"{target}.part") and not os.path.exists(f"{target}.chunks")
+
+
+def test_failing_mirror_is_demoted(mirrors, tmp_path):
+    # 失败后等待 1 秒再重试，正常镜像需要足够慢才能让失败镜像达到降级次数
+    good, broken = mirrors(delay=0.25), mirrors(mode='broken')
+    target = tmp_path / 'MAA.zip'
+    instance = downloader.Downloader([good.url, broken.url], CHUNK_SIZE, 1)
+    instance.download_file(len(PAYLOAD), str(target), sha256=SHA256)
+
+    assert _read(target) == PAYLOAD
+    assert broken.requests == downloader.ChunkScheduler.MAX_CONSECUTIVE_FAILURES
+    assert instance.failed_requests[good.url]['success'] == 16
+
+
+def test_mirror_without_range_support_is_demoted(mirrors, tmp_path, monkeypatch):
+    ranged, full = mirrors(delay=0.05), mirrors()
+    target = tmp_path / 'MAA.zip'
+
+    def no_fallback(self, download_url, file_path, **kwargs):
+        raise AssertionError("不应回退到单连接下载")
+    monkeypatch.setattr(downloader.Downloader, 'download_file_no_chunk', no_fallback)
+
+    extracted = []
+    downloader.file_download([full.url, ranged.url], str(target), expected_size=len(PAYLOAD), sha256=SHA256,
+                             consumer=lambda fileobj: extracted.append(fileobj.read()))
+
+    assert _read(target) == PAYLOAD
+    assert extracted == [PAYLOAD]
+    # 不支持 Range 的镜像只请求一次即停用
+    assert full.requests <= 4
+
+
+def test_fallback_when_no_mirror_supports_range(mirrors, tmp_path):
+    full = mirrors()
+    target = tmp_path / 'MAA.zip'
+    extracted = []
+    downloader.file_download([full.url], str(target), expected_size=len(PAYLOAD),
+                             consumer=lambda fileobj: extracted.append(fileobj.read()))
+
+    assert _read(target) == PAYLOAD
+    assert extracted == [PAYLOAD]
+    assert not os.path.exists(f"{target}.part") and not os.path.exists(f"{target}.chunks")
+
+
+@pytest.mark.parametrize('mode', ['truncated', 'corrupt'])
+def test_fallback_download_is_verified(mirrors, tmp_path, mode):
+    bad = mirrors(mode=mode)
+    target = tmp_path / 'MAA.zip'
+    extracted = []
+    with pytest.raises((requests.RequestException, RuntimeError)):
+        downloader.file_download([bad.url], str(target), expected_size=len(PAYLOAD), sha256=SHA256,
+                                 consumer=lambda fileobj: extracted.append(fileobj.read()))
+
+    # 校验失败的文件不交给 consumer，也不保留
+    assert extracted == []
+    assert not os.path.exists(target) and not os.path.exists(f"{target}.part")
+
+
+def test_fallback_tries_next_mirror(mirrors, tmp_path):
+    bad, full = mirrors(mode='truncated'), mirrors()
+    target = tmp_path / 'MAA.zip'
+    extracted = []
+    downloader.file_download([bad.url, full.url], str(target), expected_size=len(PAYLOAD), sha256=SHA256,
+                             consumer=lambda fileobj: extracted.append(fileobj.read()))
+
+    assert _read(target) == PAYLOAD
+    assert extracted == [PAYLOAD]
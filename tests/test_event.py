@@ -0,0 +1,40 @@
+import asyncio
+
+from maa_api.model.event import PipelineEventBus
+
+
+def _first_events(bus: PipelineEventBus, after, count: int) -> list[str]:
+    async def collect():
+        stream = bus.stream(after, heartbeat=0.01)
+        # 第一条为 retry 设置
+        await stream.__anext__()
+        events = []
+        for _ in range(count):
+            chunk = await stream.__anext__()
+            if chunk.startswith(':'):
+                break
+            events.append(chunk)
+        await stream.aclose()
+        return events
+    return asyncio.run(collect())
+
+
+def test_resume_from_cursor():
+    bus = PipelineEventBus(epoch='a')
+    for i in range(3):
+        bus.publish('log_appended', {'seq': i})
+    assert bus.last_id == 'a-3'
+
+    events = _first_events(bus, 'a-1', 3)
+    assert [event.split('\n')[0] for event in events] == ['id: a-2', 'id: a-3']
+    assert _first_events(bus, 'a-3', 1) == []
+
+
+def test_cursor_from_previous_process_resets():
+    bus = PipelineEventBus(epoch='b')
+    bus.publish('log_appended', {'seq': 1})
+
+    # 重启前的游标序号可能大于、小于或等于当前序号，均需重新获取快照
+    for after in ('a-100', 'a-1', 'a-0', '5'):
+        events = _first_events(bus, after, 1)
+        assert len(events) == 1 and 'event: reset' in events[0], after
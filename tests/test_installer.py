@@ -0,0 +1,103 @@
+import io
+import os
+import tarfile
+
+import pytest
+
+from maa_api.model import installer as installer_module
+from maa_api.model.installer import CoreInstaller
+
+
+def _install(root, name):
+    path = root / CoreInstaller.VERSIONS_DIR / name
+    path.mkdir(parents=True)
+    return path
+
+
+def test_activate_switches_symlink(tmp_path):
+    core = CoreInstaller(tmp_path)
+    assert core.active_path() == tmp_path
+    for name in ('v1', 'v2'):
+        path = _install(tmp_path, name)
+        core.activate(name)
+        assert core.active_path() == path.resolve()
+    assert (tmp_path / 'current').is_symlink()
+    assert not (tmp_path / 'current.tmp').exists()
+
+
+def test_activate_falls_back_to_version_file(tmp_path, monkeypatch):
+    core = CoreInstaller(tmp_path)
+    _install(tmp_path, 'v1')
+    core.activate('v1')
+
+    replace = os.replace
+
+    def failing_replace(src, dst):
+        if str(src).endswith('current.tmp'):
+            raise PermissionError('access denied')
+        return replace(src, dst)
+
+    monkeypatch.setattr(installer_module.os, 'replace', failing_replace)
+    v2 = _install(tmp_path, 'v2')
+    core.activate('v2')
+    assert core.active_path() == v2
+    assert not (tmp_path / 'current.tmp').is_symlink()
+    assert not (tmp_path / 'current').is_symlink()
+
+    # 再次切换成功后以符号链接为准
+    monkeypatch.setattr(installer_module.os, 'replace', replace)
+    v3 = _install(tmp_path, 'v3')
+    core.activate('v3')
+    assert core.active_path() == v3.resolve()
+    assert not (tmp_path / 'current.version').exists()
+
+
+def test_stale_link_does_not_shadow_version_file(tmp_path, monkeypatch):
+    core = CoreInstaller(tmp_path)
+    _install(tmp_path, 'v1')
+    core.activate('v1')
+
+    def busy(path):
+        raise OSError('busy')
+
+    # 旧链接无法删除时版本文件仍然生效
+    monkeypatch.setattr(CoreInstaller, '_remove_link', staticmethod(busy))
+    v2 = _install(tmp_path, 'v2')
+    core.activate('v2')
+    assert (tmp_path / 'current').is_symlink()
+    assert core.active_path() == v2
+
+
+def _tar_with_links(links: list[tuple[str, str]]) -> io.BytesIO:
+    buffer = io.BytesIO()
+    with tarfile.open(fileobj=buffer, mode='w:gz') as tfile:
+        data = b'MaaCore'
+        info = tarfile.TarInfo('lib/libMaaCore.so.1')
+        info.size = len(data)
+        tfile.addfile(info, io.BytesIO(data))
+        for name, linkname in links:
+            info = tarfile.TarInfo(name)
+            info.type = tarfile.SYMTYPE
+            info.linkname = linkname
+            tfile.addfile(info)
+    buffer.seek(0)
+    return buffer
+
+
+def test_extract_keeps_contained_symlinks(tmp_path):
+    core = CoreInstaller(tmp_path / 'maa')
+    staging = core.staging_path('v1')
+    core.extract(_tar_with_links([('lib/libMaaCore.so', 'libMaaCore.so.1')]), 'MAA.tar.gz', staging)
+    assert (staging / 'lib' / 'libMaaCore.so').read_bytes() == b'MaaCore'
+
+
+@pytest.mark.parametrize('links', [
+    [('lib/evil', '/etc')],
+    [('lib/evil', '../../outside')],
+    # 单独检查时都在目录内，b 创建后 a 指向目录外
+    [('lib/a', 'b/../../outside'), ('lib/b', '.')],
+])
+def test_extract_rejects_escaping_symlinks(tmp_path, links):
+    core = CoreInstaller(tmp_path / 'maa')
+    with pytest.raises(RuntimeError, match='非法链接'):
+        core.extract(_tar_with_links(links), 'MAA.tar.gz', core.staging_path('v1'))
@@ -0,0 +1,356 @@
+import time
+import uuid
+import itertools
+import threading
+
+import pytest
+
+from maa_api.exception.response_exception import ResponseException
+from maa_api.model import task as task_module
+from maa_api.model.installer import CoreInstaller
+from maa_api.model.task import CoreInitPhase, Task, TaskPipeline, TaskPipelinePool, TaskPipelineStatus, TaskStatus, _handle_message, update_core
+from maa_api.model.utils import Message
+from maa_api.model.worker import CoreWorkerError, RemoteAsst
+
+
+class FakeAsst:
+    """
+    只记录任务的 Asst，任务 id 与 MaaCore 一样每个实例从 1 开始
+    """
+
+    def __init__(self):
+        self.tasks = []
+        # 核心是否在运行，由测试控制
+        self.run = False
+
+    def append_task(self, type_name, params):
+        self.tasks.append(type_name)
+        return len(self.tasks)
+
+    def start(self):
+        return True
+
+    def stop(self):
+        return True
+
+    def running(self):
+        return self.run
+
+
+class FakeWorker:
+    """
+    在当前进程中模拟 MaaCore 工作进程
+    """
+
+    def __init__(self, version: str):
+        self.version = version
+        self.core_path = version
+        self.alive = True
+        self.instances: dict[int, FakeAsst] = {}
+        # 连接失败的设备地址
+        self.offline: set[str] = set()
+        self._instance_ids = itertools.count(1)
+
+    def create_asst(self, route_arg, adb_path, address, options) -> RemoteAsst:
+        if address in self.offline:
+            raise CoreWorkerError(f"RuntimeError: MAA ADB 连接失败 path={adb_path} address={address}")
+        instance_id = next(self._instance_ids)
+        self.instances[instance_id] = FakeAsst()
+        return RemoteAsst(self, instance_id)
+
+    def call(self, command, instance_id, *args):
+        if command == 'destroy':
+            return self.instances.pop(instance_id, None) is not None
+        return getattr(self.instances[instance_id], command)(*args)
+
+    def shutdown(self):
+        self.alive = False
+
+
+@pytest.fixture
+def pool(monkeypatch):
+    """
+    独立的流水线池，测试注册的设备不残留在全局的 pipeline_pool 中
+    """
+    pool = TaskPipelinePool()
+    pool.adb_path = 'adb'
+    monkeypatch.setattr(task_module, 'pipeline_pool', pool)
+    return pool
+
+
+def _device() -> str:
+    return f"127.0.0.1:{uuid.uuid4().hex[:8]}"
+
+
+def _pipeline(device: str) -> TaskPipeline:
+    pipeline = TaskPipeline(device=device)
+    pipeline.restore()
+    pipeline.bind_asst(FakeAsst())
+    return pipeline
+
+
+def _task(type_name: str) -> Task:
+    return Task(task_name=type_name, type_name=type_name, params={})
+
+
+def _chain(pipeline: TaskPipeline, m: Message, core_task_id: int, taskchain: str) -> None:
+    _handle_message(pipeline, m, {'taskid': core_task_id, 'taskchain': taskchain})
+
+
+def test_task_ids_survive_restart():
+    device = _device()
+    pipeline = _pipeline(device)
+    pipeline.append_task(_task('Fight'))
+    pipeline.start()
+    _chain(pipeline, Message.TaskChainStart, 1, 'Fight')
+    _chain(pipeline, Message.TaskChainCompleted, 1, 'Fight')
+    pipeline.set_status(TaskPipelineStatus.COMPLETED)
+    # 已添加但未执行的任务
+    pipeline.append_task(_task('Award'))
+
+    # 重启后新的 Asst 实例重新从 1 编号
+    restored = _pipeline(device)
+    assert {task_id: task.type_name for task_id, task in restored._task_dict.items()} == {1: 'Fight', 2: 'Award'}
+    assert restored._task_dict[2].status == TaskStatus.CANCELLED
+    assert restored.idle()
+
+    restored.append_task(_task('Recruit'))
+    assert restored._task_dict[1].type_name == 'Fight'
+    assert restored._task_dict[3].type_name == 'Recruit'
+
+    restored.start()
+    _chain(restored, Message.TaskChainStart, 1, 'Recruit')
+    assert restored._task_dict[3].status == TaskStatus.RUNNING
+    assert restored._task_dict[1].status == TaskStatus.COMPLETED
+
+
+def test_restore_running_pipeline_cancels_batch():
+    device = _device()
+    pipeline = _pipeline(device)
+    pipeline.append_task(_task('Fight'))
+    pipeline.append_task(_task('Roguelike'))
+    pipeline.start()
+    _chain(pipeline, Message.TaskChainStart, 1, 'Fight')
+    _chain(pipeline, Message.TaskChainCompleted, 1, 'Fight')
+    _chain(pipeline, Message.TaskChainStart, 2, 'Roguelike')
+
+    restored = _pipeline(device)
+    assert restored.status == TaskPipelineStatus.CANCELLED
+    assert [task.status for task in restored.active_tasks()] == [TaskStatus.COMPLETED, TaskStatus.CANCELLED]
+
+
+def test_bind_asst_resets_task_id_mapping():
+    pipeline = _pipeline(_device())
+    pipeline.append_task(_task('Fight'))
+    assert pipeline.task_id_of(1) == 1
+
+    pipeline.bind_asst(FakeAsst())
+    with pytest.raises(ResponseException):
+        pipeline.task_id_of(1)
+    pipeline.append_task(_task('Mall'))
+    assert pipeline.task_id_of(1) == 2
+
+
+def test_hot_swap_keeps_task_ids(pool, monkeypatch):
+    old_worker = FakeWorker('v1')
+    pool.worker = old_worker
+    monkeypatch.setattr(pool, 'start_worker', lambda core_path: FakeWorker('v2'))
+    monkeypatch.setattr(pool, '_drain_retired', lambda: None)
+
+    device = _device()
+    pool.add(device)
+    pipeline = pool.get(device)
+    assert pool.connect(pipeline)
+    pipeline.append_task(_task('Roguelike'))
+    pipeline.start()
+    old_worker.instances[1].run = True
+
+    # 运行中的流水线继续使用旧工作进程
+    pool.swap_core('v2')
+    assert pipeline._asst.worker is old_worker
+    _chain(pipeline, Message.TaskChainCompleted, 1, 'Roguelike')
+    old_worker.instances[1].run = False
+
+    # 空闲后切换到新工作进程，MaaCore 任务 id 重新从 1 编号
+    pipeline.append_task(_task('Mall'))
+    assert pipeline._asst.worker.version == 'v2'
+    assert old_worker.instances == {}
+    assert {task_id: task.type_name for task_id, task in pipeline._task_dict.items()} == {1: 'Roguelike', 2: 'Mall'}
+
+    pipeline.start()
+    _chain(pipeline, Message.TaskChainStart, 1, 'Mall')
+    assert pipeline._task_dict[2].status == TaskStatus.RUNNING
+    assert pipeline._task_dict[1].status == TaskStatus.COMPLETED
+
+    # 旧工作进程没有流水线使用后退出
+    assert pool.refresh_idle()
+    assert not old_worker.alive
+
+
+def test_worker_crash_sets_restarting_phase(pool, monkeypatch):
+    old_worker = FakeWorker('v1')
+    new_worker = FakeWorker('v1')
+    started = threading.Event()
+    pool.worker = old_worker
+    pool.set_phase(CoreInitPhase.READY)
+
+    def start_worker(core_path):
+        started.wait(5)
+        return new_worker
+    monkeypatch.setattr(pool, 'start_worker', start_worker)
+
+    device = _device()
+    pool.add(device)
+    pipeline = pool.get(device)
+    assert pool.connect(pipeline)
+    pipeline.append_task(_task('Fight'))
+    pipeline.start()
+
+    old_worker.alive = False
+    pool._worker_exited(old_worker)
+    # 重启期间不可用
+    assert pool.phase == CoreInitPhase.RESTARTING
+    assert not pool.ready
+    assert pipeline.status == TaskPipelineStatus.FAILED
+
+    started.set()
+    deadline = time.monotonic() + 5
+    while not pool.ready and time.monotonic() < deadline:
+        time.sleep(0.01)
+    assert pool.ready
+    assert pool.worker is new_worker
+    assert pool.worker_restarts == 1
+
+
+def test_offline_device_does_not_block_others(pool):
+    pool.worker = FakeWorker('v1')
+    offline_device, online_device = _device(), _device()
+    pool.worker.offline.add(offline_device)
+    for device in (offline_device, online_device):
+        pool.add(device)
+    assert [pool.connect(pipeline) for pipeline in pool.pipelines()] == [False, True]
+
+    offline = pool.get(offline_device)
+    online = pool.get(online_device)
+    assert not offline.connected
+    assert 'MAA ADB 连接失败' in offline.connect_error
+    online.append_task(_task('Fight'))
+    assert online.start()
+
+    # 退避期间不重新连接
+    pool.worker.offline.clear()
+    with pytest.raises(ResponseException):
+        offline.append_task(_task('Fight'))
+    assert not offline.connected
+
+    offline._connect_retry_time = 0
+    offline.append_task(_task('Fight'))
+    assert offline.connected
+    assert offline.connect_error is None
+
+
+def test_archived_batches_are_capped():
+    device = _device()
+    pipeline = _pipeline(device)
+    pipeline._archive_batches = 2
+    for type_name in ('Fight', 'Mall', 'Award', 'Recruit'):
+        pipeline.append_task(_task(type_name))
+        pipeline.start()
+        _chain(pipeline, Message.TaskChainCompleted, 1, type_name)
+        pipeline.bind_asst(FakeAsst())
+    pipeline.append_task(_task('Infrast'))
+    pipeline.start()
+
+    # 只保留最近两个旧批次及当前批次
+    expected = {3: 'Award', 4: 'Recruit', 5: 'Infrast'}
+    assert {task_id: task.type_name for task_id, task in pipeline._task_dict.items()} == expected
+    assert pipeline._archived_batches == [[3], [4]]
+
+    restored = _pipeline(device)
+    restored._archive_batches = 2
+    assert {task_id: task.type_name for task_id, task in restored._task_dict.items()} == expected
+    assert restored._archived_batches == [[3], [4]]
+
+
+def test_log_seq_continues_after_restart():
+    device = _device()
+    pipeline = _pipeline(device)
+    for i in range(3):
+        pipeline.append_log(f'log {i}')
+    pipeline.append_task(_task('Fight'))
+    pipeline.start()
+    pipeline.append_log('log 3')
+    assert pipeline.log_buffer.last_seq == 4
+
+    restored = _pipeline(device)
+    assert restored.log_buffer.tail(10) == [{'seq': 4, 'log': 'log 3'}]
+    restored.append_log('log 4')
+    assert restored.log_buffer.last_seq == 5
+
+
+def test_failed_swap_rolls_back(pool, monkeypatch, tmp_path):
+    installer = CoreInstaller(tmp_path)
+    v1 = tmp_path / CoreInstaller.VERSIONS_DIR / 'v1'
+    v1.mkdir(parents=True)
+    installer.activate('v1')
+
+    class FakeUpdater:
+        def __init__(self, path, version):
+            self.installer = installer
+
+        def update(self):
+            (tmp_path / CoreInstaller.VERSIONS_DIR / 'v2').mkdir()
+            installer.activate('v2')
+
+    def start_worker(core_path):
+        raise CoreWorkerError("MaaCore 加载失败")
+    monkeypatch.setattr(task_module, 'Updater', FakeUpdater)
+    monkeypatch.setattr(pool, 'start_worker', start_worker)
+    pool.worker = FakeWorker('v1')
+    pool.worker.core_path = v1
+
+    # 新版本加载失败时继续使用当前版本，重启后也加载之前的版本
+    with pytest.raises(CoreWorkerError):
+        update_core()
+    assert installer.active_path() == v1.resolve()
+    assert pool.worker.version == 'v1'
+
+
+def test_worker_crash_during_init_fails_init(pool, monkeypatch, tmp_path):
+    worker = FakeWorker('v1')
+    devices = [_device(), _device()]
+    installer = CoreInstaller(tmp_path)
+
+    class FakeUpdater:
+        def __init__(self, path, version):
+            self.installer = installer
+
+        def update(self):
+            pass
+
+    def start_worker(core_path):
+        assert pool.phase == CoreInitPhase.LOADING, "初始化期间不应重启工作进程"
+        return worker
+
+    create_asst = worker.create_asst
+
+    def crash_on_connect(route_arg, adb_path, address, options):
+        # 连接第一个设备时工作进程崩溃
+        if address == devices[0]:
+            worker.alive = False
+            pool._worker_exited(worker)
+            raise CoreWorkerError("MaaCore 工作进程已退出")
+        return create_asst(route_arg, adb_path, address, options)
+
+    monkeypatch.setattr(task_module, 'Updater', FakeUpdater)
+    monkeypatch.setattr(task_module.adb_service, 'adb_addresses', lambda: devices)
+    monkeypatch.setattr(task_module.resource_service, 'sync_ota_resources', lambda path: None)
+    monkeypatch.setattr(task_module.resource_service, 'ota_tasks_path', lambda path: tmp_path / 'missing')
+    monkeypatch.setattr(pool, 'start_worker', start_worker)
+    monkeypatch.setattr(worker, 'create_asst', crash_on_connect)
+
+    task_module._init_asst_safely()
+    assert pool.phase == CoreInitPhase.FAILED
+    assert 'MaaCore' in pool.error
+    assert pool.worker_restarts == 0
+    assert not any(thread.name == 'maa-core-restart' for thread in threading.enumerate())